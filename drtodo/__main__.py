@@ -1,2 +1,3 @@
-from .main import main
+from .fastpath import main
+
 main(prog_name="todo")
@@ -0,0 +1,82 @@
+"""
+Agenda of open task items by due date, across all active todo files.
+
+Each file gets a due index: its open items with a due date (see `taskitems.parse_due`), sorted by date. Indexes are
+cached (see `filecache`) until the file changes or the day does (due dates can be relative, e.g. `due:fri`), so
+building the agenda usually parses no markdown and no dates at all. The sorted indexes of all files are then merged
+lazily, stopping at the end of the agenda period.
+"""
+import datetime
+import heapq
+import itertools
+from collections.abc import Iterator
+from pathlib import Path
+from typing import NamedTuple
+
+from . import config, filecache, profiling, taskitems
+
+__all__ = ["BUCKETS", "AgendaEntry", "agenda", "build_due_index", "file_due_index"]
+
+BUCKETS = ("overdue", "today", "upcoming")
+
+
+class AgendaEntry(NamedTuple):
+    due: datetime.date
+    file: Path
+    item: dict
+    """item without tokens: index, id, checked, text and section"""
+
+
+def build_due_index(todofile: Path, today: datetime.date) -> dict:
+    """
+    Parses a markdown file and builds its due index:
+    - items: (date ordinal, position in file, item) for open items with a due date, sorted
+    - undated: number of open items with a due string that could not be parsed into a date
+    """
+    from .mdparser import TodoListParser
+
+    todo = TodoListParser(config.settings.section)
+    todo.parse(todofile)
+    entries = []
+    undated = 0
+    for pos, item in enumerate(todo.items):
+        if item['checked']:
+            continue
+        due = taskitems.item_metadata(item)['due']
+        if due is None:
+            continue
+        date = taskitems.parse_due(due, today)
+        if date is None:
+            undated += 1
+            continue
+        entries.append((date.toordinal(), pos, {key: item[key] for key in ('index', 'id', 'checked', 'text', 'section')}))
+    entries.sort(key=lambda e: e[:2])
+    return {'items': entries, 'undated': undated}
+
+
+def file_due_index(todofile: Path, today: datetime.date) -> dict:
+    """Returns the due index of a file, rebuilding it only if the file (or the day) changed since it was built."""
+    with profiling.span("agenda.index"):
+        return filecache.cached("agenda", todofile, lambda: build_due_index(todofile, today),
+                                config.settings.section, today.toordinal())
+
+
+def agenda(files: list[Path], days: int, today: datetime.date) -> tuple[dict[str, list[AgendaEntry]], int]:
+    """
+    Returns open items due up to `days` days after `today` in all `files`, in due date order (then file order) and
+    split in BUCKETS, along with the number of items whose due date was not understood.
+    """
+    indexes = [(todofile, file_due_index(todofile, today)) for todofile in files if todofile and todofile.exists()]
+
+    def entries(fileno: int, todofile: Path, index: dict) -> Iterator[tuple]:
+        for ordinal, pos, item in index['items']:
+            yield ordinal, fileno, pos, todofile, item
+
+    # every index is already sorted: a k-way merge keeps them sorted, lazily, so we stop reading at the horizon
+    merged = heapq.merge(*(entries(fileno, todofile, index) for fileno, (todofile, index) in enumerate(indexes)))
+    horizon = today.toordinal() + days
+    buckets: dict[str, list[AgendaEntry]] = {bucket: [] for bucket in BUCKETS}
+    for ordinal, _, _, todofile, item in itertools.takewhile(lambda e: e[0] <= horizon, merged):
+        bucket = "overdue" if ordinal < today.toordinal() else "today" if ordinal == today.toordinal() else "upcoming"
+        buckets[bucket].append(AgendaEntry(datetime.date.fromordinal(ordinal), todofile, item))
+    return buckets, sum(index['undated'] for _, index in indexes)
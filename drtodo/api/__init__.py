@@ -0,0 +1,22 @@
+"""
+Library API, to use DrToDo from Python code without going through the CLI.
+
+A `TodoContext` holds settings and the todo files to operate on, a `TodoStore` the parsed items of one file, with
+methods to load, select, mark, add and remove items and save them back. There is no global state involved: contexts
+are independent of each other (and of the CLI), and stores lock themselves, so they can be used from several threads.
+Stores also have async variants of their methods.
+
+```python
+from drtodo.api import TodoContext
+
+store = TodoContext(["TODO.md"], keep_backups=0).store()
+for item in store.select(match="bug", done=False):
+    print(item['index'], item['text'])
+store.add("P1 @me fix the parser")
+store.save()
+```
+"""
+from .context import TodoContext
+from .store import TodoStore
+
+__all__ = ["TodoContext", "TodoStore"]
@@ -0,0 +1,68 @@
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional, Union
+
+from .. import config
+from .store import TodoStore
+
+__all__ = ["TodoContext"]
+
+
+class TodoContext:
+    """
+    Settings and todo files to operate on: what the CLI keeps in `config.settings` and `config.globals`, as an
+    object. Contexts don't share any state, so several of them can be used at the same time (from different threads),
+    each with its own settings and files.
+
+    ```python
+    context = TodoContext.discover(cwd=repo_folder, section="## TODO")
+    store = context.store()
+    store.mark(True, match="release notes")
+    store.save()
+    ```
+    """
+
+    def __init__(self, files: Iterable[Union[str, Path]], settings: Optional[config.Settings] = None, **overrides):
+        """
+        files: todo files to operate on, in priority order (the first one is the default store)
+        settings: defaults to the settings from env variables (config files are only read by discover())
+        overrides: setting values to change, e.g. section="## TODO" or keep_backups=0
+        """
+        # a validated copy, so changes to the context settings don't affect anything else (and vice versa)
+        self.settings = config.Settings(**{**(settings or config.default_settings).dict(), **overrides})
+        self.settings.update_values()
+        self.files = [Path(f) for f in files]
+        self._stores: dict[Path, TodoStore] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def discover(cls, *, cwd: Optional[Path] = None, force_global: bool = False, **overrides) -> "TodoContext":
+        """
+        Returns the context the CLI would use in folder `cwd` (default: the current one): the local todo file of its
+        git repo if configured for DrToDo, the global one otherwise, with settings from config files and env
+        variables. Raises config.ConfigError if the todo file does not exist.
+        """
+        settings, found = config.discover(force_global=force_global, cwd=cwd)
+        config.check_todo_files(found)
+        return cls(found.todo_files, settings, **overrides)
+
+    def __repr__(self) -> str:
+        return f"TodoContext({[str(f) for f in self.files]!r})"
+
+    def store(self, path: Optional[Union[str, Path]] = None) -> TodoStore:
+        """Returns the store of a todo file (default: the first file of the context), the same one every time."""
+        if path is None:
+            if not self.files:
+                raise ValueError("no todo files in this context")
+            path = self.files[0]
+        path = Path(path)
+        with self._lock:
+            store = self._stores.get(path)
+            if store is None:
+                store = self._stores[path] = TodoStore(self, path)
+            return store
+
+    def stores(self) -> list[TodoStore]:
+        """Returns the stores of all the todo files of the context that exist, in priority order."""
+        return [self.store(path) for path in self.files if path.exists()]
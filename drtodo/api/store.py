@@ -0,0 +1,197 @@
+import asyncio
+import threading
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+from .. import backup_command, taskitems
+from ..mdparser import TaskListTraverser, TodoListParser
+
+if TYPE_CHECKING:
+    from .context import TodoContext
+
+__all__ = ["TodoStore"]
+
+
+class TodoStore:
+    """
+    One todo file of a TodoContext: its parsed items, changed in memory until save() writes them back (with backups,
+    like the CLI). Get stores from TodoContext.store() rather than creating them directly.
+
+    Selection criteria are the keyword arguments of taskitems.create_iterator(): spec, id, index, range, match, done
+    and max_depth. Items are dicts as returned by the parser (see `mdparser`), which stay valid until the next load().
+
+    All methods lock the store, so it can be shared by threads. Async variants (aload, aselect...) run the same
+    methods in a worker thread.
+    """
+
+    def __init__(self, context: "TodoContext", path: Path):
+        self.context = context
+        self.path = path
+        self.todo: Optional[TodoListParser] = None
+        self._lock = threading.RLock()
+
+    def __repr__(self) -> str:
+        return f"TodoStore({str(self.path)!r})"
+
+    @property
+    def items(self) -> list[dict]:
+        """all the items of the file, loading it first if needed"""
+        with self._lock:
+            if self.todo is None:
+                self.load()
+            assert self.todo is not None
+            return self.todo.items
+
+    def load(self) -> list[dict]:
+        """(re)reads the file, discarding unsaved changes, returns all its items"""
+        with self._lock:
+            todo = TodoListParser(self.context.settings.section)
+            todo.parse(self.path)
+            self.todo = todo
+            return todo.items
+
+    def select(self, **criteria) -> list[dict]:
+        """returns the items matching the given criteria (all of them if none given)"""
+        with self._lock:
+            return list(taskitems.create_iterator(self.items, omit_means_all=True, **criteria))
+
+    def mark(self, checked: bool = True, items: Optional[Iterable[dict]] = None, *, all: bool = False,
+             recursive: bool = False, **criteria) -> list[dict]:
+        """
+        marks the given items, those matching the given criteria or all items if `all`, as done (checked) or not done,
+        along with all their subtasks if `recursive`. Returns the items marked. Raises ValueError if no items or
+        criteria are given.
+        """
+        with self._lock:
+            if items is None:
+                items = self.items if all else taskitems.create_iterator(self.items, omit_means_all=False, **criteria)
+            if recursive:
+                items = taskitems.with_subtrees(items)
+            marked = list(items)
+            for item in marked:
+                item['checked'] = checked
+            return marked
+
+    def add(self, text: str, *, checked: bool = False, after: Optional[dict] = None) -> dict:
+        """
+        adds a new item with the given text after `after` (and its subtasks), by default after the last item (in a
+        list without items, at the end of the section set, or of the file). Returns the new item.
+        """
+        with self._lock:
+            item = TaskListTraverser.create_item(text, index=0, checked=checked)
+            if after is None:
+                if not self.items:
+                    siblings, section = self.todo.append_point()
+                    self.todo.insert_items([item], siblings, 0, section)
+                    return item
+                after = self.items[-1]
+            self.todo.add_item_after(add=item, after=after)
+            return item
+
+    def remove(self, items: Optional[Iterable[dict]] = None, *, recursive: bool = False, **criteria) -> list[dict]:
+        """
+        removes the given items or those matching the given criteria, along with all their subtasks if `recursive`
+        (otherwise subtasks take the place of their removed parent). Returns the items removed. Raises ValueError if
+        no items or criteria are given.
+        """
+        with self._lock:
+            if items is None:
+                items = taskitems.create_iterator(self.items, omit_means_all=False, **criteria)
+            to_remove = list(taskitems.with_subtrees(items) if recursive else items)
+            removed = set()   # subtasks go with their parent
+            for item in to_remove:
+                if id(item) not in removed:
+                    removed.update(id(it) for it in self.todo.remove_item(item, subtasks=recursive))
+            return to_remove
+
+    def move(self, item: dict, offset: int) -> bool:
+        """
+        moves an item (and its subtasks) up (offset < 0) or down past `offset` sibling items. Returns False if it
+        can't move that far (then nothing changes).
+        """
+        with self._lock:
+            assert self.todo is not None
+            return self.todo.move_item(item, offset)
+
+    def move_to(self, items: Iterable[dict], to: Union[int, str, None] = None, *,
+                store: Optional["TodoStore"] = None) -> list[dict]:
+        """
+        moves items (with their subtasks), all in one pass, to `store` (default: this one): before the item at index
+        `to`, at the end of section `to` (e.g. '## Later', before its subsections) or after the last item (if `to` is
+        None or past the last index). Items keep their IDs. Returns the items moved, not counting subtasks. Raises
+        ValueError if there is nowhere to put them (then nothing changes). Both stores need to be saved.
+        """
+        store = store or self
+        # locks are always taken in the same order, or two moves between the same stores could deadlock
+        first, second = sorted((self, store), key=id)
+        with first._lock, second._lock:
+            items = list(items)
+            target_items = store.items   # loads both lists if needed
+            if not items or not self.items:
+                return []
+            source, target = self.todo, store.todo
+            assert source is not None and target is not None
+            moving = {id(item) for item in taskitems.with_subtrees(items)}
+            # where they go is found relative to a token that stays, before anything changes
+            anchor, at_end = None, True
+            if isinstance(to, str):
+                siblings, section = target.insertion_point(to)
+            else:
+                if to is not None and to < len(target_items):
+                    anchor, at_end = target_items[to], False
+                    if id(anchor) in moving:
+                        raise ValueError(f"can't move items next to item {to}, it is one of them")
+                else:
+                    staying = [item for item in target_items if id(item) not in moving]
+                    if not staying:
+                        raise ValueError(f"no items in {store.path} to move items after, give a section instead")
+                    anchor = staying[-1]
+                    while anchor['parent_task'] is not None:
+                        anchor = anchor['parent_task']
+                siblings, section = anchor['parent'], anchor['section']
+
+            detached = source.detach_items(items)
+            if at_end:
+                position = len(siblings)
+            else:
+                position = next(i for i, tok in enumerate(siblings) if tok is anchor['token'])
+            target.insert_items(detached, siblings, position, section)
+            return detached
+
+    @property
+    def changed(self) -> bool:
+        """whether there are changes to save (marking an item done twice or undoing a change is no change)"""
+        with self._lock:
+            return self.todo is not None and self.todo.dirty
+
+    def save(self) -> bool:
+        """writes the items back to the file if anything changed, returns whether it was written"""
+        with self._lock:
+            if self.todo is None:
+                return False
+            return backup_command.save_with_backups(self.path, self.todo, self.context.settings)
+
+    async def aload(self) -> list[dict]:
+        return await asyncio.to_thread(self.load)
+
+    async def aselect(self, **criteria) -> list[dict]:
+        return await asyncio.to_thread(self.select, **criteria)
+
+    async def amark(self, checked: bool = True, **kwargs) -> list[dict]:
+        return await asyncio.to_thread(self.mark, checked, **kwargs)
+
+    async def aadd(self, text: str, **kwargs) -> dict:
+        return await asyncio.to_thread(self.add, text, **kwargs)
+
+    async def aremove(self, **kwargs) -> list[dict]:
+        return await asyncio.to_thread(self.remove, **kwargs)
+
+    async def amove(self, item: dict, offset: int) -> bool:
+        return await asyncio.to_thread(self.move, item, offset)
+
+    async def amove_to(self, items: Iterable[dict], to: Union[int, str, None] = None, **kwargs) -> list[dict]:
+        return await asyncio.to_thread(self.move_to, items, to, **kwargs)
+
+    async def asave(self) -> bool:
+        return await asyncio.to_thread(self.save)
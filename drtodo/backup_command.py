@@ -1,12 +1,13 @@
 import time
 from pathlib import Path
+from typing import Optional
 
 import typer
 
 from typer_aliases import Typer
 
-from .rich_display import console
-from . import config
+from . import config, counts, filecache, history, linescan, metrics, profiling, sidecar
+from .rich_display import console, error_console
 
 app = Typer()
 
@@ -19,34 +20,71 @@ def make_backup_path(pathname: Path, i: int) -> Path:
     return pathname.with_name(f".{pathname.name.removeprefix('.')}.bak-{i}")
 
 
-def save_with_backups(pathname: Path, todo):
+def save_with_backups(pathname: Path, todo, settings: Optional[config.Settings] = None) -> bool:
     """
-    Saves the todo to the given pathname, making n backups as configured.
+    Saves the todo to the given pathname, making n backups as configured (in `settings`, default config.settings).
+    Nothing is written (and backups are not rotated) if the todo has not changed. Returns whether it was saved.
     """
+    if not getattr(todo, 'dirty', True):
+        return False
+    settings = settings or config.settings
+    start = time.perf_counter()
     # first write to a temp file with a '.tmp' extension
     tmpfilepath = pathname.with_suffix(pathname.suffix + '.tmp')
-    todo.write(tmpfilepath)
+    with profiling.span("save.write"):
+        todo.write(tmpfilepath)
 
     # if file write worked, then we can perform the rename dance
-    n = config.settings.keep_backups
-    if n > 0:
-        # we keep n backups named as '.bak-1' (for the most recent n-1 backup), '.bak-2', etc.)
-        # first delete the oldest backup
-        make_backup_path(pathname, n).unlink(missing_ok=True)
-        for i in range(n, 0, -1):
-            bakfilepath = make_backup_path(pathname, i)
-            if bakfilepath.exists():
-                bakfilepath.rename(make_backup_path(pathname, i + 1))
-        # rename the original file to '.bak-1'
-        pathname.rename(make_backup_path(pathname, 1))
-    # finally, rename the temp file to the original filename
-    tmpfilepath.rename(pathname)
+    with profiling.span("save.backups"):
+        n = settings.keep_backups
+        if n > 0:
+            # we keep n backups named as '.bak-1' (for the most recent n-1 backup), '.bak-2', etc.)
+            # first delete the oldest backup
+            make_backup_path(pathname, n).unlink(missing_ok=True)
+            for i in range(n, 0, -1):
+                bakfilepath = make_backup_path(pathname, i)
+                if bakfilepath.exists():
+                    bakfilepath.rename(make_backup_path(pathname, i + 1))
+            # rename the original file to '.bak-1'
+            pathname.rename(make_backup_path(pathname, 1))
+        # finally, rename the temp file to the original filename
+        tmpfilepath.rename(pathname)
+
+    with profiling.span("save.sidecar"):
+        if settings.sidecar_index:
+            sidecar.update(pathname, todo, settings.section)
+        else:
+            sidecar.remove_index(pathname)
+        if isinstance(todo, sidecar.PatchedFile):
+            checked = todo.all_checked()
+        else:
+            checked = [item['checked'] for item in todo.items]
+        counts.store(filecache.cache_dir(settings), pathname, settings.section, counts.count_checked(checked))
+    metrics.observe("save", time.perf_counter() - start)
+
+    if settings.metrics_file:
+        _write_metrics(pathname, todo, Path(settings.metrics_file).expanduser())
+    return True
+
+
+def _write_metrics(pathname: Path, todo, metrics_file: Path):
+    """post-save hook: refreshes the metrics textfile with the counts of the file just saved"""
+    if isinstance(todo, sidecar.PatchedFile):
+        pairs = zip((entry[sidecar.HEADING] for entry in todo.index['items']), todo.all_checked())
+    else:
+        pairs = ((item.get('section', ''), item['checked']) for item in todo.items)
+    metrics.record_file(pathname, metrics.section_counts(pairs))
+    try:
+        metrics.write(metrics_file)
+    except OSError:
+        pass   # metrics must never get in the way of saving
 
 
-def restore_backup(pathname: Path):
+def restore_backup(pathname: Path, keep_backups: int):
     """
-    Rolls back backup files by one. This can be very destructive, call with care.
+    Rolls back backup files by one (of `keep_backups` kept). This can be very destructive, call with care.
     """
+    sidecar.remove_index(pathname)   # would no longer match the file
     # first rename the current file pathname as .tmp
     tmpfilepath = pathname.with_suffix(pathname.suffix + '.tmp')
     pathname.rename(tmpfilepath)
@@ -54,7 +92,7 @@ def restore_backup(pathname: Path):
         # rename the most recent backup to the original filename
         make_backup_path(pathname, 1).rename(pathname)
         # then rename backups in reverse order
-        for i in range(2, config.settings.keep_backups + 1):
+        for i in range(2, keep_backups + 1):
             bakfilepath = make_backup_path(pathname, i)
             if bakfilepath.exists():
                 bakfilepath.rename(make_backup_path(pathname, i - 1))
@@ -63,8 +101,8 @@ def restore_backup(pathname: Path):
         tmpfilepath.unlink()
 
 
-def scan_backups(pathname: Path):
-    n = config.settings.keep_backups
+def scan_backups(pathname: Path, keep_backups: int):
+    n = keep_backups
     if n > 0:
         for i in range(n, 0, -1):
             bakfilepath = make_backup_path(pathname, i)
@@ -72,6 +110,23 @@ def scan_backups(pathname: Path):
                 yield i, bakfilepath
 
 
+def file_items(pathname: Path, section: str) -> list[dict]:
+    """
+    Returns the items of a todo file or backup, scanned (parsing markdown only where scanning can't be exact, like
+    `history`). Parses are cached by inode: backups are only ever renamed, never written to, so a backup is parsed once
+    however many times backups rotate (and a file parsed now is already parsed when it becomes the next backup).
+    """
+    st = pathname.stat()
+    key = f"{st.st_dev}:{st.st_ino}"
+    fp = filecache.fingerprint(pathname, section)
+    items = filecache.load("backup", key, fp)
+    if items is None:
+        with profiling.span("backup.scan"):
+            items = [item for item in linescan.stream_file_tasks(pathname, section)]   # list() is the command below
+        filecache.store("backup", key, fp, items)
+    return items
+
+
 def _print_file(index, filepath: Path):
     modtime = time.ctime(filepath.stat().st_mtime)
     console().print(f"[index]{index:>3}:[/index] [hash]{modtime}[/hash] [text]{config.make_pretty_path(filepath)}[/text]")
@@ -86,7 +141,7 @@ def list():
     """
     for location in config.globals.todo_files:
         if location and location.exists():
-            for i, bakfile in scan_backups(location):
+            for i, bakfile in scan_backups(location, config.settings.keep_backups):
                 _print_file(-i, bakfile)
             _print_file('now', location)
             break   # only the first valid location is processed
@@ -102,13 +157,54 @@ def restore():
         if location and location.exists():
             console().print(f"[warning]Restoring backup for [text]{config.make_pretty_path(location)}[/text] file will be overwritten![/warning]")
             if force_operation or typer.confirm("Proceed?"):
-                restore_backup(location)
+                restore_backup(location, config.settings.keep_backups)
                 _print_file('restored', location)
             else:
                 console().print("[error]skipped, use --force to proceed[/error]")
             break
 
 
+@app.command(context_settings={"ignore_unknown_options": True})   # so that -1 is an argument, not an option
+def diff(
+    backup: str = typer.Argument("1", help="Backup to compare with: 1 or -1 for the most recent one, 2 or -2 for the "
+                                 "one before, etc."),
+    count: bool = typer.Option(False, "--count", "-c", help="Just show the number of items changed"),
+):
+    """
+    Shows the items changed since a backup (i.e. what restoring it would undo): added, checked, unchecked and removed
+    """
+    from .main import print_todo_item
+
+    try:
+        n = abs(int(backup))
+    except ValueError:
+        n = 0
+    if n == 0:
+        error_console().print(f"error: invalid backup '{backup}', must be a number like 1 or -1")
+        raise typer.Exit(2)
+    titles = {"added": "Added", "completed": "Checked", "reopened": "Unchecked", "removed": "Removed"}
+    for location in config.globals.todo_files:
+        if location and location.exists():
+            bakfilepath = make_backup_path(location, n)
+            if not bakfilepath.exists():
+                error_console().print(f"error: no backup -{n} of {config.make_pretty_path(location)}")
+                raise typer.Exit(2)
+            changes = history.diff(file_items(bakfilepath, config.settings.section),
+                                   file_items(location, config.settings.section))
+            if count:
+                console().print(", ".join(f"{len(items)} {titles[change].lower()}" for change, items in changes.items()),
+                                highlight=False)
+            else:
+                for change, items in changes.items():
+                    if items:
+                        console().print(f"[header]{titles[change]}[text]")
+                        for item in items:
+                            print_todo_item(item)
+                if not any(changes.values()) and config.settings.verbose:
+                    error_console().print(f"no changes since backup -{n}")
+            break   # only the first valid location is processed
+
+
 # handle global options
 @app.callback()
 def main(
@@ -0,0 +1,236 @@
+"""
+Shell completion of task items and sections.
+
+Item specs, `--id`, `--index` and `--section` values are completed from the sidecar index of each todo file, which
+already holds the index, ID, text and heading of every item (see `sidecar`). Indexes are only trusted if the size and
+modification time of their file match, so completing does not even read the todo files.
+
+Completion runs on every TAB, so there are two ways in:
+- `fast_complete()`, called by the `todo` entry point (see `fastpath`) before anything else is imported. It handles
+  the common cases straight from the sidecar indexes, with the standard library only (no typer, rich or mistune).
+- the `shell_complete` providers of the CLI parameters, which typer calls for everything else, e.g. when an index is
+  missing or stale. Those parse the files and write fresh indexes, so the next TAB takes the fast path again.
+
+This module must stay cheap to import: standard library only (plus sidecar).
+"""
+import os
+import re
+import shlex
+import sys
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional
+
+from . import sidecar
+
+__all__ = ["CompletionData", "complete_sections", "complete_tasks", "fast_complete", "from_items", "load"]
+
+HELP_WIDTH = 60
+"""Maximum length of item texts shown next to completions (in shells that show them)."""
+
+SHORT_ID = 7
+
+WHITESPACE_RE = re.compile(r'\s')
+
+# what fast_complete() knows about the command line. Anything else is left to typer.
+GLOBAL_VALUE_OPTIONS = ("--section", "--done-section", "--mdfile", "--profile-format", "--profile-output")
+TASK_COMMANDS = ("list", "ls", "done", "undone", "remove", "rm", "move", "mv")
+TASK_VALUE_OPTIONS = ("--id", "-i", "--index", "-n", "--range", "-r", "--match", "-m", "--grep", "-g", "--sort", "-s",
+                      "--top", "-t", "--depth", "-d", "--limit", "-l", "--offset", "-o", "--since", "--at",
+                      "--to")
+TASK_FLAG_OPTIONS = ("--all", "-a", "--recursive", "-R", "--count", "-c", "--any", "--fixed-strings", "-F",
+                     "--ignore-case", "-I", "--word", "-w", "--to-global", "--to-local")
+
+
+class CompletionData:
+    """Items (as dicts with index, id, checked, text and section) and headings of one todo file."""
+
+    def __init__(self, items: list[dict], headings: list[str]):
+        self.items = items
+        self.headings = headings
+
+
+def load(todofile: Path, section: str) -> Optional[CompletionData]:
+    """Returns completion data from the sidecar index of a todo file, or None if there is no valid index for it."""
+    index = sidecar.read_index(todofile, section, verify_hash=False)
+    if index is None:
+        return None
+    return CompletionData([sidecar.entry_to_item(entry) for entry in index['items']], index.get('headings', []))
+
+
+def from_items(todofile: Path, items: Iterable[dict]) -> CompletionData:
+    """Returns completion data for parsed items, when there is no sidecar index."""
+    from .linescan import scan_headings
+
+    items = [{key: item[key] for key in ('index', 'id', 'checked', 'text', 'section')} for item in items]
+    return CompletionData(items, scan_headings(todofile.read_bytes()))
+
+
+def describe(item: dict) -> str:
+    """Short description of an item for completion help: its checked state and (truncated) first line of text."""
+    text = ' '.join(item['text'].split())
+    if len(text) > HELP_WIDTH:
+        text = text[:HELP_WIDTH - 1] + '…'
+    return f"{'[x]' if item['checked'] else '[ ]'} {text}"
+
+
+def complete_tasks(data: Iterable[CompletionData], incomplete: str, *,
+                   indices: bool = True, ids: bool = True) -> list[tuple[str, str]]:
+    """
+    Returns (value, help) completions for item indices and/or short IDs starting with `incomplete`.
+    When both are possible, IDs are only offered once something has been typed, to keep the list short.
+    """
+    incomplete = incomplete.strip()
+    by_index = []
+    by_id = []
+    for d in data:
+        for item in d.items:
+            if indices and str(item['index']).startswith(incomplete):
+                by_index.append((str(item['index']), describe(item)))
+            if ids and (incomplete or not indices) and item['id'].startswith(incomplete.lower()):
+                by_id.append((item['id'][:max(SHORT_ID, len(incomplete))], describe(item)))
+    return by_index + by_id
+
+
+def complete_sections(data: Iterable[CompletionData], incomplete: str) -> list[tuple[str, str]]:
+    """Returns (value, help) completions for headings matching `incomplete`, with or without their leading #s."""
+    incomplete = incomplete.casefold()
+    results: dict[str, str] = {}
+    for d in data:
+        for heading in d.headings:
+            name = heading.lstrip('#').strip()
+            if heading.casefold().startswith(incomplete):
+                results.setdefault(heading, name)
+            elif name.casefold().startswith(incomplete):
+                results.setdefault(name, heading)
+    return list(results.items())
+
+
+def _split_arg_string(string: str) -> list[str]:
+    """splits a command line like a shell would, keeping an unterminated last argument (same as click)"""
+    lexer = shlex.shlex(string, posix=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ''
+    out = []
+    try:
+        for token in lexer:
+            out.append(token)
+    except ValueError:
+        out.append(lexer.token)
+    return out
+
+
+def _completion_args(shell: str) -> tuple[list[str], str]:
+    """returns (args, incomplete) for the completion request, the same way typer's completion classes do"""
+    if shell == "bash":
+        cwords = _split_arg_string(os.environ["COMP_WORDS"])
+        cword = int(os.environ["COMP_CWORD"])
+        args = cwords[1:cword]
+        incomplete = cwords[cword] if cword < len(cwords) else ""
+        return args, incomplete
+    completion_args = os.environ.get("_TYPER_COMPLETE_ARGS", "")
+    args = _split_arg_string(completion_args)[1:]
+    if args and not completion_args.endswith(" "):
+        return args[:-1], args[-1]
+    return args, ""
+
+
+def _format(shell: str, completions: list[tuple[str, str]]) -> str:
+    """formats completions the way typer's completion scripts expect them"""
+    if shell == "bash":
+        return "\n".join(value for value, _ in completions)
+    if shell == "zsh":
+        def escape(s: str) -> str:
+            return s.replace('"', '""').replace("'", "''").replace("$", "\\$").replace("`", "\\`")
+        if not completions:
+            return "_files"
+        items = "\n".join(f'"{escape(value)}":"{escape(help)}"' for value, help in completions)
+        return f"_arguments '*: :(({items}))'"
+    # fish: one line per completion, help after a tab
+    return "\n".join(f"{value}\t{WHITESPACE_RE.sub(' ', help)}" for value, help in completions)
+
+
+def _target(args: list[str], incomplete: str) -> Optional[tuple[str, dict]]:
+    """
+    Works out what is being completed: ('spec' | 'id' | 'index' | 'section', global options), or None if it is
+    anything else (or the command line is not understood).
+    """
+    if incomplete.startswith('-'):
+        return None   # option names
+    options: dict = {}
+    args = list(args)
+    while args and args[0].startswith('-'):
+        arg = args.pop(0)
+        name, eq, value = arg.partition('=')
+        if name in GLOBAL_VALUE_OPTIONS:
+            if not eq:
+                if not args:
+                    return ('section', options) if name == '--section' else None
+                value = args.pop(0)
+            options[name] = value
+        elif arg in ("--global", "-G"):
+            options['--global'] = True
+        elif arg in ("--local", "-L"):
+            options['--global'] = False
+        elif arg not in ("--verbose", "-v", "--quiet", "-q", "--reverse-order", "--normal-order", "--profile"):
+            return None
+    if not args or args.pop(0) not in TASK_COMMANDS:
+        return None
+
+    positionals = 0
+    while args:
+        arg = args.pop(0)
+        if arg in TASK_VALUE_OPTIONS:
+            if not args:
+                return {'--id': 'id', '-i': 'id', '--index': 'index', '-n': 'index'}.get(arg), options
+            args.pop(0)
+        elif arg.startswith('-'):
+            if arg.split('=', 1)[0] not in TASK_VALUE_OPTIONS + TASK_FLAG_OPTIONS:
+                return None
+        else:
+            positionals += 1
+    return ('spec', options) if positionals == 0 else None
+
+
+def fast_complete(prog_name: Optional[str] = None) -> bool:
+    """
+    Handles a shell completion request if this is one and it can be handled without the full CLI.
+    Returns False if it was not handled (then it is up to typer).
+    """
+    prog_name = prog_name or os.path.basename(sys.argv[0])
+    instruction = os.environ.get(f"_{prog_name}_COMPLETE".replace("-", "_").upper(), "")
+    shell = instruction.partition("_")[2]
+    if not instruction.startswith("complete_") or shell not in ("bash", "zsh", "fish"):
+        return False
+
+    from .fastpath import light_config
+
+    try:
+        args, incomplete = _completion_args(shell)
+    except (KeyError, ValueError):
+        return False
+    target = _target(args, incomplete)
+    if target is None or target[0] is None:
+        return False
+    kind, options = target
+    light = light_config(force_global=bool(options.get('--global')), section=options.get('--section'))
+    if light is None:
+        return False
+    data = []
+    for todofile in light.todo_files:
+        d = load(todofile, light.section)
+        if d is None:
+            return False   # let the CLI parse the file (and index it for next time)
+        data.append(d)
+
+    if kind == 'section':
+        completions = complete_sections(data, incomplete)
+    else:
+        completions = complete_tasks(data, incomplete, indices=kind != 'id', ids=kind != 'index')
+
+    if shell == "fish" and os.environ.get("_TYPER_COMPLETE_FISH_ACTION") == "is-args":
+        sys.exit(0 if completions else 1)
+    output = _format(shell, completions)
+    if output:
+        print(output)
+    return True
@@ -1,22 +1,17 @@
-import os
 import getpass
+import os
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Optional, Any, Union
+from typing import Any, Optional, Union
 
 import typer
-from pydantic import BaseModel, BaseSettings, Field
-
-try:
-    import tomllib as toml
-except ImportError:
-    import tomli as toml
 from git.repo import Repo
+from pydantic import BaseModel, BaseSettings, Field
 
-from . import __version__
+from . import __version__, fastpath, profiling
 from .rich_display import console, error_console
 
-__all__ = ["constants", "settings", "globals", "make_pretty_path", "Style"]
+__all__ = ["ConfigError", "Style", "check_todo_files", "constants", "discover", "globals", "make_pretty_path", "settings"]
 
 
 @dataclass(frozen=True)
@@ -66,6 +61,16 @@ class Settings(BaseSettings):
     style: Union[Style, str] = ''
     done_section: str = Field('', env=constants.env_prefix + 'DONE_SECTION')
     """Section to move done items to. If empty, done items are removed."""
+    sidecar_index: bool = True
+    """Keep a small index next to each todo file (e.g. .TODO.md.idx) so single items can be updated without parsing."""
+    sql_index: bool = False
+    """Mirror todo files in a SQLite database in the cache folder, so list and stats query it instead of parsing."""
+    cache_dir: str = Field('', env=constants.env_prefix + 'CACHE_DIR')
+    """Folder for caches and indexes. If empty, a 'cache' folder in the app dir is used (if it exists)."""
+    metrics_file: str = Field('', env=constants.env_prefix + 'METRICS_FILE')
+    """Prometheus textfile (e.g. for node_exporter) refreshed with task counts and latencies after every command."""
+    sync_remote: str = Field('', env=constants.env_prefix + 'SYNC_REMOTE')
+    """Default remote for `todo sync`: a folder, or the URL of a sync server (see `todo sync-server`)."""
 
     # def __init__(self, **kwargs):
     #     super().__init__(**kwargs)
@@ -104,21 +109,8 @@ class Globals:
 globals: Globals = Globals()
 
 
-def _load_config(config_folder: Path, config_filename: Path) -> dict[str, Any]:
-    """
-    Load config file from config folder, if it exists, and overlay with user specific config file if it exists there as well.
-    Returns an empty dict if nothing is found.
-    """
-    result = {}
-    if config_folder.exists() and config_folder.is_dir():
-        config_file = config_folder / config_filename.name
-        config_file_user = config_folder / f"{config_filename.stem}.{constants.username}.{config_filename.suffix}"
-
-        if config_file.exists():
-            result |= toml.loads(config_file.read_text())
-        if config_file_user.exists():
-            result |= toml.loads(config_file_user.read_text())
-    return result
+# shared with the fast entry point, which can't import this module (too slow to import)
+_load_config = fastpath.load_config
 
 
 def make_pretty_path(path: Optional[Path]) -> Optional[Path]:
@@ -132,71 +124,85 @@ def make_pretty_path(path: Optional[Path]) -> Optional[Path]:
     return path
 
 
-def preclioptions_initialize(*, force_global: bool = False):
-    """initializes globals and settings from config files. Called before command line options are processed."""
-    # TODO: this needs to be different perhaps. Some command line options need to be read first because they decide where
-    # to look for config files or not.
+class ConfigError(Exception):
+    """The todo files to operate on can't be found with the current config."""
 
+
+def discover(*, force_global: bool = False, cwd: Optional[Path] = None) -> tuple[Settings, Globals]:
+    """
+    Reads config files (and env variables) for the given folder (default: the current one), returns the settings and
+    the todo files to operate on (in the todo_files of a new Globals, empty if they don't exist, see
+    check_todo_files()). Module state is not touched, so this can be used for any folder, from any thread.
+    """
     config_dict: dict[str, Any] = {}
+    found = Globals()
 
-    globals._ignore_config = os.environ.get(constants.env_prefix + 'IGNORE_CONFIG', 'false').lower() == 'true'
+    found._ignore_config = os.environ.get(constants.env_prefix + 'IGNORE_CONFIG', 'false').lower() == 'true'
 
-    globals._gitroot = None
     if not force_global:
         # find root of git repo
-        try:
-            repo = Repo(None, search_parent_directories=True)
-            # found repo root, read local config file there
-            globals._gitroot = Path(repo.git_dir).parent
-            # print(f"found git at {globals.gitroot}")
-        except Exception:
-            # print("not under a git repo")
-            pass
-
-    globals._local_mode = False
-    if globals._gitroot:
-        loaded = _load_config(globals._gitroot, Path(".drtodo.toml"))
-        if loaded:  # if under git repo and configured for drtodo, use local mode
-            globals._local_mode = True
-        if not globals._ignore_config:
-            config_dict |= loaded
-
-    if not globals._local_mode and not globals._ignore_config:
-        # load either config.toml or config.{username}.toml
-        config_dict |= _load_config(constants.appdir, Path("config.toml"))
-
-    global settings
-    settings = Settings(**config_dict)
-    settings.update_values()
-    # command line options are processed later and will override anything
-
-    globals._global_todofile = constants.appdir / settings.mdfile
-    globals._local_todofile = globals._gitroot / settings.mdfile if globals._gitroot else None
-
+        with profiling.span("config.git_discovery"):
+            try:
+                repo = Repo(cwd, search_parent_directories=True)
+                # found repo root, read local config file there
+                found._gitroot = Path(repo.git_dir).parent
+            except Exception:
+                # not under a git repo
+                pass
+
+    with profiling.span("config.settings"):
+        if found._gitroot:
+            loaded = _load_config(found._gitroot, Path(".drtodo.toml"))
+            if loaded:  # if under git repo and configured for drtodo, use local mode
+                found._local_mode = True
+            if not found._ignore_config:
+                config_dict |= loaded
+
+        if not found._local_mode and not found._ignore_config:
+            # load either config.toml or config.{username}.toml
+            config_dict |= _load_config(constants.appdir, Path("config.toml"))
+
+        found_settings = Settings(**config_dict)
+        found_settings.update_values()
+
+    found._global_todofile = constants.appdir / found_settings.mdfile
+    found._local_todofile = found._gitroot / found_settings.mdfile if found._gitroot else None
 
     # Initializes the todo_files list with the appropriate files to operate on, in priority order.
     # In the future, some commands may operate on all of them (typically the least destructive ones),
     # others on just the first one (usually more destructive).
+    todofile = found._local_todofile if found._local_mode else found._global_todofile
+    if todofile is not None and todofile.exists():
+        found.todo_files = [todofile]
+    return found_settings, found
+
+
+def check_todo_files(found: Globals):
+    """Raises ConfigError if there are no todo files to operate on, explaining why."""
+    if found.todo_files:
+        return
+    if found._local_mode:
+        raise ConfigError(f"local todo file {make_pretty_path(found._local_todofile)} does not exist")
+    if not constants.appdir.exists():
+        # we may operate without a global config folder, but not in global mode
+        raise ConfigError(f"DrToDo folder {constants.appdir} does not exist. Use `todo init` to create it.")
+    raise ConfigError(f"global todo file {make_pretty_path(found._global_todofile)} does not exist")
 
-    if globals._local_mode:
-        if globals._local_todofile is not None and globals._local_todofile.exists():
-            # operate on local todo list
-            globals.todo_files = [globals._local_todofile]
-        else:
-            error_console().print(f"error: local todo file {make_pretty_path(globals._local_todofile)} does not exist")
-            raise typer.Exit(2)
-    else:
-        if not constants.appdir.exists():
-            # we may operate without a global config folder, but not in global mode
-            error_console().print(f"DrToDo folder {constants.appdir} does not exist. Use [bold]todo init[/bold] to create it.")
-            raise typer.Exit(2)
-
-        if globals._global_todofile is not None and globals._global_todofile.exists():
-            # operate from global todo list
-            globals.todo_files = [globals._global_todofile]
-        else:
-            error_console().print(f"error: global todo file {make_pretty_path(globals._global_todofile)} does not exist")
-            raise typer.Exit(2)
+
+def preclioptions_initialize(*, force_global: bool = False):
+    """initializes globals and settings from config files. Called before command line options are processed."""
+    # TODO: this needs to be different perhaps. Some command line options need to be read first because they decide where
+    # to look for config files or not.
+    global settings
+    settings, found = discover(force_global=force_global)
+    # command line options are processed later and will override anything
+    for name in ('todo_files', '_local_mode', '_ignore_config', '_gitroot', '_global_todofile', '_local_todofile'):
+        setattr(globals, name, getattr(found, name))
+    try:
+        check_todo_files(found)
+    except ConfigError as e:
+        error_console().print(f"error: {e}")
+        raise typer.Exit(2)
 
 
 def postclioptions_initialize(*, force_global: bool, force_local: bool):
@@ -275,5 +281,3 @@ def get_default_config() -> str:
             x += f"{k} = {tomlv}\n"
     return x
 
-
-preclioptions_initialize()  # HACK: need to initialize this before main() is called
@@ -0,0 +1,168 @@
+"""
+Open and done counts of todo files, fast enough to run on every shell prompt (`todo count`).
+
+Counts are kept in tiny counter files in the cache folder, one per todo file, recording the size and modification
+time of the file they were counted from (and the section setting). A valid counter file costs a stat and a small read,
+so `todo count` is answered by `fastpath` without importing the full CLI. A stale one (the file was changed since) is
+refreshed with a quick line scan (see `linescan.stream_file_tasks`, no markdown parsing unless needed), and saving a todo file refreshes
+it too (see `backup_command.save_with_backups`).
+
+This module must stay cheap to import: standard library only (plus linescan).
+"""
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Iterable
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from .linescan import stream_file_tasks
+
+__all__ = ["FORMATS", "Counts", "count_checked", "count_file", "count_files", "fast_count", "format_counts", "store"]
+
+VERSION = 1
+
+FORMATS = ("text", "prompt", "json")
+
+
+class Counts(NamedTuple):
+    open: int
+    done: int
+
+    def __add__(self, other) -> "Counts":
+        return Counts(self.open + other.open, self.done + other.done)
+
+
+def _counter_path(cache_dir: Path, pathname: Path) -> Path:
+    key = hashlib.sha1(str(pathname.resolve()).encode('utf-8')).hexdigest()
+    return cache_dir / "counts" / f"{key}.json"
+
+
+def _load(cache_dir: Path, pathname: Path, section: str, st: os.stat_result) -> Optional[Counts]:
+    try:
+        data = json.loads(_counter_path(cache_dir, pathname).read_text())
+    except (OSError, ValueError):
+        return None
+    if (data.get('version') != VERSION or data.get('section') != section or
+            data.get('size') != st.st_size or data.get('mtime_ns') != st.st_mtime_ns):
+        return None
+    return Counts(data['open'], data['done'])
+
+
+def store(cache_dir: Optional[Path], pathname: Path, section: str, counts: Counts,
+          st: Optional[os.stat_result] = None):
+    """records the counts of a todo file as it is now (or as of `st`), errors are ignored (it's just a cache)"""
+    if cache_dir is None:
+        return
+    try:
+        st = st or pathname.stat()
+        path = _counter_path(cache_dir, pathname)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {'version': VERSION, 'section': section, 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                'open': counts.open, 'done': counts.done}
+        # write then rename, so a prompt running at the same time never reads half a file
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        tmp.replace(path)
+    except OSError:
+        pass
+
+
+def count_checked(checked: Iterable[bool]) -> Counts:
+    """
+    counts the checked states of the items of a todo file, the only way counts are made: whether scanned here or
+    parsed when saving, the items are those of the parser (see `linescan.stream_file_tasks`)
+    """
+    done = total = 0
+    for state in checked:
+        total += 1
+        done += state
+    return Counts(total - done, done)
+
+
+def count_file(pathname: Path, section: str, cache_dir: Optional[Path] = None) -> Counts:
+    """returns the counts of a todo file, from its counter file in `cache_dir` if still valid, else scanning it"""
+    st = pathname.stat()
+    if cache_dir is not None:
+        counts = _load(cache_dir, pathname, section, st)
+        if counts is not None:
+            return counts
+    counts = count_checked(item['checked'] for item in stream_file_tasks(pathname, section))
+    store(cache_dir, pathname, section, counts, st)
+    return counts
+
+
+def count_files(pathnames: list[Path], section: str, cache_dir: Optional[Path] = None) -> Counts:
+    """returns the total counts of the given todo files"""
+    return sum((count_file(pathname, section, cache_dir) for pathname in pathnames), Counts(0, 0))
+
+
+def format_counts(counts: Counts, format: str) -> str:
+    """
+    formats counts for output: 'text' is "3 open, 2 done", 'prompt' the number of open items (nothing when there
+    are none, so a prompt segment disappears) and 'json' {"open": 3, "done": 2}
+    """
+    if format == "prompt":
+        return str(counts.open) if counts.open else ""
+    if format == "json":
+        return json.dumps(counts._asdict())
+    return f"{counts.open} open, {counts.done} done"
+
+
+def _count_args(args: list[str]) -> Optional[tuple[dict, str]]:
+    """parses `[global options] count [--format F]`, returns (global options, format) or None if not understood"""
+    options: dict = {}
+    args = list(args)
+    while args and args[0].startswith('-'):
+        name, eq, value = args.pop(0).partition('=')
+        if name == '--section':
+            if not eq:
+                if not args:
+                    return None
+                value = args.pop(0)
+            options['--section'] = value
+        elif name in ("--global", "-G") and not eq:
+            options['--global'] = True
+        elif name in ("--local", "-L") and not eq:
+            options['--global'] = False
+        elif name not in ("--quiet", "-q") or eq:
+            return None
+    if not args or args.pop(0) != "count":
+        return None
+    format = "text"
+    while args:
+        name, eq, value = args.pop(0).partition('=')
+        if name not in ("--format", "-f"):
+            return None
+        if not eq:
+            if not args:
+                return None
+            value = args.pop(0)
+        format = value
+    return (options, format) if format in FORMATS else None
+
+
+def fast_count(args: Optional[list[str]] = None) -> bool:
+    """
+    Handles `todo count` if that is the command and it can be handled without the full CLI.
+    Returns False if it was not handled (then it is up to the full CLI, which also reports any error).
+    """
+    parsed = _count_args(sys.argv[1:] if args is None else args)
+    if parsed is None:
+        return False
+
+    from .fastpath import light_config
+
+    options, format = parsed
+    light = light_config(force_global=bool(options.get('--global')), section=options.get('--section'))
+    if light is None:
+        return False
+    try:
+        counts = count_files(light.todo_files, light.section, light.cache_dir)
+    except OSError:
+        return False
+    output = format_counts(counts, format)
+    if output:
+        print(output)
+    return True
@@ -0,0 +1,44 @@
+"""
+Duplicate task items (`todo dedupe`, and the warning of `todo add`).
+
+Items are duplicates when they have the same normalized text (see taskitems.normalize_text(): metadata, case and
+spacing don't count) and are subtasks of the same task (or both top level tasks): the same subtask under two
+different tasks is not a duplicate. Exact duplicates, with the same ID, are just the most common case. Items with
+only metadata (e.g. `@bob P1`) have no text to compare, so they are never duplicates.
+
+Duplicates are found in a single pass over all the items, grouping them in a dict by that key.
+"""
+from collections.abc import Iterable
+from typing import Optional
+
+from .taskitems import item_normalized, normalize_text
+
+__all__ = ["find_duplicates", "keeper", "similar_items"]
+
+
+def _key(item: dict) -> tuple[Optional[str], str]:
+    parent = item.get('parent_task')
+    return (item_normalized(parent) if parent is not None else None), item_normalized(item)
+
+
+def find_duplicates(items: Iterable[dict]) -> list[list[dict]]:
+    """returns the groups of duplicate items (two or more), each in the order items were given"""
+    groups: dict[tuple[Optional[str], str], list[dict]] = {}
+    for item in items:
+        key = _key(item)
+        if key[1]:
+            groups.setdefault(key, []).append(item)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def keeper(group: list[dict]) -> dict:
+    """returns the item of a group of duplicates to keep: the first one done, or the first one if none is done"""
+    return next((item for item in group if item['checked']), group[0])
+
+
+def similar_items(items: Iterable[dict], text: str) -> list[dict]:
+    """returns the items that a new task with the given text would duplicate (at any level)"""
+    normalized = normalize_text(text)
+    if not normalized:
+        return []
+    return [item for item in items if item_normalized(item) == normalized]
@@ -0,0 +1,229 @@
+"""
+Static report of todo files (`todo export`): an index page, a page per file and a page per section of each file, as
+HTML or Markdown.
+
+Exports are incremental. A manifest in the output folder records, for each todo file, its size and modification time,
+its summary (counts per section) and the content hash of every page written for it:
+- unchanged files are not even read, their summaries come from the manifest
+- a changed file is scanned (with `linescan`, parsed only where scanning can't be exact), and each of its pages is rendered and written only
+  if the hash of its task set changed
+- the index page is built from the summaries, and rewritten only if they changed
+
+Changed files are exported in a process pool when there are enough of them (a full rebuild of many files).
+"""
+import hashlib
+import html
+import json
+import os
+import re
+from collections.abc import Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from . import linescan, profiling
+
+__all__ = ["FORMATS", "ExportResult", "export"]
+
+VERSION = 1
+"""Version of the output, part of all page hashes: bump it when pages change, so everything is written again."""
+
+FORMATS = {"html": ".html", "markdown": ".md"}
+
+MANIFEST = ".drtodo-export.json"
+
+PARALLEL_MIN = 8
+"""Minimum number of changed files to export them in a process pool."""
+
+NO_SECTION = "(no section)"
+
+_STYLE = ("body{font-family:system-ui,sans-serif;max-width:50em;margin:2em auto;padding:0 1em}"
+          "li.task-list-item{list-style:none}table{border-collapse:collapse}td,th{padding:.2em .8em;text-align:left}"
+          "td.n{text-align:right}")
+
+
+def _slug(text: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', text.casefold()).strip('-') or 'top'
+
+
+def _hash(*values) -> str:
+    return hashlib.sha1(json.dumps([VERSION, *values]).encode('utf-8')).hexdigest()
+
+
+def _write(path: Path, content: str):
+    # write then rename, so a page being served is never half written
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(content, encoding='utf-8')
+    tmp.replace(path)
+
+
+def _task_markdown(tasks: list[dict]) -> str:
+    lines = []
+    for task in tasks:
+        indent = '  ' * (task['depth'] + 1)
+        text = task['text'].strip().replace('\n', '\n' + indent)
+        lines.append(f"{'  ' * task['depth']}- [{'x' if task['checked'] else ' '}] {text}\n")
+    return ''.join(lines)
+
+
+def _page(format: str, title: str, body: str) -> str:
+    if format == "markdown":
+        return f"# {title}\n\n{body}"
+    return (f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{html.escape(title)}</title>\n"
+            f"<style>{_STYLE}</style>\n</head>\n<body>\n<h1>{html.escape(title)}</h1>\n{body}</body>\n</html>\n")
+
+
+def _link(format: str, text: str, href: str) -> str:
+    if format == "markdown":
+        return f"[{text}]({href})"
+    return f"<a href=\"{html.escape(href)}\">{html.escape(text)}</a>"
+
+
+def _table(format: str, rows: list[tuple[str, int, int]]) -> str:
+    """a table of (link, open, done) rows"""
+    if format == "markdown":
+        return "| | open | done |\n|---|---:|---:|\n" + ''.join(f"| {link} | {o} | {d} |\n" for link, o, d in rows)
+    return ("<table>\n<tr><th></th><th>open</th><th>done</th></tr>\n" +
+            ''.join(f"<tr><td>{link}</td><td class=\"n\">{o}</td><td class=\"n\">{d}</td></tr>\n" for link, o, d in rows) +
+            "</table>\n")
+
+
+def _section_page(format: str, title: str, tasks: list[dict]) -> str:
+    markdown = _task_markdown(tasks)
+    if format == "markdown":
+        return _page(format, title, f"[back](index.md)\n\n{markdown}")
+    import mistune
+
+    body = mistune.create_markdown(escape=True, plugins=['task_lists'])(markdown)
+    return _page(format, title, f"<p><a href=\"index.html\">back</a></p>\n{body}")
+
+
+def export_file(todofile: str, slug: str, section: str, out_dir: str, format: str, old: Optional[dict]) -> dict:
+    """
+    Exports the pages of one todo file to `out_dir`/`slug`, writing only those whose content changed since the export
+    recorded in `old` (its manifest entry). Returns its new manifest entry, with the number of pages written in
+    'written'. This runs in worker processes: arguments and result are plain values.
+    """
+    path = Path(todofile)
+    st = path.stat()
+    ext = FORMATS[format]
+    tasks = list(linescan.stream_file_tasks(path, section))
+
+    sections: dict[str, list[dict]] = {}
+    for task in tasks:
+        sections.setdefault(task['section'], []).append(task)
+    old_pages = (old or {}).get('pages', {})
+    pages: dict[str, str] = {}
+    summaries = []
+    written = 0
+
+    def page(name: str, content_hash: str, render, *args) -> None:
+        """records page `name`, rendered with render(*args) only if it changed"""
+        nonlocal written
+        pages[name] = content_hash
+        target = Path(out_dir) / slug / name
+        if old_pages.get(name) != content_hash or not target.exists():
+            _write(target, render(*args))
+            written += 1
+
+    for heading, section_tasks in sections.items():
+        name = _slug(heading.lstrip('#'))
+        while name + ext in pages or name == "index":   # the index page of the file is written last
+            name += '-'
+        title = f"{path.name}: {heading.lstrip('#').strip() or NO_SECTION}"
+        task_set = [[t['depth'], t['checked'], t['text']] for t in section_tasks]
+        page(name + ext, _hash(format, title, task_set), _section_page, format, title, section_tasks)
+        done = sum(1 for t in section_tasks if t['checked'])
+        summaries.append([heading, name + ext, len(section_tasks) - done, done])
+
+    rows = [(_link(format, heading.lstrip('#').strip() or NO_SECTION, href), o, d) for heading, href, o, d in summaries]
+    page("index" + ext, _hash(format, todofile, summaries),
+         _page, format, str(todofile), _link(format, "all files", "../index" + ext) + "\n\n" + _table(format, rows))
+
+    # pages of sections that are gone
+    for name in old_pages.keys() - pages.keys():
+        (Path(out_dir) / slug / name).unlink(missing_ok=True)
+    done = sum(1 for t in tasks if t['checked'])
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'slug': slug, 'open': len(tasks) - done, 'done': done,
+            'pages': pages, 'written': written}
+
+
+@dataclass
+class ExportResult:
+    files: int = 0
+    """todo files in the export"""
+    exported: int = 0
+    """files that changed since the last export, so were exported again"""
+    written: int = 0
+    """pages written, the others were already up to date"""
+
+
+def _load_manifest(out_dir: Path, format: str, section: str) -> dict:
+    try:
+        manifest = json.loads((out_dir / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != VERSION or manifest.get('format') != format or manifest.get('section') != section:
+        return {}
+    return manifest
+
+
+def export(todofiles: Iterable[Path], out_dir: Path, format: str, section: str = '',
+           jobs: Optional[int] = None) -> ExportResult:
+    """
+    Exports the todo files to `out_dir` in the given format (one of FORMATS), for the tasks in `section` ('' for all).
+    Only what changed since the last export to the same folder is rendered and written. `jobs` is the number of
+    processes to use for many changed files (default: one per CPU, 1 to never use a process pool).
+    """
+    result = ExportResult()
+    manifest = _load_manifest(out_dir, format, section)
+    old_files: dict = manifest.get('files', {})
+    files: dict = {}
+    stale = []
+    slugs = set()
+    for todofile in todofiles:
+        key = str(todofile.resolve())
+        if key in files:
+            continue
+        old = old_files.get(key)
+        slug = old['slug'] if old else _slug(key)
+        while slug in slugs:
+            slug += '-'
+        slugs.add(slug)
+        st = todofile.stat()
+        if old and old['size'] == st.st_size and old['mtime_ns'] == st.st_mtime_ns:
+            files[key] = old
+        else:
+            files[key] = None
+            stale.append((key, slug, section, str(out_dir), format, old))
+    result.files = len(files)
+    result.exported = len(stale)
+
+    with profiling.span("export.files"):
+        jobs = jobs or os.cpu_count() or 1
+        if len(stale) >= PARALLEL_MIN and jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as pool:
+                entries = list(pool.map(export_file, *zip(*stale), chunksize=max(1, len(stale) // (jobs * 4))))
+        else:
+            entries = [export_file(*args) for args in stale]
+    for args, entry in zip(stale, entries):
+        result.written += entry.pop('written')
+        files[args[0]] = entry
+
+    # files not exported anymore
+    for key in old_files.keys() - files.keys():
+        for name in old_files[key]['pages']:
+            (out_dir / old_files[key]['slug'] / name).unlink(missing_ok=True)
+
+    ext = FORMATS[format]
+    summaries = [[key, entry['slug'], entry['open'], entry['done']] for key, entry in files.items()]
+    index_hash = _hash(format, summaries)
+    if manifest.get('index') != index_hash or not (out_dir / ("index" + ext)).exists():
+        rows = [(_link(format, key, f"{slug}/index{ext}"), o, d) for key, slug, o, d in summaries]
+        _write(out_dir / ("index" + ext), _page(format, "Todo files", _table(format, rows)))
+        result.written += 1
+    _write(out_dir / MANIFEST, json.dumps({'version': VERSION, 'format': format, 'section': section,
+                                           'index': index_hash, 'files': files}))
+    return result
@@ -0,0 +1,134 @@
+"""
+Fast entry point for the `todo` command.
+
+Starting the full CLI means importing typer, rich, pydantic, GitPython and mistune, which takes a noticeable fraction
+of a second. That is fine for regular commands but too slow for things run very often, like shell completion (on
+every TAB) or `todo count` in a shell prompt (on every Enter). `main()` handles those requests here, with only the
+standard library, the sidecar indexes and counter files, and hands everything else (and anything it is not sure about)
+to the full CLI in `drtodo.main`.
+
+To do so this module resolves the active todo files and a few settings the same way `config` does, but without
+pydantic or git: see `light_config()`.
+"""
+import getpass
+import os
+import sys
+from pathlib import Path
+from typing import Any, NamedTuple, Optional
+
+__all__ = ["LightConfig", "light_config", "load_config", "main"]
+
+APPNAME = "DrToDo"
+ENV_PREFIX = APPNAME.upper() + "_"
+
+_TRUE_STRINGS = ("1", "on", "t", "true", "y", "yes")
+
+
+def _toml_loads(text: str) -> dict:
+    try:
+        import tomllib as toml
+    except ImportError:
+        import tomli as toml
+    return toml.loads(text)
+
+
+def load_config(config_folder: Path, config_filename: Path) -> dict[str, Any]:
+    """
+    Load config file from config folder, if it exists, and overlay with user specific config file if it exists there as well.
+    Returns an empty dict if nothing is found.
+    """
+    result = {}
+    if config_folder.exists() and config_folder.is_dir():
+        config_file = config_folder / config_filename.name
+        config_file_user = config_folder / f"{config_filename.stem}.{getpass.getuser()}.{config_filename.suffix}"
+
+        if config_file.exists():
+            result |= _toml_loads(config_file.read_text())
+        if config_file_user.exists():
+            result |= _toml_loads(config_file_user.read_text())
+    return result
+
+
+def appdir() -> Optional[Path]:
+    """Same as `config.constants.appdir` (i.e. typer.get_app_dir(force_posix=True)), None where it can't be replicated."""
+    if sys.platform.startswith("win"):
+        return None
+    return Path(os.path.expanduser(f"~/.{APPNAME.lower()}"))
+
+
+def find_gitroot(start: Optional[Path] = None) -> Optional[Path]:
+    """Finds the root of the git repo containing `start` (or the current folder) like GitPython does, but cheaply."""
+    folder = (start or Path.cwd()).resolve()
+    for candidate in (folder, *folder.parents):
+        if (candidate / ".git").exists():
+            return candidate
+    return None
+
+
+class LightConfig(NamedTuple):
+    todo_files: list[Path]
+    section: str
+    sidecar_index: bool
+    cache_dir: Optional[Path] = None
+
+
+def light_config(*, force_global: bool = False, section: Optional[str] = None) -> Optional[LightConfig]:
+    """
+    Resolves the todo files to operate on and the settings needed by fast paths, like
+    `config.preclioptions_initialize()` does. `section` overrides the section setting (i.e. the --section option).
+    Returns None if this can't be done reliably here (then the full CLI should handle things, and report any error).
+    """
+    app_folder = appdir()
+    if app_folder is None:
+        return None
+    ignore_config = os.environ.get(ENV_PREFIX + "IGNORE_CONFIG", "false").lower() == "true"
+
+    try:
+        gitroot = None if force_global else find_gitroot()
+        config_dict: dict[str, Any] = {}
+        local_mode = False
+        if gitroot:
+            loaded = load_config(gitroot, Path(".drtodo.toml"))
+            local_mode = bool(loaded)
+            if not ignore_config:
+                config_dict |= loaded
+        if not local_mode and not ignore_config:
+            config_dict |= load_config(app_folder, Path("config.toml"))
+    except (OSError, ValueError):
+        return None
+
+    # values from config files take precedence over env variables, as they do with pydantic settings
+    def setting(name: str, default: Any) -> Any:
+        return config_dict.get(name, os.environ.get(ENV_PREFIX + name.upper(), default))
+
+    mdfile = setting("mdfile", "TODO.md")
+    sidecar_index = setting("sidecar_index", True)
+    if isinstance(sidecar_index, str):
+        sidecar_index = sidecar_index.strip().lower() in _TRUE_STRINGS
+    if section is None:
+        section = setting("section", "")
+    cache_dir = setting("cache_dir", "")
+    if not isinstance(mdfile, str) or not isinstance(section, str) or not isinstance(cache_dir, str):
+        return None
+
+    todofile = (gitroot if local_mode else app_folder) / mdfile
+    if not todofile.exists():
+        return None
+    # like filecache.cache_dir(), but never created here
+    if cache_dir:
+        cache_folder: Optional[Path] = Path(cache_dir).expanduser()
+    else:
+        cache_folder = app_folder / "cache" if app_folder.exists() else None
+    return LightConfig([todofile], section, bool(sidecar_index), cache_folder)
+
+
+def main(*args, **kwargs):
+    from . import completion, counts
+
+    if not (completion.fast_complete(kwargs.get("prog_name")) or counts.fast_count()):
+        from .main import main as cli_main
+        cli_main(*args, **kwargs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Persistent caches for data derived from markdown files (search indexes, summaries, etc.)
+
+Entries are stored as pickles in the cache folder (see `cache_dir()`), one per (kind, file) pair, and are tagged with
+the fingerprint of the file they were derived from. An entry is only used if the fingerprint still matches, so a file
+is only processed again after it changes. Ex:
+
+```python
+index = filecache.cached("search", todofile, lambda: build_index(todofile))
+```
+
+Caching is best effort: if there is no cache folder or it is not writable, data is simply computed every time.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Optional, TypeVar
+
+if TYPE_CHECKING:
+    from .config import Settings
+
+__all__ = ["cache_dir", "cached", "fingerprint", "load", "store"]
+
+CACHE_VERSION = 2
+"""Bump when the format of cached data changes, older entries are then ignored."""
+
+T = TypeVar("T")
+
+
+def cache_dir(settings: Optional["Settings"] = None) -> Optional[Path]:
+    """
+    Returns the cache folder for `settings` (default: those of the CLI, config.settings), creating it if needed, or None
+    if caching is not possible.
+    """
+    from . import config
+
+    if settings is None:
+        settings = config.settings
+        if settings is None:   # the CLI is not initialized (see `api`, whose contexts pass their own settings)
+            return None
+    if settings.cache_dir:
+        folder = Path(settings.cache_dir).expanduser()
+    elif config.constants.appdir.exists():
+        # never create the app dir here, that is `todo init`'s job
+        folder = config.constants.appdir / "cache"
+    else:
+        return None
+    try:
+        folder.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return None
+    return folder
+
+
+def fingerprint(path: Path, *extra) -> tuple:
+    """Fingerprint of a file: changes whenever the file is modified. `extra` values are appended to it."""
+    st = path.stat()
+    return (CACHE_VERSION, st.st_size, st.st_mtime_ns) + extra
+
+
+def _entry_path(kind: str, key: str) -> Optional[Path]:
+    folder = cache_dir()
+    if folder is None:
+        return None
+    return folder / kind / f"{hashlib.sha1(key.encode('utf-8')).hexdigest()}.pickle"
+
+
+def load(kind: str, key: str, fp: Any = None) -> Optional[Any]:
+    """Returns the data cached for `key` if its fingerprint matches `fp`, None otherwise."""
+    entry_path = _entry_path(kind, key)
+    if entry_path is None or not entry_path.exists():
+        return None
+    try:
+        with entry_path.open('rb') as f:
+            cached_fp, data = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ImportError, pickle.UnpicklingError):
+        return None   # a corrupt or outdated entry is just a cache miss
+    return data if cached_fp == fp else None
+
+
+def store(kind: str, key: str, fp: Any, data: Any):
+    """Caches `data` for `key` tagged with fingerprint `fp`. The entry is replaced atomically."""
+    entry_path = _entry_path(kind, key)
+    if entry_path is None:
+        return
+    try:
+        entry_path.parent.mkdir(exist_ok=True)
+        fd, tmpname = tempfile.mkstemp(dir=entry_path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump((fp, data), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpname, entry_path)
+    except OSError:
+        pass
+
+
+def cached(kind: str, path: Path, compute: Callable[[], T], *extra) -> T:
+    """
+    Returns the data of kind `kind` derived from the file at `path`, calling `compute()` only if the file changed
+    since it was last cached. `extra` values (e.g. settings the data depends on) are added to the fingerprint.
+    """
+    key = str(path.resolve())
+    fp = fingerprint(path, *extra)
+    data = load(kind, key, fp)
+    if data is None:
+        data = compute()
+        store(kind, key, fp, data)
+    return data
@@ -0,0 +1,131 @@
+"""
+Task items of a todo file as they were in git history, and what changed since.
+
+Old versions of a todo file are read straight from the git object database: a History keeps one repo open, and
+GitPython reads all trees and blobs through a single long-lived `git cat-file --batch` process, however many
+revisions are looked at. No checkout is needed and the working tree is never touched.
+
+Blobs never change, so their items are cached by blob SHA (and section, see `filecache`): a revision whose todo file
+was already seen, in any commit, parses nothing. Items are read with `linescan.read_tasks`: scanned line by line when
+that is exact, parsed with the markdown parser otherwise, so they are the items (IDs and indexes) the parser finds.
+
+```python
+with History(todofile, section) as history:
+    changes = diff(history.items_at('v1.0'), history.items_at(None))
+```
+"""
+from pathlib import Path
+from typing import Optional
+
+from . import filecache, linescan, profiling
+
+__all__ = ["CHANGES", "History", "diff"]
+
+CHANGES = ("added", "completed", "reopened", "removed")
+"""Kinds of changes between two versions of a list, as returned by diff()."""
+
+
+def _with_spans(items: list[dict]) -> list[dict]:
+    """sets the 'span' of items in pre-order from their depths (see `mdparser.TaskListTraverser.link_task_tree`)"""
+    open_items: list[dict] = []
+    for item in items:
+        while open_items and open_items[-1]['depth'] >= item['depth']:
+            open_items.pop()
+        item['span'] = 1
+        for ancestor in open_items:
+            ancestor['span'] += 1
+        open_items.append(item)
+    return items
+
+
+def _read_items(text: str, section: str) -> list[dict]:
+    return _with_spans(linescan.read_tasks(text, section))
+
+
+class History:
+    """
+    Versions of one todo file in its git repo. Raises ValueError if the file is not in a git repo.
+    Use as a context manager (or call close()) to end the git process.
+    """
+
+    def __init__(self, todofile: Path, section: str):
+        from git.exc import InvalidGitRepositoryError, NoSuchPathError
+        from git.repo import Repo
+
+        self.todofile = todofile
+        self.section = section
+        try:
+            self.repo = Repo(todofile.resolve().parent, search_parent_directories=True)
+        except (InvalidGitRepositoryError, NoSuchPathError):
+            raise ValueError(f"{todofile} is not in a git repo")
+        assert self.repo.working_tree_dir is not None
+        self.path = todofile.resolve().relative_to(Path(self.repo.working_tree_dir).resolve()).as_posix()
+        self._parsed: dict[str, list[dict]] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self.repo.close()
+
+    def blob_sha(self, rev: str) -> Optional[str]:
+        """returns the SHA of the todo file blob at revision `rev`, None if the file is not there"""
+        from gitdb.exc import BadName, BadObject
+
+        try:
+            commit = self.repo.commit(rev)
+        except (BadName, BadObject, ValueError):
+            raise ValueError(f"unknown git revision '{rev}'")
+        try:
+            return (commit.tree / self.path).hexsha
+        except KeyError:
+            return None
+
+    def items_at(self, rev: Optional[str]) -> list[dict]:
+        """
+        returns the items of the todo file at revision `rev` (a commit, tag, branch, HEAD~3...), or as it is now in
+        the working tree if `rev` is None. A file that did not exist yet has no items.
+        """
+        if rev is None:
+            with profiling.span("history.scan"), self.todofile.open() as f:
+                return _read_items(f.read(), self.section)
+        sha = self.blob_sha(rev)
+        if sha is None:
+            return []
+        items = self._parsed.get(sha)
+        if items is None:
+            fp = (filecache.CACHE_VERSION, self.section)
+            items = filecache.load("history", sha, fp)
+            if items is None:
+                with profiling.span("history.read"):
+                    data = self.repo.odb.stream(bytes.fromhex(sha)).read()
+                with profiling.span("history.scan"):
+                    items = _read_items(data.decode('utf-8', errors='replace'), self.section)
+                filecache.store("history", sha, fp, items)
+            self._parsed[sha] = items
+        return items
+
+
+def diff(old: list[dict], new: list[dict]) -> dict[str, list[dict]]:
+    """
+    compares two versions of a list by item ID, returns a dict of CHANGES to items: those added, completed (done in
+    `new` but not in `old`), reopened (the other way around), all from `new`, and those removed (from `old`).
+    An item whose text changed has a different ID, so it shows as removed and added.
+    """
+    old_by_id = {item['id']: item for item in old}
+    new_ids = {item['id'] for item in new}
+    changes: dict[str, list[dict]] = {change: [] for change in CHANGES}
+    for item in new:
+        before = old_by_id.get(item['id'])
+        if before is None:
+            changes['added'].append(item)
+        elif item['checked'] and not before['checked']:
+            changes['completed'].append(item)
+        elif before['checked'] and not item['checked']:
+            changes['reopened'].append(item)
+    changes['removed'] = [item for item in old if item['id'] not in new_ids]
+    return changes
@@ -0,0 +1,349 @@
+"""
+Line based scanning of markdown files for task list items and headings.
+
+This is a lightweight alternative to a full mistune parse for when only the position of task list items and headings
+are needed (sidecar indexes, counting, etc.). It only depends on the standard library so it is cheap to import, and it
+works on bytes so offsets can be used to seek or patch files directly. Fenced code blocks are skipped.
+"""
+import hashlib
+import re
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+__all__ = [
+    "NotExact",
+    "TaskLine",
+    "heading_matches",
+    "iter_sections",
+    "parse_section",
+    "parse_tasks",
+    "read_tasks",
+    "scan_headings",
+    "scan_tasks",
+    "stream_file_tasks",
+    "stream_tasks",
+]
+
+TASK_LINE_RE = re.compile(rb'^([ \t]*(?:[-*+]|\d{1,9}[.)])[ \t]+)\[([ xX])\][ \t]+(.*?)[ \t]*\r?\n?$')
+ATX_HEADING_RE = re.compile(rb'^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*\r?\n?$')
+SETEXT_UNDERLINE_RE = re.compile(rb'^ {0,3}(=+|-+)[ \t]*\r?\n?$')
+FENCE_RE = re.compile(rb'^ {0,3}(`{3,}|~{3,})')
+LIST_ITEM_RE = re.compile(rb'^[ \t]*(?:[-*+]|\d{1,9}[.)])(?:[ \t]|\r?\n?$)')
+
+
+class TaskLine(NamedTuple):
+    offset: int
+    """byte offset of the '[ ]' or '[x]' marker in the file"""
+    length: int
+    """length in bytes of the whole line, including the line terminator"""
+    line_offset: int
+    """byte offset of the start of the line"""
+    checked: bool
+    text: str
+    """text of the first line of the task, after the marker"""
+    heading: str
+    """nearest heading before the task, e.g. '## TODO', or '' if none"""
+
+
+def scan_tasks(data: bytes) -> Iterator[TaskLine]:
+    """Yields all task list items in markdown `data`, in file order."""
+    heading = ''
+    fence: Optional[bytes] = None
+    previous_text: Optional[bytes] = None   # candidate for a setext heading
+    offset = 0
+    for line in data.splitlines(keepends=True):
+        line_offset = offset
+        offset += len(line)
+
+        if fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[:1]):
+                fence = None
+            continue
+        m = FENCE_RE.match(line)
+        if m:
+            fence = m.group(1)
+            previous_text = None
+            continue
+
+        m = ATX_HEADING_RE.match(line)
+        if m:
+            heading = f"{'#' * len(m.group(1))} {(m.group(2) or b'').decode('utf-8', 'replace').strip()}"
+            previous_text = None
+            continue
+        m = SETEXT_UNDERLINE_RE.match(line)
+        if m and previous_text is not None:
+            level = 1 if m.group(1).startswith(b'=') else 2
+            heading = f"{'#' * level} {previous_text.decode('utf-8', 'replace').strip()}"
+            previous_text = None
+            continue
+
+        m = TASK_LINE_RE.match(line)
+        if m:
+            previous_text = None
+            yield TaskLine(offset=line_offset + m.start(2) - 1,
+                           length=len(line),
+                           line_offset=line_offset,
+                           checked=m.group(2) != b' ',
+                           text=m.group(3).decode('utf-8', 'replace'),
+                           heading=heading)
+            continue
+
+        stripped = line.strip()
+        previous_text = stripped if stripped and not LIST_ITEM_RE.match(line) and not line[:1].isspace() else None
+
+
+ATX_HEADING_TEXT_RE = re.compile(ATX_HEADING_RE.pattern.decode())
+FENCE_TEXT_RE = re.compile(FENCE_RE.pattern.decode())
+SETEXT_UNDERLINE_TEXT_RE = re.compile(SETEXT_UNDERLINE_RE.pattern.decode())
+LIST_ITEM_TEXT_RE = re.compile(LIST_ITEM_RE.pattern.decode())
+# unlike TASK_LINE_RE, keeps trailing whitespace in the text, as the markdown parser does
+TASK_TEXT_RE = re.compile(r'^(([ \t]*)(?:[-*+]|\d{1,9}[.)])[ \t]+)\[([ xX])\]\s+(.*?)\r?\n?$')
+# the following apply to lines without their indentation
+LIST_MARKER_TEXT_RE = re.compile(r'([-*+]|\d{1,9}[.)])([ \t]+|\r?\n?$)')
+REFERENCE_TEXT_RE = re.compile(r'\[[^\]]+\]:')
+THEMATIC_BREAK_TEXT_RE = re.compile(r'(?:(?:-[ \t]*){3,}|(?:\*[ \t]*){3,}|(?:_[ \t]*){3,})\r?\n?$')
+INLINE_MARKUP_CHARS = frozenset('*_`[]<>\\&!')
+"""characters that may make the text of a heading (as the parser sees it) differ from its markdown"""
+
+
+class NotExact(Exception):
+    """Raised by stream_tasks() on markdown it can't be sure to read as the markdown parser does."""
+
+
+def stream_tasks(lines: Iterable[str], section: str = '', *, line_numbers: bool = False) -> Iterator[dict]:
+    """
+    Yields task items from markdown text lines as they are read, so a caller can stop early without reading the rest.
+    Items are dicts with checked, text, id, index, section and depth, as from the full parser (but without tokens or
+    tree links), for the tasks in `section` (a section setting, e.g. '## TODO', '' for all). With `line_numbers`, they
+    also have the number of the line the task starts on in `line` (0 for the first line).
+    Like the full parser, the text of an item is its first paragraph, continuation lines included.
+
+    This is a line based reading of lists, paragraphs, headings and fenced code blocks, as `todo` writes them. On
+    anything else (ordered lists, block quotes, HTML, indented code, lazy or unusually indented continuation lines...)
+    it raises NotExact rather than risk finding other items than the parser. Items are yielded a section at a time (the
+    parser may reorder blocks within one), so that those yielded before NotExact are always exact: see
+    stream_file_tasks() for a fallback to the parser for the rest.
+    """
+    heading = ''
+    in_section = not section
+    fence: Optional[str] = None
+    containers: list[tuple[int, bool, int]] = []   # (content column, is a task, indentation) of the list items the
+                                                   # line may be in
+    paragraph = False                         # whether a paragraph goes on
+    blank = False                             # whether the previous line is blank
+    previous_text: Optional[str] = None       # one line paragraph outside lists, candidate for a setext heading
+    section_items: list[dict] = []            # tasks found since the last heading
+    pending: Optional[dict] = None            # task whose text may continue on the next lines
+    pending_column = 0                        # where the content of the pending task starts
+    index = 0
+
+    def finish(item: dict) -> dict:
+        item['id'] = hashlib.sha1(item['text'].strip().encode('utf-8')).hexdigest()
+        return item
+
+    for line_number, line in enumerate(lines):
+        content = line.lstrip(' ')
+        indent = len(line) - len(content)
+        if fence is not None:
+            stripped = content.strip()
+            if indent <= 3 and stripped.startswith(fence) and not stripped.strip(fence[:1]):
+                fence = None
+            continue
+
+        if not content.strip():
+            if pending is not None:
+                section_items.append(finish(pending))
+                pending = None
+            paragraph = False
+            previous_text = None
+            blank = True
+            continue
+        after_blank, blank = blank, False
+        if content[0] in '\t<>' or (not paragraph and REFERENCE_TEXT_RE.match(content)):
+            raise NotExact("tab, HTML, block quote or link reference definition")
+        # the list items the line is indented enough to be in, and its indentation in the innermost one
+        inside = sum(1 for column, *_ in containers if column <= indent)
+        base = containers[inside - 1][0] if inside else 0
+        if indent - base >= 4:
+            raise NotExact("indented code or continuation line")
+
+        new_heading = None
+        if paragraph and SETEXT_UNDERLINE_TEXT_RE.match(content):
+            if previous_text is None:
+                raise NotExact("setext heading in a list or of several lines")
+            new_heading = f"{'#' if content.startswith('=') else '##'} {previous_text}"
+        elif m := ATX_HEADING_TEXT_RE.match(content):
+            if indent:
+                raise NotExact("indented heading")
+            new_heading = f"{m.group(1)} {(m.group(2) or '').strip()}"
+        if new_heading is not None:
+            if INLINE_MARKUP_CHARS.intersection(new_heading):
+                raise NotExact("heading with inline markup")
+            if pending is not None:
+                section_items.append(finish(pending))
+                pending = None
+            # nothing after a heading can change what the parser finds before it
+            yield from section_items
+            section_items.clear()
+            heading = new_heading
+            in_section = heading_matches(section, heading)
+            containers.clear()
+            paragraph = False
+            previous_text = None
+            continue
+
+        thematic_break = THEMATIC_BREAK_TEXT_RE.match(content)
+        fence_match = FENCE_TEXT_RE.match(content)
+        marker = None if thematic_break or fence_match else LIST_MARKER_TEXT_RE.match(content)
+        if not (thematic_break or fence_match or marker):
+            # paragraph text
+            if pending is not None:
+                if indent != pending_column:
+                    raise NotExact("lazy or unusually indented continuation line")
+                pending['text'] += content.rstrip('\r\n') + '\n'
+            elif paragraph:
+                if inside < len(containers):
+                    raise NotExact("lazy continuation line")
+                previous_text = None
+            else:
+                if inside < len(containers) and not after_blank:
+                    raise NotExact("lazy continuation line")
+                del containers[inside:]
+                paragraph = True
+                previous_text = content.strip() if not containers else None
+            continue
+
+        if pending is not None:
+            section_items.append(finish(pending))
+            pending = None
+        paragraph = False
+        previous_text = None
+        if fence_match:
+            if indent:
+                raise NotExact("indented code fence")
+            fence = fence_match.group(1)
+            containers.clear()
+            continue
+        if thematic_break:
+            if indent != base:
+                raise NotExact("unusually indented thematic break")
+            del containers[inside:]
+            continue
+        # list items must be where `todo` puts them, as siblings or subitems of others
+        if indent != base and (inside == len(containers) or containers[inside][2] != indent):
+            raise NotExact("unusually indented list item")
+        del containers[inside:]
+
+        assert marker is not None
+        rest = content[marker.end():]
+        if marker.group(1) not in ('-', '*', '+'):
+            raise NotExact("ordered list")
+        if not rest.strip() or len(marker.group(2)) > 4 or '\t' in marker.group(2):
+            raise NotExact("empty list item, tab or indented code in a list item")
+        if rest[0] in '<>' or any(regex.match(rest) for regex in (ATX_HEADING_TEXT_RE, FENCE_TEXT_RE, REFERENCE_TEXT_RE,
+                                                                  THEMATIC_BREAK_TEXT_RE, LIST_MARKER_TEXT_RE)):
+            raise NotExact("list item starting with another block")
+        column = indent + marker.end()
+        m = TASK_TEXT_RE.match(line)
+        if (m is None and rest[:3] in ('[ ]', '[x]', '[X]')) or (m and not m.group(4).strip()):
+            raise NotExact("task without text")
+        if m and in_section:
+            pending = {'checked': m.group(3) != ' ', 'text': m.group(4) + '\n', 'index': index, 'section': heading,
+                       'depth': sum(1 for _, task, _ in containers if task)}
+            if line_numbers:
+                pending['line'] = line_number
+            pending_column = column
+            index += 1
+        containers.append((column, m is not None, indent))
+        paragraph = True
+
+    if pending is not None:
+        section_items.append(finish(pending))
+    yield from section_items
+
+
+ITEM_KEYS = ('checked', 'text', 'id', 'index', 'section', 'depth')
+"""keys of the items of stream_tasks()"""
+
+
+def parse_tasks(text: str, section: str = '') -> list[dict]:
+    """
+    Returns the task items of markdown text found by the full parser (see `mdparser`, only imported when needed), as
+    plain dicts like those of stream_tasks().
+    """
+    from .mdparser import TodoListParser
+
+    return [{key: item[key] for key in ITEM_KEYS} for item in TodoListParser(section).parse_text(text)]
+
+
+def read_tasks(text: str, section: str = '') -> list[dict]:
+    """Returns the task items of markdown text, as found by the parser, but scanning them when that is exact."""
+    try:
+        return list(stream_tasks(text.splitlines(keepends=True), section))
+    except NotExact:
+        return parse_tasks(text, section)
+
+
+def stream_file_tasks(pathname: Path, section: str = '') -> Iterator[dict]:
+    """
+    Yields the task items of a todo file as stream_tasks() does, reading it only as far as needed. Where the line scan
+    can't be exact, the rest of the items come from the full parser: either way, the items are those of the parser.
+    """
+    yielded = 0
+    try:
+        with pathname.open(encoding='utf-8', errors='replace') as f:
+            for item in stream_tasks(f, section):
+                yield item
+                yielded += 1
+    except NotExact:
+        yield from parse_tasks(pathname.read_text(encoding='utf-8', errors='replace'), section)[yielded:]
+
+
+def iter_sections(lines: Iterable[str]) -> Iterator[tuple[str, list[str]]]:
+    """
+    Splits markdown text lines into heading delimited chunks, lazily. Yields (heading, lines) tuples where lines
+    start with the heading line, except for any text before the first heading (heading is '' for it).
+    Headings are formatted as in scan_tasks(), e.g. '## TODO'. Only ATX (#) headings split chunks.
+    """
+    heading = ''
+    chunk: list[str] = []
+    fence: Optional[str] = None
+    for line in lines:
+        if fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[:1]):
+                fence = None
+        elif m := FENCE_TEXT_RE.match(line):
+            fence = m.group(1)
+        elif m := ATX_HEADING_TEXT_RE.match(line):
+            if chunk:
+                yield heading, chunk
+            heading = f"{m.group(1)} {(m.group(2) or '').strip()}"
+            chunk = []
+        chunk.append(line)
+    if chunk:
+        yield heading, chunk
+
+
+def scan_headings(data: bytes) -> list[str]:
+    """Returns all ATX (#) headings in markdown `data`, formatted as in scan_tasks(), in file order."""
+    lines = data.decode('utf-8', 'replace').splitlines(keepends=True)
+    return [heading for heading, _ in iter_sections(lines) if heading]
+
+
+def parse_section(section: str) -> tuple[Optional[int], str]:
+    """parses a section setting like '## TODO' into (level, casefolded name). Level is None if not given."""
+    name = section.lstrip('#')
+    level = len(section) - len(name)
+    return level or None, name.strip().casefold()
+
+
+def heading_matches(section: str, heading: str) -> bool:
+    """returns True if a heading (as returned by scan_tasks) is the section selected by a section setting"""
+    if not section:
+        return True
+    level, name = parse_section(section)
+    heading_level, heading_name = parse_section(heading)
+    return name == heading_name and (level is None or level == heading_level)
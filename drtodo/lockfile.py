@@ -0,0 +1,69 @@
+"""
+Lock files, to serialize updates of shared files by processes that may run at the same time (see `metrics`, `sync`).
+
+A lock file is created exclusively and holds `<host>:<pid>` of the process holding it. A lock left behind by a crashed
+process is broken: on the same host (POSIX only), as soon as the holder is gone; otherwise (another host on a network
+file system, or a holder that can't be checked) once the lock is older than the timeout.
+
+This module must stay cheap to import: standard library only.
+"""
+import contextlib
+import os
+import time
+from pathlib import Path
+
+__all__ = ["locked"]
+
+
+def _host() -> str:
+    return os.uname().nodename if hasattr(os, 'uname') else os.environ.get('COMPUTERNAME', '')
+
+
+def _holder(path: Path) -> str:
+    return path.read_text(encoding='utf-8', errors='replace')
+
+
+def _stale(path: Path, holder: str, timeout: float) -> bool:
+    """whether lock file `path`, held by `holder`, was left by a process that is gone"""
+    host, _, pid = holder.rpartition(':')
+    if os.name == 'posix' and host == _host() and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass   # alive, run by another user
+        return False
+    # not written yet, taken on another host or the holder can't be checked
+    return time.time() - path.stat().st_mtime > timeout
+
+
+@contextlib.contextmanager
+def locked(path: Path, timeout: float = 10.0):
+    """holds lock file `path`, waiting up to `timeout` seconds for it (then raises TimeoutError)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                holder = _holder(path)
+                # checked again just before breaking it, in case another process broke it and took it meanwhile
+                if _stale(path, holder, timeout) and _holder(path) == holder:
+                    path.unlink(missing_ok=True)
+                    continue
+            except FileNotFoundError:
+                continue   # just released
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{path} is locked") from None
+            time.sleep(0.05)
+        else:
+            try:
+                os.write(fd, f"{_host()}:{os.getpid()}".encode())
+            finally:
+                os.close(fd)
+            break
+    try:
+        yield
+    finally:
+        path.unlink(missing_ok=True)
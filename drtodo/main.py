@@ -1,19 +1,43 @@
+import contextlib
+import datetime
+import hashlib
+import itertools
+import json
+from collections.abc import Iterable
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 
+import click
 import rich.markdown
 import typer
-# from git.repo import Repo
+from click.shell_completion import CompletionItem
 
+# from git.repo import Repo
 from typer_aliases import Typer
 
-from . import backup_command, util
-from .man_command import manapp
-from .mdparser import TaskListTraverser, TodoListParser
+from . import (
+    completion,
+    config,
+    filecache,
+    linescan,
+    profiling,
+    rendercache,
+    searchindex,
+    sidecar,
+    taskitems,
+    util,
+)
+from . import counts as counts_module
+from . import dedupe as dedupe_module
+from . import metrics as metrics_module
+from . import stats as stats_module
+from .mdparser import TodoListParser
 from .rich_display import console, error_console
-from . import config
-from . import taskitems
 
+if TYPE_CHECKING:
+    from .api import TodoContext
+
+config.preclioptions_initialize()  # HACK: need to initialize this before main() is called
 
 app = Typer(
     no_args_is_help=True,
@@ -22,6 +46,9 @@ app = Typer(
     epilog=f"DrToDo can manage items in a global todo list (typically in {config.make_pretty_path(config.constants.appdir)})"
     f" and in a local todo list (if the current folder is under a git repo configured for {config.constants.appname})."
     f" Settings are read from config files and env variables (see *todo man config*).",
+    # help depends on the version and on settings (used as option defaults)
+    help_cache_dir=filecache.cache_dir,
+    help_cache_key=f"{config.constants.version}-{hashlib.sha1(config.settings.json().encode()).hexdigest()[:12]}",
 )
 
 
@@ -29,6 +56,13 @@ def version_string() -> str:
     return f"{config.constants.appname} v{config.constants.version}"
 
 
+def cli_context() -> "TodoContext":
+    """the API context for the settings and todo files of the command line (see `api`)"""
+    from .api import TodoContext
+
+    return TodoContext(config.globals.todo_files, config.settings)
+
+
 @app.command()
 def init():
     """
@@ -42,6 +76,22 @@ def init():
 
 
 def print_todo_item(item: dict):
+    # rendering markdown is slow: lines are rendered once and reused until the item or the style changes
+    with profiling.span("render"), metrics_module.timer("render"):
+        cache = _render_cache()
+        if cache is None:
+            line = _render_todo_item(item)
+        else:
+            # the index is filled in after, so lines stay valid when items move
+            index = f"{item['index']:>3}"
+            placeholder = rendercache.INDEX_PLACEHOLDER * len(index)
+            line = cache.get(item['id'], (item['id'], bool(item['checked']), len(index)),
+                             lambda: _render_todo_item(item, placeholder))
+            line = line.replace(placeholder, index, 1)
+        console().file.write(line)
+
+
+def _render_todo_item(item: dict, index: Optional[str] = None) -> str:
     # print a green large checkmark if checked is True or a blank empty box if checked is False
     # and properly render the markdown text with rich
     # trim trailing whitespace too
@@ -57,7 +107,7 @@ def print_todo_item(item: dict):
         if config.settings.style.strike_done:
             strike = "[strike]"
 
-    index_part = f"[index]{dim}{strike}{item['index']:>3}: "
+    index_part = f"[index]{dim}{strike}{index if index is not None else format(item['index'], '>3')}: "
     hash_part = f"[hash]{dim}{strike}{item['id'][:7]} " if not config.settings.hide_hash else ""
     checkmark_part = f"[text]{dim}{strike}{checked_bullet if item['checked'] else unchecked_bullet} "
     mdtext_part = rich.markdown.Markdown(item['text'].rstrip())
@@ -65,40 +115,461 @@ def print_todo_item(item: dict):
         mdtext_part.style = "dim"
     if strike:
         mdtext_part.style = "strike"
-    console().print(index_part + hash_part + checkmark_part, mdtext_part, end='')
+    with console().capture() as capture:
+        console().print(index_part + hash_part + checkmark_part, mdtext_part, end='')
+    return capture.get()
+
+
+def _render_cache() -> Optional[rendercache.RenderCache]:
+    """
+    the cache of rendered item lines for the current settings and terminal, kept by the running command (in the meta
+    data of its click context) and saved when it ends. None outside of a command.
+    """
+    ctx = click.get_current_context(silent=True)
+    if ctx is None:
+        return None
+    ctx = ctx.find_root()
+    cache = ctx.meta.get("drtodo.render_cache")
+    if cache is None:
+        c = console()
+        cache = ctx.meta["drtodo.render_cache"] = rendercache.RenderCache((config.settings.style.json(),
+                                                                          config.settings.hide_hash, c.width,
+                                                                          c.color_system, c.is_terminal, c.encoding))
+        ctx.call_on_close(cache.save)
+    return cache
+
+
+def _write_metrics():
+    if config.settings.metrics_file and metrics_module.pending():
+        try:
+            metrics_module.write(Path(config.settings.metrics_file).expanduser())
+        except OSError as e:
+            if config.settings.verbose:
+                error_console().print(f"[warning]metrics not written: {e}")
+
+
+def _completion_data(ctx: click.Context) -> list[completion.CompletionData]:
+    """completion data of the active todo files, from their sidecar indexes (updated first if needed)"""
+    # the main callback does not run when completing, so --section is not applied yet
+    section = ctx.find_root().params.get('section')
+    if section is not None:
+        config.settings.section = section
+    data = []
+    for todofile in config.globals.todo_files:
+        if todofile and todofile.exists():
+            d = completion.load(todofile, config.settings.section)
+            if d is None:
+                todo = TodoListParser(config.settings.section)
+                todo.parse(todofile)
+                if config.settings.sidecar_index:
+                    sidecar.write_index(todofile, todo.items, config.settings.section)
+                    d = completion.load(todofile, config.settings.section)
+                d = d or completion.from_items(todofile, todo.items)
+            data.append(d)
+    return data
+
+
+def _completion_items(completions: Iterable[tuple[str, str]]) -> list[CompletionItem]:
+    return [CompletionItem(value, help=help) for value, help in completions]
+
+
+def _complete_spec(ctx: click.Context, param: click.Parameter, incomplete: str) -> list[CompletionItem]:
+    return _completion_items(completion.complete_tasks(_completion_data(ctx), incomplete))
+
+
+def _complete_id(ctx: click.Context, param: click.Parameter, incomplete: str) -> list[CompletionItem]:
+    return _completion_items(completion.complete_tasks(_completion_data(ctx), incomplete, indices=False))
+
+
+def _complete_index(ctx: click.Context, param: click.Parameter, incomplete: str) -> list[CompletionItem]:
+    return _completion_items(completion.complete_tasks(_completion_data(ctx), incomplete, ids=False))
+
+
+def _complete_section(ctx: click.Context, param: click.Parameter, incomplete: str) -> list[CompletionItem]:
+    return _completion_items(completion.complete_sections(_completion_data(ctx), incomplete))
+
+
+def _make_matcher(match: Optional[list[str]], any_term: bool, fixed: bool, ignore_case: bool,
+                  word: bool) -> taskitems.Matcher:
+    """builds the matcher for the --match terms and options of a command (possibly without terms)"""
+    try:
+        return taskitems.Matcher(match or (), any=any_term, fixed=fixed, ignore_case=ignore_case, word=word)
+    except ValueError as e:
+        error_console().print(f"error: {e}")
+        raise typer.Exit(2)
 
 
 @app.command(name="list")
 @app.command_alias(name="ls")
 def list_command(
-    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text"),
-    id: str = typer.Option(None, "--id", "-i", help="ID of the item to list"),
-    index: int = typer.Option(None, "--index", "-n", help="Index of the item to list"),
+    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text",
+                               shell_complete=_complete_spec),
+    id: str = typer.Option(None, "--id", "-i", help="ID of the item to list",
+                          shell_complete=_complete_id),
+    index: int = typer.Option(None, "--index", "-n", help="Index of the item to list",
+                             shell_complete=_complete_index),
     range: str = typer.Option(None, "--range", "-r", help="Range of item indices to list, e.g, 2:5, 2:, :5"),
-    match: str = typer.Option(None, "--match", "-m", help="Regular expression to match item text"),
+    match: Optional[list[str]] = typer.Option(None, "--match", "--grep", "-m", "-g",
+                                              help="Regular expression to match item text, can be repeated "\
+                                              "(items must match all of them, unless --any)"),
+    any_term: bool = typer.Option(False, "--any", help="Select items matching any of the --match terms"),
+    fixed: bool = typer.Option(False, "--fixed-strings", "-F", help="Match terms are literal strings"),
+    ignore_case: bool = typer.Option(False, "--ignore-case", "-I", help="Match terms case-insensitively"),
+    word: bool = typer.Option(False, "--word", "-w", help="Match terms as whole words only"),
+    sort: str = typer.Option(None, "--sort", "-s",
+                             help=f"Sort by comma separated keys ({', '.join(taskitems.SORT_KEYS)}), "\
+                             "prefix with - for descending order, e.g. priority,due,-index"),
+    top: int = typer.Option(None, "--top", "-t", min=1, help="Only list the first N items (after sorting)"),
+    depth: int = typer.Option(None, "--depth", "-d", min=0,
+                              help="Collapse subtasks nested deeper than this (0 lists top level items only)"),
+    limit: int = typer.Option(None, "--limit", "-l", min=0, help="List at most this many items (after --offset)"),
+    offset: int = typer.Option(0, "--offset", "-o", min=0, help="Skip this many items first (after sorting)"),
+    count: bool = typer.Option(False, "--count", "-c", help="Only print the number of matching items"),
+    since: str = typer.Option(None, "--since", help="List items added, completed, reopened or removed since this git "\
+                              "revision (e.g. a tag or HEAD~3)", show_default=False),
+    at: str = typer.Option(None, "--at", help="List items as they were at this git revision "\
+                           "(with --since, list the changes up to it)", show_default=False),
     # TODO: add more filter options, done/undone, priority, due, owner, etc.
 ):
     """
     List todo items in the list
     """
+    match = _make_matcher(match, any_term, fixed, ignore_case, word)
+    try:
+        sort_key = taskitems.make_sort_key(sort) if sort else None
+    except ValueError as e:
+        error_console().print(f"error: {e}")
+        raise typer.Exit(2)
+
+    if since is not None:
+        if limit is not None or offset or top is not None:
+            error_console().print("error: --limit, --offset and --top can't be used with --since")
+            raise typer.Exit(2)
+        _list_changes(since, at, sort_key, count, max_depth=depth,
+                      spec=spec, id=id, index=index, range=range, match=match)
+        return
+
+    stop = offset + limit if limit is not None else None
+    if top is not None:
+        stop = top if stop is None else min(stop, top)
+    if config.settings.sql_index and at is None:
+        items = _select_with_sql(sort=sort, count=count, stop=stop, offset=offset, max_depth=depth,
+                                 spec=spec, id=id, index=index, range=range, match=match)
+        if items is not None:
+            _print_todo_items(items)
+            return
+
+    paginated = limit is not None or offset > 0
+    # without sorting, items are listed in file order, so each file header goes right before its items
+    inline_headers = sort_key is None and not paginated and not count
+    # the streaming engine reads files only as far as needed, but can't reverse or jump around in the list (nor tell
+    # whether a hex spec is an ID, which takes all the IDs of the list)
+    streaming = (paginated or count) and sort_key is None and depth is None and range is None and at is None \
+        and not config.settings.reverse_order \
+        and (spec is None or not {'range', 'id'} & taskitems.parse_spec(spec).keys())
 
     def listfromfile(todofile: Path):
         if todofile and todofile.exists():
-            console().print(f"[header]{config.make_pretty_path(todofile)}[text]")
-            todo = TodoListParser()
-            todo.parse(todofile)
-            try:
-                items = taskitems.create_iterator(todo.items, omit_means_all=True,
-                                                  spec=spec, id=id, index=index, range=range, match=match)
-            except ValueError as e:
-                error_console().print(f"error: {e}")
-                raise typer.Exit(2)
+            if inline_headers:
+                console().print(f"[header]{config.make_pretty_path(todofile)}[text]")
+            if at is not None:
+                yield from selectfromfile(todofile, _history_items(todofile, at))
+            elif streaming:
+                yield from selectfromfile(todofile, linescan.stream_file_tasks(todofile, config.settings.section))
+            else:
+                todo = TodoListParser(config.settings.section)
+                todo.parse(todofile)
+                yield from selectfromfile(todofile, todo.items)
+
+    def selectfromfile(todofile: Path, all_items):
+        try:
+            items = taskitems.create_iterator(all_items, omit_means_all=True, max_depth=depth,
+                                              spec=spec, id=id, index=index, range=range, match=match)
+        except ValueError as e:
+            error_console().print(f"error: {e}")
+            raise typer.Exit(2)
+
+        if config.settings.reverse_order:
+            items = reversed(list(items))
+        for item in items:
+            item['file'] = todofile
+            yield item
+
+    # parse -> select -> render is a lazy pipeline: without sorting, once the limit is reached we stop matching and
+    # rendering, and (streaming) stop reading files too
+    items = itertools.chain.from_iterable(listfromfile(todofile) for todofile in config.globals.todo_files)
+    if count:
+        console().print(str(sum(1 for _ in items)), highlight=False)
+        return
+    items = taskitems.sort_items(items, key=sort_key, top=stop)
+    items = itertools.islice(items, offset, None)
+    _print_todo_items(items, headers=not inline_headers)
+
+
+def _history_items(todofile: Path, rev: Optional[str]) -> list[dict]:
+    """items of a todo file at a git revision (None: now), exits with an error if that can't be read"""
+    from . import history
+
+    try:
+        with history.History(todofile, config.settings.section) as h:
+            return h.items_at(rev)
+    except ValueError as e:
+        error_console().print(f"error: {e}")
+        raise typer.Exit(2)
+
+
+def _list_changes(since: str, at: Optional[str], sort_key, count: bool, **criteria):
+    """prints the items that changed between two git revisions (`at` None: the working tree), by kind of change"""
+    from . import history
+
+    titles = {"added": "Added", "completed": "Completed", "reopened": "Reopened", "removed": "Removed"}
+    for todofile in config.globals.todo_files:
+        if not (todofile and todofile.exists()):
+            continue
+        try:
+            with history.History(todofile, config.settings.section) as h:
+                old, new = h.items_at(since), h.items_at(at)
+            # select in each full version (indexes, ranges and depths are those of the version), then diff
+            selected = {id(item) for items in (old, new)
+                        for item in taskitems.create_iterator(items, omit_means_all=True, **criteria)}
+            changes = history.diff(old, new)
+            for change, items in changes.items():
+                items = (item for item in items if id(item) in selected)
+                changes[change] = list(taskitems.sort_items(items, key=sort_key))
+        except ValueError as e:
+            error_console().print(f"error: {e}")
+            raise typer.Exit(2)
+        console().print(f"[header]{config.make_pretty_path(todofile)}[text]")
+        if count:
+            console().print(", ".join(f"{len(items)} {change}" for change, items in changes.items()), highlight=False)
+            continue
+        for change, items in changes.items():
+            if items:
+                console().print(f"[header]{titles[change]}[text]")
+                for item in items:
+                    print_todo_item(item)
+        if not any(changes.values()) and config.settings.verbose:
+            error_console().print(f"no changes since {since}")
+
+
+def _print_todo_items(items: Iterable[dict], headers: bool = True):
+    """prints items (with a 'file' key), with a header whenever the file changes if `headers`"""
+    current_file = None
+    for item in items:
+        if headers and item['file'] != current_file:
+            current_file = item['file']
+            console().print(f"[header]{config.make_pretty_path(current_file)}[text]")
+        print_todo_item(item)
+
+
+def _select_with_sql(*, sort: Optional[str], count: bool, stop: Optional[int], offset: int,
+                     **criteria) -> Optional[Iterable[dict]]:
+    """
+    Selects items for `list` from the SQLite mirror (syncing it first), or prints their count if `count`.
+    Returns None if the mirror can't be used (then files are parsed as usual).
+    """
+    import sqlite3
+
+    from . import sqlindex
+
+    try:
+        with sqlindex.SqlIndex.open() as db:
+            db.sync(config.globals.todo_files)
+            if count:
+                console().print(str(db.count(config.globals.todo_files, **criteria)), highlight=False)
+                return []
+            return list(db.select(config.globals.todo_files, sort=sort, reverse=config.settings.reverse_order,
+                                  limit=stop - offset if stop is not None else None, offset=offset, **criteria))
+    except ValueError as e:
+        error_console().print(f"error: {e}")
+        raise typer.Exit(2)
+    except (OSError, sqlite3.Error) as e:
+        if config.settings.verbose:
+            error_console().print(f"[warning]SQL index not available: {e}")
+        return None
+
+
+@app.command()
+def search(
+    query: str = typer.Argument(..., help="Words to search for, use word* for prefixes and \"quotes\" for phrases"),
+    files: Optional[list[Path]] = typer.Option(None, "--file", "-f", help="Search these markdown files instead of the active ones"),
+    top: int = typer.Option(20, "--top", "-t", min=1, help="Maximum number of results"),
+):
+    """
+    Search todo items for words using a persistent index, best matches first
+    """
+    try:
+        results = searchindex.search(query, files or config.globals.todo_files, top=top)
+    except ValueError as e:
+        error_console().print(f"error: {e}")
+        raise typer.Exit(2)
+
+    current_file = None
+    for item in results:
+        if item['file'] != current_file:
+            current_file = item['file']
+            console().print(f"[header]{config.make_pretty_path(current_file)}[text]")
+        print_todo_item(item)
+    if not results and config.settings.verbose:
+        error_console().print("nothing found")
+
+
+@app.command()
+def agenda(
+    days: int = typer.Option(7, "--days", "-d", min=0, help="Number of days ahead to include"),
+):
+    """
+    Show open todo items by due date: overdue, due today and due in the next few days
+    """
+    from . import agenda as agenda_module
+
+    today = datetime.date.today()
+    buckets, undated = agenda_module.agenda(config.globals.todo_files, days, today)
+    titles = {"overdue": "Overdue", "today": "Today", "upcoming": f"Next {days} days"}
+    for bucket, entries in buckets.items():
+        if not entries:
+            continue
+        console().print(f"[header]{titles[bucket]}[text]")
+        current_date = current_file = None
+        for entry in entries:
+            if bucket != "today" and entry.due != current_date:
+                current_date, current_file = entry.due, None
+                console().print(f"[index]{entry.due:%a %Y-%m-%d}[text]", highlight=False)
+            if len(config.globals.todo_files) > 1 and entry.file != current_file:
+                current_file = entry.file
+                console().print(f"[header]{config.make_pretty_path(current_file)}[text]")
+            print_todo_item(entry.item)
+    if not any(buckets.values()) and config.settings.verbose:
+        error_console().print("nothing due")
+    if undated and config.settings.verbose:
+        error_console().print(f"[warning]{undated} item(s) with a due date that could not be understood")
+
+
+STATS_FORMATS = ("text", "json")
+
+
+def _print_stats_table(title: str, rows: dict[str, list[int]]):
+    from rich.table import Table
+
+    table = Table(title=title, title_justify="left", title_style="header")
+    table.add_column(title.split()[-1])
+    table.add_column("open", justify="right")
+    table.add_column("done", justify="right")
+    for key, (open_count, done_count) in sorted(rows.items(), key=lambda kv: (kv[0] == stats_module.NONE, kv[0])):
+        table.add_row(key, str(open_count), str(done_count))
+    console().print(table)
+
+
+@app.command()
+def stats(
+    files: Optional[list[Path]] = typer.Argument(None, help="override which markdown files to count"),
+    format: str = typer.Option("text", "--format", "-f", help=f"Output format, one of: {', '.join(STATS_FORMATS)}"),
+):
+    """
+    Show counts of open and done todo items per file, section, owner and priority
+    """
+    if format not in STATS_FORMATS:
+        error_console().print(f"error: invalid format '{format}', must be one of {', '.join(STATS_FORMATS)}")
+        raise typer.Exit(2)
+
+    files = [todofile for todofile in (files or config.globals.todo_files) if todofile and todofile.exists()]
+    summaries = None
+    if config.settings.sql_index:
+        import sqlite3
+
+        from . import sqlindex
+
+        try:
+            with sqlindex.SqlIndex.open() as db:
+                db.sync(files)
+                summaries = {todofile: db.summary(todofile) for todofile in files}
+        except (OSError, sqlite3.Error) as e:
+            if config.settings.verbose:
+                error_console().print(f"[warning]SQL index not available: {e}")
+    if summaries is None:
+        summaries = {todofile: stats_module.file_summary(todofile) for todofile in files}
+    total = stats_module.combine(summaries.values())
+
+    if format == "json":
+        data = {'files': {str(todofile): stats_module.as_json(summary) for todofile, summary in summaries.items()},
+                'total': stats_module.as_json(total)}
+        print(json.dumps(data, indent=2))
+        return
+
+    _print_stats_table("todo files", {str(config.make_pretty_path(todofile)): [summary['open'], summary['done']]
+                                      for todofile, summary in summaries.items()})
+    for dimension in stats_module.DIMENSIONS:
+        _print_stats_table(f"by {dimension}", total[dimension])
+
+
+@app.command()
+def count(
+    format: str = typer.Option("text", "--format", "-f",
+                               help=f"Output format, one of: {', '.join(counts_module.FORMATS)}"),
+):
+    """
+    Print the number of open and done todo items, made to be fast enough for a shell prompt (--format prompt)
+    """
+    if format not in counts_module.FORMATS:
+        error_console().print(f"error: invalid format '{format}', must be one of {', '.join(counts_module.FORMATS)}")
+        raise typer.Exit(2)
+    files = [todofile for todofile in config.globals.todo_files if todofile and todofile.exists()]
+    counts = counts_module.count_files(files, config.settings.section, filecache.cache_dir())
+    output = counts_module.format_counts(counts, format)
+    if output:
+        print(output)
+
+
+@app.command()
+def export(
+    files: Optional[list[Path]] = typer.Argument(None, help="override which markdown files to export"),
+    html: Optional[Path] = typer.Option(None, "--html", help="Folder to export HTML pages to", show_default=False),
+    markdown: Optional[Path] = typer.Option(None, "--markdown", help="Folder to export Markdown pages to",
+                                            show_default=False),
+    jobs: Optional[int] = typer.Option(None, "--jobs", "-j", min=1, show_default=False,
+                                       help="Number of processes to export many files with (default: one per CPU)"),
+):
+    """
+    Export todo files as static pages (index, per file and per section), rewriting only pages whose tasks changed
+    """
+    from . import export as export_module
+
+    targets = [(folder, format) for folder, format in ((html, "html"), (markdown, "markdown")) if folder]
+    if not targets:
+        error_console().print("error: nowhere to export to, give --html or --markdown")
+        raise typer.Exit(2)
+    files = [todofile for todofile in (files or config.globals.todo_files) if todofile and todofile.exists()]
+    for folder, format in targets:
+        result = export_module.export(files, folder, format, config.settings.section, jobs)
+        if config.settings.verbose:
+            console().print(f"{config.make_pretty_path(folder)}: {result.exported} of {result.files} file(s) changed, "
+                            f"{result.written} page(s) written")
 
-            for item in items:
-                print_todo_item(item)
 
+@app.command()
+def metrics(
+    output: Optional[Path] = typer.Option(None, "--output", "-o", show_default=False,
+                                          help="Textfile to write (default: the metrics_file setting, or stdout if "\
+                                          "not set)"),
+):
+    """
+    Write task counts per file and section, and parse/render/save latencies, as a Prometheus/OpenMetrics textfile
+    """
     for todofile in config.globals.todo_files:
-        listfromfile(todofile)
+        if todofile and todofile.exists():
+            summary = stats_module.file_summary(todofile)
+            counts = {('' if section == stats_module.NONE else section): value
+                      for section, value in summary['section'].items()}
+            metrics_module.record_file(todofile, counts)
+    output = output or (Path(config.settings.metrics_file).expanduser() if config.settings.metrics_file else None)
+    if output is None:
+        print(metrics_module.render(), end='')
+        return
+    try:
+        metrics_module.write(output)
+    except OSError as e:
+        error_console().print(f"error: can't write {output}: {e}")
+        raise typer.Exit(2)
 
 
 @app.command(name="debug")
@@ -111,87 +582,90 @@ def debug_command():
     console().print(d)
 
 
-def _add_item(todo_item: dict, todofile_path: Path):
-    if todofile_path and todofile_path.exists():
-        todo = TodoListParser()
-        todo.parse(todofile_path)
-        # TODO: need to append in the MD file in the right place (once we support sections, etc.)
-        todo.add_item_after(add=todo_item, after=todo.items[-1])
-        backup_command.save_with_backups(todofile_path, todo)
-    else:
-        error_console().print(f"Cannot add item to {todofile_path} because it does not exist")
-        raise typer.Exit(2)
-
-
 @app.command()
 def add(
     description: str,
     priority: int = typer.Option(None, "--priority", "-p"),
-    due: str = typer.Option(None, "--due", "-d", help="Due date in any format"),
+    due: str = typer.Option(None, "--due", "-d", help="Due date in any format, e.g. 2023-05-01, tomorrow, fri, +3d"),
     owner: str = typer.Option(None, "--owner", "-o", help="Owner userid or name"),
     done: bool = typer.Option(False, "--done", "-D", help="Add item marked as done"),
 ):
     """
     Add a new todo item to the list
     """
+    if due:
+        # relative due dates (tomorrow, fri, +3d...) only make sense as of today: store the actual date
+        due_date = taskitems.parse_due(due)
+        due = due_date.isoformat() if due_date else due
     duestr = f" due:{due}" if due else ""
     ownerstr = f" @{owner}" if owner else ""
     prioritystr = f" P{priority}" if priority else ""
     itemstr = f"{prioritystr}{ownerstr}{duestr} {description}".strip()
-    todo_item = TaskListTraverser.create_item(itemstr, index=0, checked=done)
-    for todo_file in config.globals.todo_files:
+    context = cli_context()
+    todo_item = None
+    for todo_file in context.files:
         if config.settings.verbose:
             console().print(f"[header]{config.make_pretty_path(todo_file)}[text]")
-        _add_item(todo_item, todo_file)
-    if config.settings.verbose:
+        if not (todo_file and todo_file.exists()):
+            error_console().print(f"Cannot add item to {todo_file} because it does not exist")
+            raise typer.Exit(2)
+        store = context.store(todo_file)
+        for similar in dedupe_module.similar_items(store.items, itemstr):
+            error_console().print(f"[warning]warning: similar item {similar['index']} ({similar['id'][:7]}) "
+                                  "already in the list, see `todo dedupe`")
+        # TODO: need to append in the MD file in the right place (once we support sections, etc.)
+        todo_item = store.add(itemstr, checked=done)
+        store.save()
+    if config.settings.verbose and todo_item:
         print_todo_item(todo_item)
 
 
 @app.command(name="remove")
 @app.command_alias(name="rm")
 def remove_command(
-    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text"),
-    id: str = typer.Option(None, "--id", "-i", help="ID of the item to remove"),
-    index: int = typer.Option(None, "--index", "-n", help="Index of the item to remove"),
+    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text",
+                               shell_complete=_complete_spec),
+    id: str = typer.Option(None, "--id", "-i", help="ID of the item to remove",
+                          shell_complete=_complete_id),
+    index: int = typer.Option(None, "--index", "-n", help="Index of the item to remove",
+                             shell_complete=_complete_index),
     range: str = typer.Option(None, "--range", "-r", help="Range of item indices to remove, e.g, 2:5, 2:, :5"),
-    match: str = typer.Option(None, "--match", "-m", help="Regular expression to match item text"),
+    match: Optional[list[str]] = typer.Option(None, "--match", "--grep", "-m", "-g",
+                                              help="Regular expression to match item text, can be repeated "\
+                                              "(items must match all of them, unless --any)"),
+    any_term: bool = typer.Option(False, "--any", help="Select items matching any of the --match terms"),
+    fixed: bool = typer.Option(False, "--fixed-strings", "-F", help="Match terms are literal strings"),
+    ignore_case: bool = typer.Option(False, "--ignore-case", "-I", help="Match terms case-insensitively"),
+    word: bool = typer.Option(False, "--word", "-w", help="Match terms as whole words only"),
+    recursive: bool = typer.Option(False, "--recursive", "-R", help="Also remove all subtasks of the selected items "\
+                                   "(otherwise they take the place of their parent)"),
     # TODO: add more filter options, done/undone, priority, due, owner, etc.
 ):
     """
     Remove/delete todo items from the list
     """
+    match = _make_matcher(match, any_term, fixed, ignore_case, word)
+    context = cli_context()
 
     def removefromfile(todo_file: Path) -> int:
         count = 0
         if todo_file and todo_file.exists():
             if config.settings.verbose:
                 console().print(f"[header]{config.make_pretty_path(todo_file)}[text]")
-            todo = TodoListParser()
-            todo.parse(todo_file)
+            store = context.store(todo_file)
             try:
-                items = taskitems.create_iterator(todo.items, omit_means_all=False,
-                                                  spec=spec, id=id, index=index, range=range, match=match)
+                removed = store.remove(recursive=recursive, spec=spec, id=id, index=index, range=range, match=match)
             except ValueError as e:
                 error_console().print(f"error: {e}")
                 raise typer.Exit(2)
-
-            try:
-                # we gather then commit to remove from list we are iterating over
-                to_remove = []
-                for item in items:
-                    to_remove.append(item)
-
-                count = len(to_remove)
-                while to_remove:
-                    item = to_remove.pop(0)
-                    todo.remove_item(item)
-                    if config.settings.verbose:
-                        print_todo_item(item)
             except Exception as e:
                 error_console().print(f"no items removed: {e}")
                 raise typer.Exit(2)
-            finally:
-                backup_command.save_with_backups(todo_file, todo)
+            store.save()
+            if config.settings.verbose:
+                for item in removed:
+                    print_todo_item(item)
+            count = len(removed)
         return count
 
     removed = 0
@@ -202,6 +676,207 @@ def remove_command(
         error_console().print("nothing to remove")
 
 
+@app.command(name="move")
+@app.command_alias(name="mv")
+def move_command(
+    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text",
+                               shell_complete=_complete_spec),
+    id: str = typer.Option(None, "--id", "-i", help="ID of the item to move",
+                          shell_complete=_complete_id),
+    index: int = typer.Option(None, "--index", "-n", help="Index of the item to move",
+                             shell_complete=_complete_index),
+    range: str = typer.Option(None, "--range", "-r", help="Range of item indices to move, e.g, 2:5, 2:, :5"),
+    match: Optional[list[str]] = typer.Option(None, "--match", "--grep", "-m", "-g",
+                                              help="Regular expression to match item text, can be repeated "\
+                                              "(items must match all of them, unless --any)"),
+    any_term: bool = typer.Option(False, "--any", help="Select items matching any of the --match terms"),
+    fixed: bool = typer.Option(False, "--fixed-strings", "-F", help="Match terms are literal strings"),
+    ignore_case: bool = typer.Option(False, "--ignore-case", "-I", help="Match terms case-insensitively"),
+    word: bool = typer.Option(False, "--word", "-w", help="Match terms as whole words only"),
+    to: str = typer.Option(None, "--to", "-t",
+                           help="Where to move items: an index (before that item, after the last one if past it) "\
+                           "or a section, e.g. '## Later' (at its end, before its subsections)"),
+    to_global: Optional[bool] = typer.Option(None, "--to-global/--to-local",
+                                             help="Move items to the global or local todo list (default: the same one)",
+                                             show_default=False),
+):
+    """
+    Move todo items (with their subtasks) to another place, section or todo list, keeping their IDs
+    """
+    match = _make_matcher(match, any_term, fixed, ignore_case, word)
+    if spec is None and id is None and index is None and range is None and not match:
+        error_console().print("error: no items selected, give a spec, --id, --index, --range or --match")
+        raise typer.Exit(2)
+    if to is None and to_global is None:
+        error_console().print("error: nowhere to move items to, give --to, --to-global or --to-local")
+        raise typer.Exit(2)
+    destination = int(to) if to is not None and to.isdigit() else to
+
+    context = cli_context()
+    stores = context.stores()
+    if not stores:
+        error_console().print("error: no todo file to move items from")
+        raise typer.Exit(2)
+    source = stores[0]
+    target = source
+    if to_global is not None:
+        target_file = config.globals._global_todofile if to_global else config.globals._local_todofile
+        if target_file is None:
+            error_console().print("error: no local todo list, not in a git repo")
+            raise typer.Exit(2)
+        if not target_file.exists():
+            error_console().print(f"error: {config.make_pretty_path(target_file)} does not exist. "
+                                  f"Use `todo init{'' if to_global else ' --local'}` to create it.")
+            raise typer.Exit(2)
+        target = context.store(target_file)
+
+    items = source.select(spec=spec, id=id, index=index, range=range, match=match)
+    if not items:
+        error_console().print("nothing to move")
+        return
+    try:
+        moved = source.move_to(items, destination, store=target)
+    except ValueError as e:
+        error_console().print(f"error: {e}")
+        raise typer.Exit(2)
+    # the destination first: if saving the source failed, items would be in both lists rather than in none
+    target.save()
+    source.save()
+    if config.settings.verbose:
+        console().print(f"[header]{config.make_pretty_path(target.path)}[text]")
+        for item in moved:
+            print_todo_item(item)
+
+
+@app.command()
+def dedupe(
+    dry_run: bool = typer.Option(False, "--dry-run", "-n", help="Only show duplicates, don't remove them"),
+):
+    """
+    Remove duplicate todo items (same text, ignoring case, spacing and metadata), keeping the first one or the done one
+    """
+    context = cli_context()
+    items = []
+    files: dict[int, Path] = {}   # id() of the items -> their file
+    for store in context.stores():
+        for item in store.items:
+            files[id(item)] = store.path
+            items.append(item)
+
+    to_remove: dict[Path, list[dict]] = {}
+    for group in dedupe_module.find_duplicates(items):
+        keep = dedupe_module.keeper(group)
+        console().print(f"[header]{config.make_pretty_path(files[id(keep)])}[text]")
+        print_todo_item(keep)
+        for item in group:
+            if item is keep:
+                continue
+            kind = "exact" if item['id'] == keep['id'] else "similar"
+            if files[id(item)] != files[id(keep)]:
+                kind += f" in {config.make_pretty_path(files[id(item)])}"
+            if item['subtasks']:
+                kind += ", kept as it has subtasks"
+            else:
+                to_remove.setdefault(files[id(item)], []).append(item)
+            console().print(f"[header]  {kind}:[text]")
+            print_todo_item(item)
+
+    removed = sum(len(duplicates) for duplicates in to_remove.values())
+    if not dry_run:
+        # one batched removal and write per file
+        for todo_file, duplicates in to_remove.items():
+            store = context.store(todo_file)
+            store.remove(duplicates)
+            store.save()
+    if config.settings.verbose or dry_run:
+        error_console().print(f"{removed} duplicate(s) {'found' if dry_run else 'removed'}")
+
+
+@app.command()
+def sync(
+    remote: Optional[str] = typer.Option(None, "--remote", show_default=False,
+                                         help="Folder or sync server URL to sync with (default: the sync_remote "
+                                         "setting)"),
+    name: Optional[str] = typer.Option(None, "--name", show_default=False,
+                                       help="Name of the list on the remote (default: the todo file name)"),
+):
+    """
+    Sync the todo list with a remote (a folder or a sync server), task by task: only changes are sent and received,
+    and when a task changed on both sides, the local change wins
+    """
+    from . import sync as sync_module
+
+    remote = remote or config.settings.sync_remote
+    if not remote:
+        error_console().print("error: nowhere to sync with, give --remote or set sync_remote")
+        raise typer.Exit(2)
+    stores = cli_context().stores()
+    if not stores:
+        error_console().print("error: no todo file to sync")
+        raise typer.Exit(2)
+    store = stores[0]
+    try:
+        result = sync_module.sync(store, sync_module.open_remote(remote), name or store.path.name)
+    except (sync_module.SyncError, OSError) as e:
+        error_console().print(f"error: can't sync {config.make_pretty_path(store.path)} with {remote}: {e}")
+        raise typer.Exit(2)
+    if result.conflicts:
+        error_console().print(f"[warning]warning: {len(result.conflicts)} item(s) changed on both sides, kept as here")
+    if config.settings.verbose:
+        console().print(f"{config.make_pretty_path(store.path)}: {result.pulled} change(s) pulled, "
+                        f"{result.pushed} pushed (version {result.seq})")
+
+
+@app.command(name="sync-server")
+def sync_server(
+    folder: Path = typer.Argument(..., help="Folder to keep the lists' change logs in"),
+    host: str = typer.Option("127.0.0.1", "--host", help="Address to listen on"),
+    port: int = typer.Option(8765, "--port", "-p", min=0, max=65535, help="Port to listen on"),
+):
+    """
+    Run a sync server for `todo sync --remote http://HOST:PORT` (no authentication: use it on a trusted network)
+    """
+    from . import syncserver
+
+    try:
+        server = syncserver.make_server(folder.expanduser(), host, port)
+    except OSError as e:
+        error_console().print(f"error: can't serve {folder} on {host}:{port}: {e}")
+        raise typer.Exit(2)
+    console().print(f"serving {config.make_pretty_path(folder)} on http://{host}:{server.server_address[1]}")
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+@app.command()
+def tui(
+    save_delay: float = typer.Option(2.0, "--save-delay", min=0,
+                                     help="Save changes after this many seconds without changes (and on exit)"),
+):
+    """
+    Browse and edit the todo list in a full screen interface
+    """
+    from . import tui as tui_module
+
+    todo_files = [todo_file for todo_file in config.globals.todo_files if todo_file and todo_file.exists()]
+    if not todo_files:
+        error_console().print("error: no todo file")
+        raise typer.Exit(2)
+    if not console().is_terminal:
+        error_console().print("error: the interface needs a terminal")
+        raise typer.Exit(2)
+    # only the first file (the most specific one), like the backup commands
+    state = tui_module.TuiState(cli_context().store(todo_files[0]), save_delay)
+    try:
+        tui_module.run(state)
+    except ImportError:
+        error_console().print("error: the interface needs the curses module, which is not available here")
+        raise typer.Exit(2)
+
+
 @app.command(name="clean")
 def clean_command(just_move: bool = typer.Option(None, "--move/--remove", "-m/-r", show_default=False,
                                                  help="Cleanup method: either move to the done section or just remove items. "\
@@ -214,7 +889,7 @@ def clean_command(just_move: bool = typer.Option(None, "--move/--remove", "-m/-r
             if config.settings.verbose:
                 fname = config.make_pretty_path(todo_file)
                 console().print(f"[header]{fname}[text] - {'moving' if move else '[warning]removing[text]'} done items:")
-            todo = TodoListParser()
+            todo = TodoListParser(config.settings.section)
             todo.parse(todo_file)
             try:
                 items = taskitems.create_iterator(todo.items, omit_means_all=False, done=True)
@@ -241,7 +916,9 @@ def clean_command(just_move: bool = typer.Option(None, "--move/--remove", "-m/-r
                 error_console().print(f"no items cleaned: {e}")
                 raise typer.Exit(2)
             finally:
-                backup_command.save_with_backups(todo_file, todo)
+                from .backup_command import save_with_backups
+
+                save_with_backups(todo_file, todo)
         return count
 
     if just_move is None:
@@ -255,35 +932,71 @@ def clean_command(just_move: bool = typer.Option(None, "--move/--remove", "-m/-r
         error_console().print("nothing to clean")
 
 
-def _done_undone_marker(done: bool, spec, id, index, range, match, all):
+def _mark_with_sidecar(todo_file: Path, done: bool, spec, id, index) -> Optional[int]:
+    """
+    Marks items targeted by ID or index using the sidecar index of the file, patching their markers in place.
+    Returns the number of items marked or None if it can't be done this way (then a full parse is needed).
+    """
+    if spec is not None:
+        criteria = taskitems.parse_spec(spec)
+        id = criteria.get('id')
+        index = criteria.get('index')
+    if id is None and index is None:
+        return None
+
+    data = todo_file.read_bytes()
+    index_data = sidecar.read_index(todo_file, config.settings.section, data=data)
+    if index_data is None:
+        return None
+    entries = sidecar.find_entries(index_data, id=id, index_number=index)
+    if not entries:
+        return None   # let the full parse handle (and report) it
+    patched = sidecar.patch_markers(data, entries, done)
+    if patched is None:
+        return None
+    patched_file = sidecar.PatchedFile(patched, index_data, entries, done)
+    if patched != data:
+        from .backup_command import save_with_backups
+
+        save_with_backups(todo_file, patched_file)
+    if config.settings.verbose:
+        for item in patched_file.items:
+            print_todo_item(item)
+    return len(entries)
+
+
+def _done_undone_marker(done: bool, spec, id, index, range, match, all, recursive=False):
     """
     Mark one or more todo items as done or undone.
     """
     # ensure exactly one of spec, id, index, match or all is not None
-    if sum([spec is not None, id is not None, index is not None, range is not None, match is not None, all]) != 1:
+    if sum([spec is not None, id is not None, index is not None, range is not None, bool(match), all]) != 1:
         raise typer.BadParameter("Exactly one of --id, --index, --range, --match or --all must be provided")
+    context = cli_context()
 
     def doneundonefromfile(todo_file: Optional[Path]) -> int:
         count = 0
         if todo_file and todo_file.exists():
             if config.settings.verbose:
                 console().print(f"[header]{config.make_pretty_path(todo_file)}[text] changes:")
-            todo = TodoListParser()
-            todo.parse(todo_file)
+            if config.settings.sidecar_index and not recursive:
+                # fast path: single items by ID or index can be patched in place without parsing the file
+                marked = _mark_with_sidecar(todo_file, done, spec, id, index)
+                if marked is not None:
+                    return marked
+            store = context.store(todo_file)
             try:
-                items = taskitems.create_iterator(todo.items, omit_means_all=False,
-                                                  spec=spec, id=id, index=index, range=range, match=match) if not all else todo.items
+                items = store.mark(done, all=all, recursive=recursive,
+                                   spec=spec, id=id, index=index, range=range, match=match)
             except ValueError as e:
                 error_console().print(f"error: {e}")
                 raise typer.Exit(2)
-
-            for item in items:
-                item['checked'] = done
-                if config.settings.verbose:
+            if config.settings.verbose:
+                for item in items:
                     print_todo_item(item)
-                count += 1
+            count = len(items)
             # write back to file
-            backup_command.save_with_backups(todo_file, todo)
+            store.save()
         return count
 
     for todo_file in config.globals.todo_files:
@@ -294,65 +1007,124 @@ def _done_undone_marker(done: bool, spec, id, index, range, match, all):
 # (exactly one option must be provided)
 @app.command()
 def done(
-    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text"),
-    id: str = typer.Option(None, "--id", "-i", help="ID of the item to mark"),
-    index: int = typer.Option(None, "--index", "-n", help="Index of the item to mark"),
+    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text",
+                               shell_complete=_complete_spec),
+    id: str = typer.Option(None, "--id", "-i", help="ID of the item to mark",
+                          shell_complete=_complete_id),
+    index: int = typer.Option(None, "--index", "-n", help="Index of the item to mark",
+                             shell_complete=_complete_index),
     range: str = typer.Option(None, "--range", "-r", help="Range of item indices to mark, e.g, 2:5, 2:, :5"),
-    match: str = typer.Option(None, "--match", "-m", help="Regular expression to match item text"),
+    match: Optional[list[str]] = typer.Option(None, "--match", "--grep", "-m", "-g",
+                                              help="Regular expression to match item text, can be repeated "\
+                                              "(items must match all of them, unless --any)"),
+    any_term: bool = typer.Option(False, "--any", help="Select items matching any of the --match terms"),
+    fixed: bool = typer.Option(False, "--fixed-strings", "-F", help="Match terms are literal strings"),
+    ignore_case: bool = typer.Option(False, "--ignore-case", "-I", help="Match terms case-insensitively"),
+    word: bool = typer.Option(False, "--word", "-w", help="Match terms as whole words only"),
     all: bool = typer.Option(False, "--all", "-a", help="Mark all items"),
+    recursive: bool = typer.Option(False, "--recursive", "-R", help="Also mark all subtasks of the selected items"),
 ):
     """
     Mark one or more todo items as done
     """
-    _done_undone_marker(True, spec, id, index, range, match, all)
+    _done_undone_marker(True, spec, id, index, range, _make_matcher(match, any_term, fixed, ignore_case, word),
+                        all, recursive)
 
 
 # undone [--id <id> | --index <index> | --all | --match <regular expression> | <specification>]
 # (exactly one option must be provided)
 @app.command()
 def undone(
-    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text"),
-    id: str = typer.Option(None, "--id", "-i", help="ID of the item to mark"),
-    index: int = typer.Option(None, "--index", "-n", help="Index of the item to mark"),
+    spec: str = typer.Argument(None, help="ID, index, range or regular expression to match item text",
+                               shell_complete=_complete_spec),
+    id: str = typer.Option(None, "--id", "-i", help="ID of the item to mark",
+                          shell_complete=_complete_id),
+    index: int = typer.Option(None, "--index", "-n", help="Index of the item to mark",
+                             shell_complete=_complete_index),
     range: str = typer.Option(None, "--range", "-r", help="Range of item indices to mark,e.g, 2:5, 2:, :5"),
-    match: str = typer.Option(None, "--match", "-m", help="Regular expression to match item text"),
+    match: Optional[list[str]] = typer.Option(None, "--match", "--grep", "-m", "-g",
+                                              help="Regular expression to match item text, can be repeated "\
+                                              "(items must match all of them, unless --any)"),
+    any_term: bool = typer.Option(False, "--any", help="Select items matching any of the --match terms"),
+    fixed: bool = typer.Option(False, "--fixed-strings", "-F", help="Match terms are literal strings"),
+    ignore_case: bool = typer.Option(False, "--ignore-case", "-I", help="Match terms case-insensitively"),
+    word: bool = typer.Option(False, "--word", "-w", help="Match terms as whole words only"),
     all: bool = typer.Option(False, "--all", "-a", help="Mark all items"),
+    recursive: bool = typer.Option(False, "--recursive", "-R", help="Also mark all subtasks of the selected items"),
 ):
     """
     Mark one or more todo items as NOT done (undone)
     """
-    _done_undone_marker(False, spec, id, index, range, match, all)
+    _done_undone_marker(False, spec, id, index, range, _make_matcher(match, any_term, fixed, ignore_case, word),
+                        all, recursive)
+
+
+def _show_file(file: Path, raw: bool, section: Optional[str], lines: Optional[slice], out):
+    """Prints a markdown file one heading delimited chunk at a time, reading only as much of the file as needed."""
+    with file.open() as f:
+        file_lines = itertools.islice(f, lines.start, lines.stop, lines.step) if lines else f
+        section_level = None   # level of the selected section while we are in it
+        for heading, chunk in linescan.iter_sections(file_lines):
+            if section:
+                level = len(heading) - len(heading.lstrip('#'))
+                if section_level is not None and 0 < level <= section_level:
+                    break   # section (and its subsections) done, no need to read any further
+                if section_level is None:
+                    if not heading or not linescan.heading_matches(section, heading):
+                        continue
+                    section_level = level
+            with profiling.span("render"):
+                if raw:
+                    util.print_md_as_raw(''.join(chunk), out, end='')
+                else:
+                    util.print_md_pretty(''.join(chunk), out)
 
 
 @app.command()
 def show(files: Optional[list[Path]] = typer.Argument(None, help="override which markdown files to show"),
-         raw: bool = typer.Option(False, "--raw", help="Print the raw markdown man content")
+         raw: bool = typer.Option(False, "--raw", help="Print the raw markdown man content"),
+         section: Optional[str] = typer.Option(None, "--section", "-s",
+                                               help="Only show this section (and its subsections), e.g. '## TODO'"),
+         lines: Optional[str] = typer.Option(None, "--lines", "-l",
+                                             help="Only show this range of lines, e.g. 0:100 or 200: (from 0 like --range)"),
+         pager: bool = typer.Option(False, "--pager", "-p", help="Show output in a pager ($PAGER or less)"),
         ):
     """
     Show markdown file(s) with rich rendering. Defaults to the active, configured files.
     """
-    md_print = util.print_md_as_raw if raw else util.print_md_pretty
+    line_range = None
+    if lines:
+        try:
+            line_range = taskitems.parse_slice(lines)
+            if any(x is not None and x < 0 for x in (line_range.start, line_range.stop, line_range.step)):
+                raise ValueError("negative values are not supported")
+            if line_range.step == 0:
+                raise ValueError("step can't be zero")
+        except (ValueError, TypeError) as e:
+            error_console().print(f"error: invalid line range '{lines}': {e}")
+            raise typer.Exit(2)
+
     if not files:
         files = config.globals.todo_files
-    for file in files:
-        if file and file.exists():
-            if len(files) > 1:
-                console().print(f"[header]{config.make_pretty_path(file)}[text]")
-            with file.open() as f:
-                mdstring = f.read()
-                md_print(mdstring)
+    with (util.pager_console() if pager else contextlib.nullcontext(console())) as out:
+        for file in files:
+            if file and file.exists():
+                if len(files) > 1:
+                    out.print(f"[header]{config.make_pretty_path(file)}[text]")
+                _show_file(file, raw, section, line_range, out)
 
 
-app.add_typer(manapp,
-              name="man",
-              help="Show detailed help and context for settings, file format and heuristics",
-              no_args_is_help=True)
+# subcommand groups are only imported when used
+app.add_lazy_typer("drtodo.man_command:manapp",
+                   name="man",
+                   help="Show detailed help and context for settings, file format and heuristics",
+                   no_args_is_help=True)
 
 
-app.add_typer(backup_command.app,
-              name="backup",
-              help="Manage backups of markdown files",
-              no_args_is_help=True)
+app.add_lazy_typer("drtodo.backup_command:app",
+                   name="backup",
+                   help="Manage backups of markdown files",
+                   no_args_is_help=True)
 
 
 def _version_callback(value: bool) -> None:
@@ -367,12 +1139,24 @@ def _global_local_callback(value: bool):
         config.postclioptions_initialize(force_global=value, force_local=not value)
 
 
+def _profile_callback(ctx: typer.Context, value: bool):
+    if value and not ctx.resilient_parsing:
+        try:
+            # eager values are not converted by typer yet: Paths are still plain strings here
+            output = ctx.params.get('profile_output')
+            profiling.enable(ctx.params.get('profile_format'), Path(output) if output else None)
+        except ValueError as e:
+            raise typer.BadParameter(str(e), param_hint="--profile-format")
+
+
 panel_ADVANCED = "Advanced options"
+panel_PROFILING = "Profiling options"
 
 
 # Typer callback handles global options like --mdfile and --verbose
 @app.callback()
 def main_callback(
+    ctx: typer.Context,
     # settings_file: Optional[Path] = typer.Option(config.constants.appdir, "--settings", "-S", help="Settings file to use",
     #                                              rich_help_panel=panel_GLOBAL),
     global_local: Optional[bool] = typer.Option(None,
@@ -384,7 +1168,7 @@ def main_callback(
     section: Optional[str] = typer.Option(None,
         help="Section name in markdown file to use for todo list, with optional "\
         "heading level, e.g. '## TODO'", show_default=False,
-        rich_help_panel=panel_ADVANCED),
+        shell_complete=_complete_section, rich_help_panel=panel_ADVANCED),
     done_section: Optional[str] = typer.Option(None,
         help="Section name in markdown file to use for done items, with optional "\
         "heading level, e.g. '## DONE'", show_default=False,
@@ -403,7 +1187,23 @@ def main_callback(
         "--version", "-V",
         help="Show version and exit",
         callback=_version_callback, is_eager=True),
+    profile_format: Optional[str] = typer.Option(None,
+        "--profile-format", show_default=False,
+        help=f"Profile report format, one of: {', '.join(profiling.FORMATS)} (trace is the Chrome trace-event format)",
+        is_eager=True, rich_help_panel=panel_PROFILING),
+    profile_output: Optional[Path] = typer.Option(None,
+        "--profile-output",
+        help="Write the profile report to this file instead of stderr", show_default=False,
+        is_eager=True, rich_help_panel=panel_PROFILING),
+    profile: bool = typer.Option(False,
+        "--profile",
+        help="Report time and memory used by each phase (config, parsing, rendering, saving...). "\
+        "Also enabled with the DRTODO_PROFILE env variable",
+        callback=_profile_callback, rich_help_panel=panel_PROFILING),
 ):
+    if profiling.enabled():
+        ctx.call_on_close(profiling.report)
+    ctx.call_on_close(_write_metrics)
     if mdfile:
         config.settings.mdfile = str(mdfile)
     if verbose:
@@ -1,12 +1,10 @@
-import typer
 from importlib import resources
-from . import man
 
-from typer_aliases import Typer
+import typer
 
-from . import config
-from . import util
+from typer_aliases import Typer
 
+from . import config, man, util
 
 man_output = None
 manapp = Typer()
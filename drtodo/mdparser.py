@@ -1,10 +1,13 @@
-import mistune
+from collections.abc import Iterable, Iterator
 from pathlib import Path
+from typing import Callable, Optional
+
+import mistune
 from mistune.renderers.markdown import MarkdownRenderer
+
+from . import linescan, metrics, profiling
 from .mistuneplugin import task_lists
-from typing import Callable, Optional
 
-from . import config
 
 class TokenTraverser:
 
@@ -34,6 +37,9 @@ class TokenTraverser:
 
 class TaskListTraverser(TokenTraverser):
 
+    def __init__(self, section: str):
+        self.section = section   # e.g. '## TODO', '' for all items
+
     @staticmethod
     def calc_git_hash(text):
         import hashlib
@@ -47,7 +53,8 @@ class TaskListTraverser(TokenTraverser):
         """
         id = TaskListTraverser.calc_git_hash(text.strip())  # always ignore leading and trailing whitespace for hash
         token = token or TaskListTraverser.create_item_token(checked, text)
-        item = {'checked': checked, 'text': text, 'id': id, 'index': index, 'token': token}
+        item = {'checked': checked, 'text': text, 'id': id, 'index': index, 'token': token,
+                'parent_task': None, 'subtasks': [], 'depth': 0, 'span': 1}
         token['task_item'] = item
         return item
 
@@ -71,18 +78,22 @@ class TaskListTraverser(TokenTraverser):
     def find_task_lists(self, tokens: list[dict]) -> list:
         found_items = []
 
-        if config.settings.section:
+        section = self.section
+        if section:
             # we will only look for tasks in the section with the given name and optional level
             # parse the section name and level e.g. "## section name", "section name", etc.
-            s = config.settings.section.lstrip('#')
-            selected_section = { 'level': len(config.settings.section) - len(s),
+            s = section.lstrip('#')
+            selected_section = { 'level': len(section) - len(s),
                                  'name': s.strip().casefold(),
                                  'current': False }
         else:
             selected_section = { 'level': None, 'name': None, 'current': True }
+        current_heading = ''
 
         def match_task_item(tok, parent_tokens) -> bool:
+            nonlocal current_heading
             if tok['type'] == 'heading':
+                current_heading = '#' * tok['attrs']['level'] + ' ' + self.capture_all_text(tok).strip()
                 if selected_section['name']:
                     if (not selected_section['level'] or tok['attrs']['level'] == selected_section['level']) and \
                         selected_section['name'] == self.capture_all_text(tok).strip().casefold():
@@ -109,28 +120,81 @@ class TaskListTraverser(TokenTraverser):
                                              checked=tok['attrs']['checked'],
                                              token=tok)
                 task_item['parent'] = parent_tokens
+                task_item['section'] = current_heading
                 found_items.append(tok['task_item'])
 
             return True
 
         self.traverse_tokens(tokens, match_task_item)
+        self.link_task_tree(tokens, found_items)
         return found_items
 
+    @staticmethod
+    def link_task_tree(tokens: list[dict], items: list[dict]):
+        """
+        links task items into a tree following the nesting of their tokens. Sets for each item:
+        - parent_task: item the task is a subtask of, None for top level tasks
+        - subtasks: list of direct subtasks
+        - depth: 0 for top level tasks, 1 for their subtasks, etc.
+        - span: number of items in the subtree of the task, itself included. Items are in pre-order, so the subtree
+          of an item is always items[item['index']:item['index'] + item['span']]
+        - parent: the token list the token of the task is in
+        """
+        found = {id(item) for item in items}
+
+        def link(tokens: list[dict], parent: Optional[dict]):
+            for tok in tokens:
+                item = tok.get('task_item')
+                if item is not None and id(item) in found:
+                    item['parent'] = tokens
+                    item['parent_task'] = parent
+                    item['subtasks'] = []
+                    item['depth'] = parent['depth'] + 1 if parent else 0
+                    if parent:
+                        parent['subtasks'].append(item)
+                    link(tok['children'], item)
+                    item['span'] = 1 + sum(subtask['span'] for subtask in item['subtasks'])
+                elif 'children' in tok:
+                    link(tok['children'], parent)
+
+        link(tokens, None)
+
 
 class TodoListParser:
 
-    def __init__(self):
+    def __init__(self, section: str):
+        self.section = section   # e.g. '## TODO', '' for all items
         self.markdownparser = mistune.create_markdown(renderer=MarkdownRenderer(), plugins=[task_lists])
         self.items = []
         self.state = None
+        self.changes: list[tuple[str, dict]] = []
+        """items added, removed or moved since the list was parsed or written: ('add' | 'remove' | 'move', item)"""
+
+    def changed_items(self) -> list[dict]:
+        """items whose checked state or text is not what was parsed (or last written)"""
+        return [item for item in self.items
+                if item['checked'] != item['token']['attrs']['checked'] or item['text'] != item['token']['attrs']['task_text']]
+
+    @property
+    def dirty(self) -> bool:
+        """whether writing the list would change anything"""
+        return bool(self.changes) or any(True for _ in self.changed_items())
 
     def parse(self, pathname: Path) -> list:
-        with open(pathname) as f:
-            text = f.read()
+        with metrics.timer("parse"):
+            with profiling.span("parse.read"), open(pathname) as f:
+                text = f.read()
+            return self.parse_text(text)
+
+    def parse_text(self, text: str) -> list:
+        """parses markdown text as the content of a todo file, returns its items"""
+        with profiling.span("parse.mistune"):
             result, state = self.markdownparser.parse(text)
-            # traverse the tokens
-            self.items = TaskListTraverser().find_task_lists(state.tokens)
-            self.state = state
+        # traverse the tokens
+        with profiling.span("parse.traverse"):
+            self.items = TaskListTraverser(self.section).find_task_lists(state.tokens)
+        self.state = state
+        self.changes = []
         return self.items
 
     def add_item_after(self, *, add: dict, after: dict):
@@ -138,41 +202,194 @@ class TodoListParser:
         # first find the index of the 'after' token in the parent list. if it fails we don't mess with the state
         relative_index = after['parent'].index(after['token']) + 1
 
-        self.items.insert(after['index'] + 1, add)
+        # 'add' becomes the next sibling of 'after': it goes after the whole subtree of 'after'
+        self.items.insert(after['index'] + after['span'], add)
+        add['parent'] = after['parent']
+        add['parent_task'] = parent = after['parent_task']
+        add['depth'] = after['depth']
+        add['section'] = after.get('section', '')
+        if parent:
+            parent['subtasks'].insert(parent['subtasks'].index(after) + 1, add)
+        while parent:
+            parent['span'] += add['span']
+            parent = parent['parent_task']
         # reindex all the items now
         for i, item in enumerate(self.items):
             item['index'] = i
         # add the token to the state, by adding to the parent token (which is a list) after the 'after' token
         after['parent'].insert(relative_index, add['token'])
+        self.changes.append(('add', add))
         # done
         # from rich import print
         # print(after['parent'])
 
+    @staticmethod
+    def _update_token(item: dict):
+        token = item['token']
+        token['attrs']['checked'] = item['checked']
+        token['attrs']['task_text'] = item['text']
+        text_part = item['text'][:-1] if item['text'].endswith('\n') else item['text']   # trim just \n
+        rawtext = f"[{'x' if item['checked'] else ' '}] {text_part}"
+        assert token['children'][0]['type'] == 'block_text'
+        # overwrite the children as a simple text token
+        token['children'][0]['children'] = [{'type': 'text', 'raw': rawtext}]
+
     def _update_md_from_items(self):
         """Update the markdown text from the updated state in the items. Must be called before write()"""
         for item in self.items:
-            token = item['token']
-            token['attrs']['checked'] = item['checked']
-            text_part = item['text'][:-1] if item['text'].endswith('\n') else item['text']   # trim just \n
-            rawtext = f"[{'x' if item['checked'] else ' '}] {text_part}"
-            assert token['children'][0]['type'] == 'block_text'
-            # overwrite the children as a simple text token
-            token['children'][0]['children'] = [{'type': 'text', 'raw': rawtext}]
+            self._update_token(item)
 
     def write(self, pathname: Path):
         self._update_md_from_items()
         mdtext = self.markdownparser.render_state(self.state)
+        # rendering replaces the children lists of the tokens: items must point to the new ones to be changed again
+        TaskListTraverser.link_task_tree(self.state.tokens, self.items)
         with open(pathname, 'w') as f:
             f.write(str(mdtext))
+        self.changes = []
 
-    def remove_item(self, item: dict):
-        """Remove the given item from the items and state"""
+    def remove_item(self, item: dict, subtasks: bool = True) -> list[dict]:
+        """
+        Remove the given item from the items and state, along with all its subtasks (they are part of its token), or
+        only the item if not `subtasks`: its subtasks then take its place, one level up. Returns the removed items, in
+        order.
+        """
         # first find the index of the 'after' token in the parent list. if it fails we don't mess with the state
         assert item['parent']
         relative_index = item['parent'].index(item['token'])
         assert relative_index >= 0
-        self.items.remove(item)
+        if not subtasks and item['subtasks']:
+            # the list items nested in the item (tasks or not) move up to its list
+            promoted = [tok for child in item['token']['children'] if child['type'] == 'list'
+                        for tok in child['children']]
+            item['parent'][relative_index:relative_index + 1] = promoted
+            self.changes.append(('remove', item))
+            self._relink()
+            return [item]
+        start = self.items.index(item)
+        removed = self.items[start:start + item['span']]
+        del self.items[start:start + item['span']]
         del item['parent'][relative_index]
+        parent = item['parent_task']
+        if parent:
+            parent['subtasks'].remove(item)
+        while parent:
+            parent['span'] -= item['span']
+            parent = parent['parent_task']
         # reindex all the items now
-        for i, item in enumerate(self.items):
-            item['index'] = i
+        for i, it in enumerate(self.items):
+            it['index'] = i
+        self.changes.append(('remove', item))
+        return removed
+
+    def move_item(self, item: dict, offset: int) -> bool:
+        """
+        Move the given item (with its subtasks) up (offset < 0) or down among the items of its list, past `offset`
+        sibling list items. Returns False if it can't move that far.
+        """
+        siblings = item['parent']
+        relative_index = siblings.index(item['token'])
+        target = relative_index + offset
+        if offset == 0 or not 0 <= target < len(siblings):
+            return False
+        siblings.insert(target, siblings.pop(relative_index))
+        self._relink()
+        self.changes.append(('move', item))
+        return True
+
+    @staticmethod
+    def _subtree(item: dict) -> Iterator[dict]:
+        yield item
+        for subtask in item['subtasks']:
+            yield from TodoListParser._subtree(subtask)
+
+    def _relink(self):
+        """rebuilds the items (tree and order) from the tokens after they were moved around, keeping existing items"""
+        items = TaskListTraverser(self.section).find_task_lists(self.state.tokens)
+        for i, it in enumerate(items):
+            it['index'] = i
+        self.items[:] = items
+
+    def detach_items(self, items: Iterable[dict]) -> list[dict]:
+        """
+        Takes the given items (with their subtasks) out of the list in one pass, to insert them somewhere else with
+        insert_items() (in this list or another one). Items in the subtree of another given item just go with it.
+        Returns the items taken out, in list order.
+        """
+        selected = {id(item) for item in items}
+        detached = []
+        for item in self.items:
+            ancestor = item['parent_task']
+            while ancestor is not None and id(ancestor) not in selected:
+                ancestor = ancestor['parent_task']
+            if id(item) in selected and ancestor is None:
+                detached.append(item)
+        for item in detached:
+            # the tokens keep the current state of the items wherever they end up
+            for it in self._subtree(item):
+                self._update_token(it)
+            siblings = item['parent']
+            del siblings[next(i for i, tok in enumerate(siblings) if tok is item['token'])]
+            self.changes.append(('remove', item))
+        self._relink()
+        return detached
+
+    def insert_items(self, items: list[dict], parent: list, position: int, section: str = ''):
+        """
+        Inserts items taken out by detach_items() into the token list `parent` (a list of list item tokens, see
+        insertion_point()) at `position`. `section` is the heading of the section they go to.
+        """
+        parent[position:position] = [item['token'] for item in items]
+        for item in items:
+            item['parent'] = parent
+            for it in self._subtree(item):
+                it['section'] = section
+            self.changes.append(('add', item))
+        self._relink()
+
+    def insertion_point(self, section: str) -> tuple[list, str]:
+        """
+        Returns where to insert items at the end of a section (given like the section setting, e.g. '## Later'): the
+        token list of the last list in the section before its subsections, created after its text if there is none,
+        and the section heading. Raises ValueError if there is no such section.
+        """
+        tokens = self.state.tokens
+        for start, tok in enumerate(tokens):
+            if tok['type'] != 'heading':
+                continue
+            level = tok['attrs']['level']
+            heading = '#' * level + ' ' + TaskListTraverser.capture_all_text(tok).strip()
+            if not linescan.heading_matches(section, heading):
+                continue
+            # the section's own content ends at the next heading, of a subsection or not
+            end = start + 1
+            last_list = None
+            while end < len(tokens) and tokens[end]['type'] != 'heading':
+                if tokens[end]['type'] == 'list':
+                    last_list = tokens[end]
+                end += 1
+            if last_list is not None:
+                return last_list['children'], heading
+            while tokens[end - 1]['type'] == 'blank_line':
+                end -= 1
+            new_list = self._new_list_token()
+            tokens[end:end] = [{'type': 'blank_line'}, new_list]
+            return new_list['children'], heading
+        raise ValueError(f"no section '{section}' found")
+
+    @staticmethod
+    def _new_list_token() -> dict:
+        return {'type': 'list', 'children': [], 'tight': True, 'bullet': '-', 'attrs': {'depth': 0, 'ordered': False}}
+
+    def append_point(self) -> tuple[list, str]:
+        """
+        Returns where to insert items in a list that has none yet, like insertion_point(): the end of the section set
+        for the list, or a new list at the end of the file if no section is set.
+        """
+        if self.section:
+            return self.insertion_point(self.section)
+        new_list = self._new_list_token()
+        if self.state.tokens:
+            self.state.tokens.append({'type': 'blank_line'})
+        self.state.tokens.append(new_list)
+        return new_list['children'], ''
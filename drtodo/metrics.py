@@ -0,0 +1,182 @@
+"""
+Task counts and operation latencies as a Prometheus/OpenMetrics textfile, e.g. for node_exporter's textfile collector.
+
+Timers around parsing (a file), rendering (an item line) and saving (a file) always run: they only add an observation
+to an in-memory histogram (shared by all threads, under a lock), which costs next to nothing. When the `metrics_file` setting is set, the textfile is
+refreshed after every save (see `backup_command.save_with_backups`) and at the end of every command that observed
+anything, and `todo metrics` refreshes it on demand. It has:
+- `drtodo_tasks{file, section, state}`: gauges of open and done items per file and section, as of the last time each
+  file was saved or counted
+- `drtodo_operation_duration_seconds{operation}`: histograms of parse, render and save durations
+
+Commands are short-lived processes, so histograms and gauges are accumulated in a small JSON state file next to the
+textfile (e.g. `.todo.prom.json` for `todo.prom`, ignored by the collector which only reads `*.prom` files). Both are
+written to a temp file then renamed, so the collector never reads half a file, and updates of the state are serialized
+by a lock file (see `lockfile`), so commands running at the same time don't lose each other's observations.
+
+This module must stay cheap to import: standard library only.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional
+
+from . import lockfile
+
+__all__ = ["BUCKETS", "observe", "pending", "record_file", "render", "section_counts", "timer", "write"]
+
+VERSION = 1
+
+LOCK_TIMEOUT = 10.0
+"""Seconds to wait for the lock of the state file (see `lockfile`)."""
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+"""Upper bounds (in seconds) of the histogram buckets, +Inf is implied."""
+
+_histograms: dict[str, list] = {}
+"""operation -> [bucket counts (not cumulative, the last one is +Inf)..., sum, count] observed in this process"""
+
+_files: dict[str, dict[str, list[int]]] = {}
+"""file -> section -> [open, done] recorded in this process"""
+
+_lock = threading.Lock()
+"""guards _histograms and _files, updated from any thread (e.g. by stores of `api` contexts)"""
+
+
+class _Timer:
+    __slots__ = ("operation", "start")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.operation, time.perf_counter() - self.start)
+        return False
+
+
+def timer(operation: str) -> _Timer:
+    """Returns a context manager observing how long the enclosed code takes as a duration of `operation`."""
+    return _Timer(operation)
+
+
+def observe(operation: str, seconds: float):
+    with _lock:
+        histogram = _histograms.get(operation)
+        if histogram is None:
+            histogram = _histograms[operation] = [0] * (len(BUCKETS) + 1) + [0.0, 0]
+        histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+
+def pending() -> bool:
+    """whether anything was observed or recorded since the last write()"""
+    with _lock:
+        return bool(_histograms or _files)
+
+
+def section_counts(items: Iterable[tuple[str, bool]]) -> dict[str, list[int]]:
+    """returns section -> [open, done] counts of (section, checked) pairs"""
+    counts: dict[str, list[int]] = {}
+    for section, checked in items:
+        counts.setdefault(section, [0, 0])[bool(checked)] += 1
+    return counts
+
+
+def record_file(pathname: Path, counts: dict[str, list[int]]):
+    """records the counts of a todo file (as from section_counts()), replacing those recorded before"""
+    key = str(pathname.resolve())
+    with _lock:
+        _files[key] = counts
+
+
+def _state_path(metrics_file: Path) -> Path:
+    return metrics_file.with_name(f".{metrics_file.name.removeprefix('.')}.json")
+
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding='utf-8')
+    tmp.replace(path)
+
+
+def _take() -> tuple[dict, dict]:
+    """removes and returns what was observed and recorded in this process so far"""
+    with _lock:
+        histograms, files = dict(_histograms), dict(_files)
+        _histograms.clear()
+        _files.clear()
+    return histograms, files
+
+
+def _put_back(histograms: dict, files: dict):
+    """adds back what _take() returned, when it could not be written"""
+    with _lock:
+        for operation, histogram in histograms.items():
+            total = _histograms.get(operation)
+            _histograms[operation] = histogram if total is None else [a + b for a, b in zip(histogram, total)]
+        for file, counts in files.items():
+            _files.setdefault(file, counts)   # counts recorded since are more recent
+
+
+def write(metrics_file: Path):
+    """adds what was observed and recorded in this process to the state of `metrics_file`, and rewrites it"""
+    state_path = _state_path(metrics_file)
+    histograms, files = _take()
+    try:
+        metrics_file.parent.mkdir(parents=True, exist_ok=True)
+        with lockfile.locked(state_path.with_name(f"{state_path.name}.lock"), LOCK_TIMEOUT):
+            try:
+                state = json.loads(state_path.read_text())
+                if state.get('version') != VERSION or state.get('buckets') != list(BUCKETS):
+                    raise ValueError("outdated state")
+            except (OSError, ValueError):
+                state = {'version': VERSION, 'buckets': list(BUCKETS), 'histograms': {}, 'files': {}}
+            for operation, histogram in histograms.items():
+                total = state['histograms'].setdefault(operation, [0] * len(histogram))
+                state['histograms'][operation] = [a + b for a, b in zip(total, histogram)]
+            state['files'].update(files)
+            _write_atomic(state_path, json.dumps(state))
+            _write_atomic(metrics_file, render(state))
+    except Exception:
+        _put_back(histograms, files)
+        raise
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render(state: Optional[dict] = None) -> str:
+    """returns the textfile for a state (default: just what was observed and recorded in this process)"""
+    if state is None:
+        with _lock:
+            state = {'histograms': {k: list(v) for k, v in _histograms.items()}, 'files': dict(_files)}
+    lines = ["# HELP drtodo_tasks Number of todo items per file, section and state.",
+             "# TYPE drtodo_tasks gauge"]
+    for file, sections in sorted(state['files'].items()):
+        for section, counts in sorted(sections.items()):
+            for state_name, value in zip(("open", "done"), counts):
+                lines.append(f'drtodo_tasks{{file="{_label(file)}",section="{_label(section)}",state="{state_name}"}} '
+                             f'{value}')
+    lines += [("# HELP drtodo_operation_duration_seconds Duration of operations: parse and save (a file), render (an "
+               "item line)."),
+              "# TYPE drtodo_operation_duration_seconds histogram"]
+    for operation, histogram in sorted(state['histograms'].items()):
+        name = f'drtodo_operation_duration_seconds_bucket{{operation="{_label(operation)}"'
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, "+Inf"), histogram):
+            cumulative += count
+            lines.append(f'{name},le="{bound}"}} {cumulative}')
+        lines.append(f'drtodo_operation_duration_seconds_sum{{operation="{_label(operation)}"}} {histogram[-2]}')
+        lines.append(f'drtodo_operation_duration_seconds_count{{operation="{_label(operation)}"}} {histogram[-1]}')
+    lines.append("# EOF")
+    return '\n'.join(lines) + '\n'
@@ -1,6 +1,6 @@
 import re
 
-__all__ = ['task_lists', 'split_task_item']
+__all__ = ['split_task_item', 'task_lists']
 
 
 TASK_LIST_ITEM = re.compile(r'^(\[[ xX]\])\s+')
@@ -0,0 +1,230 @@
+"""
+Lightweight per-phase profiling for DrToDo.
+
+Code is instrumented with `span()` context managers around the interesting phases (config discovery, parsing,
+rendering, saving...). When profiling is disabled `span()` returns a shared no-op object, so instrumentation is
+essentially free. When enabled, each span records wall time, CPU time and (optionally) the peak of traced memory
+allocations, and a report is produced at the end of the command. Ex:
+
+```python
+from . import profiling
+
+with profiling.span("parse.mistune"):
+    result, state = self.markdownparser.parse(text)
+```
+
+Profiling is enabled with the global `--profile` option or with the `DRTODO_PROFILE` environment variable. The latter
+is read at import time so phases that run before command line options are processed (like config initialization) are
+also captured.
+"""
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+__all__ = ["FORMATS", "disable", "enable", "enabled", "report", "span"]
+
+FORMATS = ("text", "json", "trace")
+"""Valid report formats: a table printed to stderr, a JSON summary and Chrome trace-event JSON."""
+
+
+class _NullSpan:
+    """Returned by span() when profiling is disabled. Does nothing, as cheaply as possible."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("child_peak", "cpu_start", "name", "profiler", "start")
+
+    def __init__(self, profiler: "Profiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.child_peak = 0
+
+    def __enter__(self):
+        self.profiler._push(self)
+        self.cpu_start = time.process_time_ns()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        cpu_end = time.process_time_ns()
+        self.profiler._pop(self, end, cpu_end)
+        return False
+
+
+class Profiler:
+    """Collects span records. Use the module level functions instead of instantiating this directly."""
+
+    def __init__(self, *, format: str = "text", output: Optional[Path] = None, memory: bool = True):
+        if format not in FORMATS:
+            raise ValueError(f"invalid profile format '{format}', must be one of {', '.join(FORMATS)}")
+        self.format = format
+        self.output = output
+        self.memory = memory
+        self.origin = time.perf_counter_ns()
+        self.records: list[dict] = []
+        self._stack: list[_Span] = []
+        if memory:
+            import tracemalloc
+            # only stopped by disable() if started here: whoever started it may still be tracing
+            self._started_tracemalloc = not tracemalloc.is_tracing()
+            if self._started_tracemalloc:
+                tracemalloc.start()
+            self._tracemalloc = tracemalloc
+
+    def span(self, name: str) -> _Span:
+        return _Span(self, name)
+
+    def _push(self, s: _Span):
+        if self.memory:
+            # peaks are measured per span: remember what we have so far and restart measuring for the new span
+            if self._stack:
+                parent = self._stack[-1]
+                parent.child_peak = max(parent.child_peak, self._tracemalloc.get_traced_memory()[1])
+            self._tracemalloc.reset_peak()
+        self._stack.append(s)
+
+    def _pop(self, s: _Span, end: int, cpu_end: int):
+        assert self._stack and self._stack[-1] is s, "profiling spans must be properly nested"
+        self._stack.pop()
+        peak = 0
+        if self.memory:
+            peak = max(s.child_peak, self._tracemalloc.get_traced_memory()[1])
+            if self._stack:
+                parent = self._stack[-1]
+                parent.child_peak = max(parent.child_peak, peak)
+        self.records.append({
+            'name': s.name,
+            'start_ns': s.start - self.origin,
+            'wall_ns': end - s.start,
+            'cpu_ns': cpu_end - s.cpu_start,
+            'peak_bytes': peak,
+            'depth': len(self._stack),
+        })
+
+    def summary(self) -> dict:
+        """Aggregates records by span name, in order of first appearance."""
+        phases: dict[str, dict] = {}
+        for r in sorted(self.records, key=lambda r: r['start_ns']):
+            p = phases.setdefault(r['name'], {'count': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'peak_kb': 0.0})
+            p['count'] += 1
+            p['wall_ms'] += r['wall_ns'] / 1e6
+            p['cpu_ms'] += r['cpu_ns'] / 1e6
+            p['peak_kb'] = max(p['peak_kb'], r['peak_bytes'] / 1024)
+        return phases
+
+    def trace_events(self) -> dict:
+        """Returns records as Chrome trace-event format (load in chrome://tracing or https://ui.perfetto.dev)."""
+        events = [{
+            'name': r['name'],
+            'cat': r['name'].split('.')[0],
+            'ph': 'X',
+            'ts': r['start_ns'] / 1e3,
+            'dur': r['wall_ns'] / 1e3,
+            'pid': os.getpid(),
+            'tid': 0,
+            'args': {'cpu_ms': r['cpu_ns'] / 1e6, 'peak_kb': r['peak_bytes'] / 1024},
+        } for r in self.records]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def report(self):
+        if self.format == "text":
+            self._print_table()
+            return
+        data = self.trace_events() if self.format == "trace" else {'phases': self.summary(), 'spans': self.records}
+        text = json.dumps(data, indent=2)
+        if self.output:
+            self.output.write_text(text)
+        else:
+            print(text, file=sys.stderr)
+
+    def _print_table(self):
+        from rich.console import Console
+        from rich.table import Table
+
+        table = Table(title="DrToDo profile", title_justify="left")
+        table.add_column("phase")
+        table.add_column("count", justify="right")
+        table.add_column("wall ms", justify="right")
+        table.add_column("cpu ms", justify="right")
+        table.add_column("peak KiB", justify="right")
+        for name, p in self.summary().items():
+            table.add_row(name, str(p['count']), f"{p['wall_ms']:.2f}", f"{p['cpu_ms']:.2f}",
+                          f"{p['peak_kb']:.1f}" if self.memory else "-")
+        if self.output:
+            with self.output.open('w') as f:
+                Console(file=f, width=120).print(table)
+        else:
+            Console(stderr=True).print(table)
+
+
+_profiler: Optional[Profiler] = None
+
+
+def span(name: str):
+    """Returns a context manager that records the enclosed code as the phase `name` (no-op unless enabled)."""
+    if _profiler is None:
+        return _NULL_SPAN
+    return _profiler.span(name)
+
+
+def enabled() -> bool:
+    return _profiler is not None
+
+
+def enable(format: Optional[str] = None, output: Optional[Path] = None, *, memory: bool = True):
+    """
+    Enables profiling (report format defaults to "text"). If already enabled, spans recorded so far are kept and only
+    the report options given are changed.
+    """
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler(format=format or "text", output=output, memory=memory)
+    else:
+        if format is not None:
+            if format not in FORMATS:
+                raise ValueError(f"invalid profile format '{format}', must be one of {', '.join(FORMATS)}")
+            _profiler.format = format
+        _profiler.output = output or _profiler.output
+
+
+def disable():
+    """Disables profiling, discarding anything recorded and not reported yet."""
+    global _profiler
+    if _profiler is not None and _profiler.memory and _profiler._started_tracemalloc:
+        _profiler._tracemalloc.stop()
+    _profiler = None
+
+
+def report():
+    """Produces the report for all spans recorded so far (if enabled) and clears them."""
+    if _profiler is not None:
+        _profiler.report()
+        _profiler.records.clear()
+
+
+def _init_from_environment():
+    # profiling must be enabled before config initialization runs at import time, so we peek at the environment
+    # here. The --profile option is processed by the CLI callback (then config initialization is not captured).
+    value = os.environ.get("DRTODO_PROFILE", "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return
+    format = value if value in FORMATS else "text"
+    output = os.environ.get("DRTODO_PROFILE_OUTPUT")
+    enable(format, Path(output) if output else None)
+
+
+_init_from_environment()
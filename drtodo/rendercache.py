@@ -0,0 +1,66 @@
+"""
+Cache of rendered task item lines, so unchanged items are not rendered through Rich (markdown and all) every time.
+
+Each entry is the final output of one item line, as written to the terminal (escape codes included), keyed by what
+the line is made of: item ID (a hash of its text) and checked state, plus the width of its index. The index itself is
+not part of the entry, which holds a placeholder of the same width instead (see `INDEX_PLACEHOLDER`), so items keep
+their lines when their index changes. Everything else the output depends on (style settings, terminal width and
+capabilities, versions) makes up the fingerprint of the whole cache: when any of it changes, the cache is dropped and
+starts over.
+
+Entries are spread over SHARDS files (see `filecache`) by item ID, loaded the first time an item of the shard is
+printed. At the end of a command only the shards lines were added to are saved, each keeping its most recently used
+lines (MAX_ENTRIES in all).
+"""
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Callable
+
+from . import __version__, filecache
+
+__all__ = ["INDEX_PLACEHOLDER", "MAX_ENTRIES", "SHARDS", "RenderCache"]
+
+MAX_ENTRIES = 5000
+"""Number of rendered lines kept, least recently used ones are evicted first."""
+
+SHARDS = 16
+"""Number of files the lines are spread over."""
+
+INDEX_PLACEHOLDER = ""
+"""Stands for each character of the index in cached lines (a private use character, one cell wide)."""
+
+
+class RenderCache:
+    """Rendered lines for one output context (`fingerprint`), in least recently used order within each shard."""
+
+    def __init__(self, fingerprint: tuple, max_entries: int = MAX_ENTRIES):
+        self.fingerprint = (__version__, *fingerprint)
+        self.max_entries_per_shard = max(1, max_entries // SHARDS)
+        self.shards: dict[int, OrderedDict] = {}
+        self.modified: set[int] = set()
+
+    def _shard(self, number: int) -> OrderedDict:
+        lines = self.shards.get(number)
+        if lines is None:
+            lines = self.shards[number] = filecache.load("render", f"lines-{number}", self.fingerprint) or OrderedDict()
+        return lines
+
+    def get(self, id: str, key: Hashable, render: Callable[[], str]) -> str:
+        """returns the line cached for `key` of the item with ID `id`, or renders (and caches) it"""
+        number = int(id[:4], 16) % SHARDS
+        lines = self._shard(number)
+        line = lines.get(key)
+        if line is not None:
+            lines.move_to_end(key)
+            return line
+        line = lines[key] = render()
+        self.modified.add(number)
+        while len(lines) > self.max_entries_per_shard:
+            lines.popitem(last=False)
+        return line
+
+    def save(self):
+        """saves the shards lines were added to"""
+        for number in sorted(self.modified):
+            filecache.store("render", f"lines-{number}", self.fingerprint, self.shards[number])
+        self.modified.clear()
@@ -0,0 +1,147 @@
+"""
+Full-text search of task items using a persistent inverted index per markdown file.
+
+Each file is indexed once and the index is cached (see `filecache`) until the file changes, so searching does not
+parse any markdown unless a file was modified since the last search. Queries are a list of terms, all of which
+must match (AND):
+- `word`: items containing the word (case insensitive)
+- `pre*`: items containing any word starting with `pre`
+- `"some phrase"`: items containing these words consecutively
+
+Results are ranked by relevance (tf-idf) and then by recency: items further down a list (where `todo add` appends
+them) and in more recently modified files rank higher.
+"""
+import bisect
+import math
+import re
+import shlex
+from pathlib import Path
+from typing import Optional
+
+from . import config, filecache, profiling, taskitems
+
+__all__ = ["build_index", "file_index", "parse_query", "search", "tokenize"]
+
+TOKEN_RE = re.compile(r'\w+')
+
+RECENCY_WEIGHT = 0.1
+"""How much the position of an item in its list adds to its relevance (at most)."""
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.casefold())
+
+
+def build_index(todofile: Path) -> dict:
+    """
+    Parses a markdown file and builds its inverted index:
+    - items: list of items (without tokens) with index, id, checked, text and section
+    - postings: dict of token -> {item position: [token positions in the item]}
+    - vocabulary: sorted list of all tokens, for prefix queries
+    """
+    from .mdparser import TodoListParser
+
+    todo = TodoListParser(config.settings.section)
+    todo.parse(todofile)
+    with profiling.span("search.index"):
+        items = []
+        postings: dict[str, dict[int, list[int]]] = {}
+        for pos, item in enumerate(todo.items):
+            items.append({key: item[key] for key in ('index', 'id', 'checked', 'text', 'section')})
+            for i, token in enumerate(tokenize(item['text'])):
+                postings.setdefault(token, {}).setdefault(pos, []).append(i)
+        return {'items': items, 'postings': postings, 'vocabulary': sorted(postings)}
+
+
+def file_index(todofile: Path) -> dict:
+    """Returns the index for a file, rebuilding it only if the file changed since it was last indexed."""
+    with profiling.span("search.load"):
+        return filecache.cached("search", todofile, lambda: build_index(todofile), config.settings.section)
+
+
+def parse_query(query: str) -> list[tuple[str, list[str]]]:
+    """
+    Parses a query string into a list of (kind, tokens) terms, where kind is 'word', 'prefix' or 'phrase'.
+    Raises ValueError if the query has no searchable terms.
+    """
+    terms = []
+    lexer = shlex.shlex(query, posix=True)
+    lexer.whitespace_split = True
+    lexer.commenters = ''
+    for part in lexer:
+        tokens = tokenize(part)
+        if not tokens:
+            continue
+        if len(tokens) > 1:
+            terms.append(('phrase', tokens))
+        elif part.endswith('*'):
+            terms.append(('prefix', tokens))
+        else:
+            terms.append(('word', tokens))
+    if not terms:
+        raise ValueError(f"nothing to search for in '{query}'")
+    return terms
+
+
+def _match_term(index: dict, kind: str, tokens: list[str]) -> dict[int, int]:
+    """returns {item position: term frequency} for all items matching the term"""
+    postings = index['postings']
+    if kind == 'word':
+        return {pos: len(offsets) for pos, offsets in postings.get(tokens[0], {}).items()}
+    elif kind == 'prefix':
+        matches: dict[int, int] = {}
+        vocabulary = index['vocabulary']
+        for i in range(bisect.bisect_left(vocabulary, tokens[0]), len(vocabulary)):
+            if not vocabulary[i].startswith(tokens[0]):
+                break
+            for pos, offsets in postings[vocabulary[i]].items():
+                matches[pos] = matches.get(pos, 0) + len(offsets)
+        return matches
+    else:
+        # phrase: start from the rarest token, then check the others are at consecutive offsets
+        per_token = [postings.get(token, {}) for token in tokens]
+        matches = {}
+        for pos in min(per_token, key=len):
+            if not all(pos in p for p in per_token):
+                continue
+            starts = set(per_token[0][pos])
+            for shift, p in enumerate(per_token[1:], start=1):
+                starts &= {offset - shift for offset in p[pos]}
+            if starts:
+                matches[pos] = len(starts)
+        return matches
+
+
+def search(query: str, files: list[Path], top: Optional[int] = None) -> list[dict]:
+    """
+    Searches the given markdown files for items matching the query, returning matching items (with a 'file' key)
+    best first. Raises ValueError if the query is not valid.
+    """
+    terms = parse_query(query)
+    scored = []
+    indexes = {}
+    for todofile in files:
+        if not todofile or not todofile.exists():
+            continue
+        index = indexes[todofile] = file_index(todofile)
+        items = index['items']
+        if not items:
+            continue
+        mtime = todofile.stat().st_mtime
+        candidates: Optional[dict[int, float]] = None
+        for kind, tokens in terms:
+            matches = _match_term(index, kind, tokens)
+            # idf is computed per file, which is fine for ranking within and across typical todo files
+            idf = math.log(1 + len(items) / (1 + len(matches)))
+            if candidates is None:
+                candidates = {pos: tf * idf for pos, tf in matches.items()}
+            else:
+                candidates = {pos: score + matches[pos] * idf for pos, score in candidates.items() if pos in matches}
+            if not candidates:
+                break
+        for pos, score in (candidates or {}).items():
+            recency = pos / max(1, len(items) - 1)
+            scored.append((score + RECENCY_WEIGHT * recency, mtime, pos, todofile))
+
+    scored = taskitems.sort_items(scored, key=lambda s: (-s[0], -s[1], -s[2]), top=top)
+    return [dict(indexes[todofile]['items'][pos], file=todofile, score=score) for score, _, pos, todofile in scored]
@@ -0,0 +1,186 @@
+"""
+Sidecar index files for random access to task items.
+
+A small JSON index is kept next to each todo file (e.g. `.TODO.md.idx` for `TODO.md`) and rewritten whenever the
+file is saved by `save_with_backups`. It maps every task item to the byte offset of its `[ ]`/`[x]` marker, along with
+its index, ID, checked state, heading and text, and it also lists all the headings of the file. The index records the
+size, modification time and hash of the file it describes and is ignored if any of them do not match, so a file edited
+by hand just falls back to a full parse.
+
+With a valid index, commands targeting items by ID or index can patch the marker in place without parsing markdown,
+and other commands can list or count items without importing the markdown parser at all.
+
+This module must stay cheap to import: standard library only (plus linescan).
+"""
+import hashlib
+import itertools
+import json
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Optional
+
+from .linescan import TASK_LINE_RE, NotExact, scan_headings, stream_tasks
+
+__all__ = [
+    "PatchedFile",
+    "find_entries",
+    "patch_markers",
+    "read_index",
+    "remove_index",
+    "sidecar_path",
+    "update",
+    "write_index",
+]
+
+VERSION = 3
+
+# positions of values in each item entry of the index (entries are lists to keep the file small)
+OFFSET, LENGTH, CHECKED, INDEX, ID, HEADING, TEXT = range(7)
+
+
+def sidecar_path(pathname: Path) -> Path:
+    # hidden, like backup files: '.TODO.md.idx' for 'TODO.md'
+    return pathname.with_name(f".{pathname.name.removeprefix('.')}.idx")
+
+
+def _file_signature(data: bytes, st: os.stat_result) -> dict:
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': hashlib.sha1(data).hexdigest()}
+
+
+def write_index(pathname: Path, items: Iterable[dict], section: str) -> bool:
+    """
+    Writes the sidecar index for a todo file just saved with the given parsed items (in file order).
+    The task lines are found by the exact line scan (linescan.stream_tasks()), and must be the given items. If the scan
+    can't be exact or finds other items the index is removed instead, so it is never wrong. Returns True if the index
+    was written.
+    """
+    data = pathname.read_bytes()
+    st = pathname.stat()
+    # bytes.splitlines() only splits at \r and \n, so line numbers are those of the byte offsets
+    lines = data.splitlines(keepends=True)
+    line_offsets = list(itertools.accumulate((len(line) for line in lines), initial=0))
+    entries = []
+    try:
+        scanned = list(stream_tasks((line.decode('utf-8', 'replace') for line in lines), section, line_numbers=True))
+    except NotExact:
+        scanned = None
+    items = list(items)
+    if scanned is None or [(i['id'], i['checked']) for i in scanned] != [(i['id'], i['checked']) for i in items]:
+        remove_index(pathname)
+        return False
+    for item in scanned:
+        line = lines[item['line']]
+        m = TASK_LINE_RE.match(line)
+        if m is None:
+            remove_index(pathname)
+            return False
+        entries.append([line_offsets[item['line']] + m.start(2) - 1, len(line), item['checked'], item['index'], item['id'],
+                        item['section'], item['text']])
+
+    index = {'version': VERSION, 'section': section, **_file_signature(data, st), 'items': entries,
+             'headings': scan_headings(data)}
+    return _write_json(pathname, index)
+
+
+def _write_json(pathname: Path, index: dict) -> bool:
+    tmppath = sidecar_path(pathname).with_suffix('.tmp')
+    try:
+        tmppath.write_text(json.dumps(index, separators=(',', ':')))
+        os.replace(tmppath, sidecar_path(pathname))
+    except OSError:
+        remove_index(pathname)
+        return False
+    return True
+
+
+def remove_index(pathname: Path):
+    sidecar_path(pathname).unlink(missing_ok=True)
+
+
+def read_index(pathname: Path, section: str, *, data: Optional[bytes] = None, verify_hash: bool = True) -> Optional[dict]:
+    """
+    Returns the sidecar index of a todo file if it is valid for the file as it is now and for the given section
+    setting, None otherwise. `data` is the file content if already read (needed to verify the hash).
+    """
+    try:
+        index = json.loads(sidecar_path(pathname).read_text())
+        st = pathname.stat()
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != VERSION or index.get('section') != section:
+        return None
+    if index['size'] != st.st_size or index['mtime_ns'] != st.st_mtime_ns:
+        return None
+    if verify_hash:
+        if data is None:
+            data = pathname.read_bytes()
+        if hashlib.sha1(data).hexdigest() != index['sha1']:
+            return None
+    return index
+
+
+def entry_to_item(entry: list) -> dict:
+    """creates an item dict (as created by the parser, but without tokens) from an index entry"""
+    return {'checked': entry[CHECKED], 'text': entry[TEXT], 'id': entry[ID], 'index': entry[INDEX], 'section': entry[HEADING]}
+
+
+def find_entries(index: dict, *, id: Optional[str] = None, index_number: Optional[int] = None) -> list[list]:
+    """returns the index entries for items whose ID starts with `id` or with the given index"""
+    if id is not None:
+        return [e for e in index['items'] if e[ID].startswith(id)]
+    if index_number is not None:
+        return [e for e in index['items'] if e[INDEX] == index_number]
+    return []
+
+
+def patch_markers(data: bytes, entries: list[list], checked: bool) -> Optional[bytes]:
+    """
+    Returns a copy of file `data` with the markers of the given entries set to checked or unchecked, or None if any
+    of the markers is not where the index says it is.
+    """
+    patched = bytearray(data)
+    mark = b'[x]' if checked else b'[ ]'
+    for entry in entries:
+        offset = entry[OFFSET]
+        if patched[offset:offset + 3] not in (b'[ ]', b'[x]', b'[X]'):
+            return None
+        if bool(entry[CHECKED]) != checked:
+            patched[offset:offset + 3] = mark
+    return bytes(patched)
+
+
+class PatchedFile:
+    """
+    Stands in for a TodoListParser in save_with_backups() to save file content patched by patch_markers(), so it gets
+    the same backups. The sidecar index is then updated without scanning the file again.
+    """
+
+    def __init__(self, data: bytes, index: dict, entries: list[list], checked: bool):
+        self.data = data
+        self.index = index
+        self.entries = entries
+        self.checked = checked
+        self.items = [dict(entry_to_item(e), checked=checked) for e in entries]
+
+    def write(self, pathname: Path):
+        pathname.write_bytes(self.data)
+
+    def all_checked(self) -> list[bool]:
+        """checked state of all the items of the file once patched, not just of the patched ones (in `items`)"""
+        patched = {id(entry) for entry in self.entries}
+        return [self.checked if id(entry) in patched else bool(entry[CHECKED]) for entry in self.index['items']]
+
+    def update_index(self, pathname: Path):
+        for entry in self.entries:
+            entry[CHECKED] = self.checked
+        self.index.update(_file_signature(self.data, pathname.stat()))
+        _write_json(pathname, self.index)
+
+
+def update(pathname: Path, todo, section: str):
+    """Updates the sidecar index of a todo file just saved from `todo` (a TodoListParser or a PatchedFile)"""
+    if isinstance(todo, PatchedFile):
+        todo.update_index(pathname)
+    else:
+        write_index(pathname, todo.items, section)
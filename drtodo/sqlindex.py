@@ -0,0 +1,284 @@
+"""
+SQLite mirror of todo files, for very large task collections.
+
+When the `sql_index` setting is on, `list` and `stats` query a SQLite database (`tasks.sqlite3` in the cache folder,
+see `filecache`) instead of parsing markdown. The database mirrors tasks, their metadata and the sections of each
+file, along with the fingerprint of the file they were read from. A file is ingested again (parsed with
+`TodoListParser`) only when its fingerprint changes, so queries over unchanged files parse nothing.
+
+Markdown files stay the source of truth: all changes are made to them as usual (`TodoListParser` and
+`save_with_backups`), which changes their fingerprint, so the mirror catches up on the next query. Ex:
+
+```python
+with SqlIndex.open() as db:
+    db.sync(files)
+    for item in db.select(files, match='bug', sort='priority', limit=20):
+        ...
+```
+"""
+import builtins
+import contextlib
+import sqlite3
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Optional
+
+from . import config, filecache, linescan, profiling, stats, taskitems
+
+__all__ = ["DB_FILENAME", "SqlIndex"]
+
+DB_FILENAME = "tasks.sqlite3"
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    file_id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    section TEXT NOT NULL,      -- section setting the tasks were selected with
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    heading TEXT NOT NULL,      -- e.g. '## TODO'
+    level INTEGER NOT NULL,
+    name TEXT NOT NULL,         -- casefolded heading text, without #s
+    PRIMARY KEY (file_id, position)
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    file_id INTEGER NOT NULL REFERENCES files ON DELETE CASCADE,
+    idx INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    checked INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    folded TEXT NOT NULL,       -- stripped, casefolded text (for sorting)
+    section TEXT NOT NULL,
+    depth INTEGER NOT NULL,
+    span INTEGER NOT NULL,
+    priority INTEGER,
+    owner TEXT,
+    due TEXT,
+    due_date TEXT,              -- ISO date if due is a date (not relative to the current date, like tomorrow)
+    PRIMARY KEY (file_id, idx)
+);
+CREATE INDEX IF NOT EXISTS tasks_id ON tasks (id);
+CREATE INDEX IF NOT EXISTS tasks_checked ON tasks (file_id, checked);
+CREATE INDEX IF NOT EXISTS tasks_priority ON tasks (priority);
+CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (owner);
+CREATE INDEX IF NOT EXISTS tasks_due ON tasks (due_date);
+"""
+
+# ORDER BY terms for each sort key of `list --sort`: (rank, values), ranked so missing values always go last,
+# like taskitems.make_sort_key() does. due_on is the due date as of today (see select())
+SORT_COLUMNS = {
+    'priority': ("priority IS NULL", ("priority",)),
+    'due': ("CASE WHEN due_on IS NOT NULL THEN 0 WHEN due IS NOT NULL THEN 1 ELSE 2 END", ("due_on", "due")),
+    'owner': ("owner IS NULL", ("owner COLLATE NOCASE",)),
+    'status': (None, ("checked",)),
+    'index': (None, ("idx",)),
+    'text': (None, ("folded",)),
+    'id': (None, ("id",)),
+}
+
+ITEM_COLUMNS = "file_id, idx, id, checked, text, section, depth, span"
+
+
+def _due_date(due: Optional[str]) -> Optional[str]:
+    """DUE_DATE(due) in SQL: the ISO date of a due relative to the current date"""
+    due_date = taskitems.parse_due(due)
+    return due_date.isoformat() if due_date else None
+
+
+class SqlIndex:
+    """A connection to the SQLite mirror. Use `SqlIndex.open()` to get one."""
+
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            # the mirror can always be rebuilt from the markdown files
+            with self.connection:
+                for table in ("tasks", "sections", "files"):
+                    self.connection.execute(f"DROP TABLE IF EXISTS {table}")
+                self.connection.executescript(SCHEMA)
+                self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @classmethod
+    @contextlib.contextmanager
+    def open(cls, path: Optional[Path] = None) -> Iterator["SqlIndex"]:
+        """Opens the mirror (in the cache folder by default). Raises OSError if there is no cache folder."""
+        if path is None:
+            folder = filecache.cache_dir()
+            if folder is None:
+                raise OSError("no cache folder for the SQL index, use todo init or set DRTODO_CACHE_DIR")
+            path = folder / DB_FILENAME
+        connection = sqlite3.connect(path)
+        try:
+            yield cls(connection)
+        finally:
+            connection.close()
+
+    # ---- ingestion
+
+    def sync(self, files: list[Path]):
+        """Ingests the files that changed since they were last ingested (or were never ingested)."""
+        for todofile in files:
+            if todofile and todofile.exists():
+                st = todofile.stat()
+                row = self.connection.execute("SELECT section, size, mtime_ns FROM files WHERE path = ?",
+                                              (self._key(todofile),)).fetchone()
+                if row is None or tuple(row) != (config.settings.section, st.st_size, st.st_mtime_ns):
+                    self.ingest(todofile)
+
+    def ingest(self, todofile: Path):
+        """(Re)parses a file and replaces everything the mirror holds for it, in one transaction."""
+        from .mdparser import TodoListParser
+
+        st = todofile.stat()
+        todo = TodoListParser(config.settings.section)
+        items = todo.parse(todofile)
+        headings = linescan.scan_headings(todofile.read_bytes())
+        with profiling.span("sql.ingest"), self.connection:
+            key = self._key(todofile)
+            self.connection.execute("DELETE FROM files WHERE path = ?", (key,))
+            file_id = self.connection.execute("INSERT INTO files (path, section, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                                              (key, config.settings.section, st.st_size, st.st_mtime_ns)).lastrowid
+            self.connection.executemany("INSERT INTO sections VALUES (?, ?, ?, ?, ?)",
+                                        [(file_id, position, heading, *linescan.parse_section(heading))
+                                         for position, heading in enumerate(headings)])
+            rows = []
+            for item in items:
+                meta = taskitems.item_metadata(item)
+                # relative dues (tomorrow, fri...) change meaning every day, they are dated when querying
+                due_date = taskitems.parse_absolute_due(meta['due'])
+                rows.append((file_id, item['index'], item['id'], item['checked'], item['text'],
+                             item['text'].strip().casefold(), item.get('section', ''), item['depth'], item['span'],
+                             meta['priority'], meta['owner'], meta['due'], due_date.isoformat() if due_date else None))
+            self.connection.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    @staticmethod
+    def _key(todofile: Path) -> str:
+        return str(todofile.resolve())
+
+    # ---- queries
+
+    def _file_ids(self, files: list[Path]) -> dict[int, Path]:
+        """returns {file_id: path} for the given (ingested) files, in the given order"""
+        result = {}
+        for todofile in files:
+            if todofile and todofile.exists():
+                row = self.connection.execute("SELECT file_id FROM files WHERE path = ?", (self._key(todofile),)).fetchone()
+                if row is not None:
+                    result[row[0]] = todofile
+        return result
+
+    def _where(self, file_id: int, *, spec=None, id=None, index=None, range=None, match=None, done=None,
+               max_depth=None, omit_means_all=True) -> tuple[str, list]:
+        """SQL conditions for a file equivalent to the selection criteria of taskitems.create_iterator()"""
+        ids = (row[0] for row in self.connection.execute("SELECT id FROM tasks WHERE file_id = ?", (file_id,)))
+        criteria = taskitems.apply_spec(spec, ids=ids, id=id, index=index, range=range, match=match)
+        id, index, range, match = criteria['id'], criteria['index'], criteria['range'], criteria['match']
+        if not omit_means_all and all(x is None for x in (id, index, range, match, done)):
+            raise ValueError('no task selection criteria given')
+
+        conditions = ["file_id = ?"]
+        params: list = [file_id]
+        if done is not None:
+            conditions.append("checked = ?")
+            params.append(done)
+        if id is not None:
+            conditions.append("substr(id, 1, length(?)) = ?")   # a prefix, taken literally (unlike with LIKE)
+            params += [id, id]
+        if index is not None:
+            conditions.append("idx = ?")
+            params.append(index)
+        if range is not None:
+            if isinstance(range, str):
+                range = taskitems.parse_slice(range)
+            count = self.connection.execute("SELECT COUNT(*) FROM tasks WHERE file_id = ?", (file_id,)).fetchone()[0]
+            r = builtins.range(*range.indices(count))
+            if r.step < 0:
+                r = r[::-1]
+            if not r:
+                conditions.append("0")
+            else:
+                conditions.append("idx BETWEEN ? AND ? AND (idx - ?) % ? = 0")
+                params += [r[0], r[-1], r[0], r.step]
+        if match is not None:
+            # all terms in one call, against the precomputed casefolded text when needed (see taskitems.Matcher)
+            self.connection.create_function("MATCHES", 2, match.match_text, deterministic=True)
+            conditions.append("MATCHES(text, folded)")
+        if max_depth is not None:
+            conditions.append("depth <= ?")
+            params.append(max_depth)
+        return " AND ".join(conditions), params
+
+    def select(self, files: list[Path], *, sort: Optional[str] = None, reverse: bool = False,
+               limit: Optional[int] = None, offset: int = 0, **criteria) -> Iterator[dict]:
+        """
+        Returns the items of the given files matching the selection criteria of taskitems.create_iterator(), as
+        item dicts (without tokens, with a 'file' key), sorted across files like `list --sort` (or in file order,
+        reversed per file if `reverse`) and paginated, all in SQL. Raises ValueError if the criteria are not valid.
+        """
+        file_ids = self._file_ids(files)
+        if not file_ids:
+            return iter(())
+        parts, params = [], []
+        self.connection.create_function("DUE_DATE", 1, _due_date)
+        for file_id in file_ids:
+            where, where_params = self._where(file_id, **criteria)
+            parts.append(f"SELECT {ITEM_COLUMNS}, priority, owner, due, COALESCE(due_date, DUE_DATE(due)) AS due_on, "
+                         f"folded FROM tasks WHERE {where}")
+            params += where_params
+
+        file_order = "CASE file_id " + " ".join(f"WHEN {file_id} THEN {n}" for n, file_id in enumerate(file_ids)) + " END"
+        order = []
+        for name, descending in taskitems.parse_sort_spec(sort) if sort else ():
+            rank, values = SORT_COLUMNS[name]
+            if rank:
+                order.append(rank)
+            order += [f"{column}{' DESC' if descending else ''}" for column in values]
+        order += [file_order, "idx DESC" if reverse and not sort else "idx"]
+
+        # a subquery, as the ORDER BY of a compound SELECT can only name its columns
+        query = "SELECT * FROM (" + " UNION ALL ".join(parts) + ") ORDER BY " + ", ".join(order)
+        if limit is not None or offset:
+            query += " LIMIT ? OFFSET ?"
+            params += [-1 if limit is None else limit, offset]
+        with profiling.span("sql.select"):
+            rows = self.connection.execute(query, params)
+        return ({'checked': bool(row['checked']), 'text': row['text'], 'id': row['id'], 'index': row['idx'],
+                 'section': row['section'], 'depth': row['depth'], 'span': row['span'], 'file': file_ids[row['file_id']]}
+                for row in rows)
+
+    def count(self, files: list[Path], **criteria) -> int:
+        """Returns the number of items matching the selection criteria in the given files."""
+        total = 0
+        for file_id in self._file_ids(files):
+            where, params = self._where(file_id, **criteria)
+            total += self.connection.execute(f"SELECT COUNT(*) FROM tasks WHERE {where}", params).fetchone()[0]
+        return total
+
+    def summary(self, todofile: Path) -> dict:
+        """Returns the stats summary (see `stats.summarize`) of a file, aggregated in SQL."""
+        summary = stats.summarize([])
+        file_ids = list(self._file_ids([todofile]))
+        if not file_ids:
+            return summary
+        expressions = {
+            'section': f"CASE WHEN section = '' THEN '{stats.NONE}' ELSE section END",
+            'owner': f"COALESCE(owner, '{stats.NONE}')",
+            'priority': f"COALESCE('P' || priority, '{stats.NONE}')",
+        }
+        for dimension, expression in expressions.items():
+            rows = self.connection.execute(f"SELECT {expression}, SUM(checked = 0), SUM(checked) FROM tasks "
+                                           f"WHERE file_id = ? GROUP BY 1 ORDER BY MIN(idx)", (file_ids[0],))
+            for key, open_count, done_count in rows:
+                summary[dimension][key] = [open_count, done_count]
+                if dimension == 'section':
+                    summary['open'] += open_count
+                    summary['done'] += done_count
+        return summary
@@ -0,0 +1,83 @@
+"""
+Aggregate counts of open and done task items per file, section, owner and priority.
+
+Each file gets a summary of its counts, cached (see `filecache`) until the file changes. Summaries are small and
+simply add up, so stats over many files only cost a stat() per unchanged file. Summaries are computed from the
+sidecar index of the file when it is valid (see `sidecar`), which avoids parsing markdown altogether.
+"""
+from collections.abc import Iterable
+from pathlib import Path
+
+from . import config, filecache, profiling, sidecar, taskitems
+
+__all__ = ["DIMENSIONS", "NONE", "as_json", "combine", "file_summary", "summarize"]
+
+DIMENSIONS = ("section", "owner", "priority")
+"""What counts are broken down by, in each summary."""
+
+NONE = "-"
+"""Key for items without a section, owner or priority."""
+
+
+def _new_summary() -> dict:
+    return {'open': 0, 'done': 0, **{dimension: {} for dimension in DIMENSIONS}}
+
+
+def summarize(items: Iterable[dict]) -> dict:
+    """
+    Returns the summary of task items: a dict with 'open' and 'done' counts, and for each of DIMENSIONS a dict of
+    value -> [open, done] counts.
+    """
+    summary = _new_summary()
+    for item in items:
+        done = bool(item['checked'])
+        summary['done' if done else 'open'] += 1
+        meta = taskitems.item_metadata(item)
+        keys = {
+            'section': item.get('section') or NONE,
+            'owner': meta['owner'] or NONE,
+            'priority': f"P{meta['priority']}" if meta['priority'] is not None else NONE,
+        }
+        for dimension, key in keys.items():
+            summary[dimension].setdefault(key, [0, 0])[done] += 1
+    return summary
+
+
+def _compute_summary(todofile: Path) -> dict:
+    index = sidecar.read_index(todofile, config.settings.section)
+    if index is not None:
+        items = [sidecar.entry_to_item(entry) for entry in index['items']]
+    else:
+        from .mdparser import TodoListParser
+
+        todo = TodoListParser(config.settings.section)
+        todo.parse(todofile)
+        items = todo.items
+    return summarize(items)
+
+
+def file_summary(todofile: Path) -> dict:
+    """Returns the summary of a file, computing it again only if the file changed since it was last summarized."""
+    with profiling.span("stats.summary"):
+        return filecache.cached("stats", todofile, lambda: _compute_summary(todofile), config.settings.section)
+
+
+def combine(summaries: Iterable[dict]) -> dict:
+    """Adds up summaries (e.g. of several files) into a new one."""
+    total = _new_summary()
+    for summary in summaries:
+        total['open'] += summary['open']
+        total['done'] += summary['done']
+        for dimension in DIMENSIONS:
+            for key, (open_count, done_count) in summary[dimension].items():
+                counts = total[dimension].setdefault(key, [0, 0])
+                counts[0] += open_count
+                counts[1] += done_count
+    return total
+
+
+def as_json(summary: dict) -> dict:
+    """Returns a summary in a more self-describing form for JSON output, with {'open': n, 'done': n} counts."""
+    return {'open': summary['open'], 'done': summary['done'],
+            **{dimension: {key: {'open': counts[0], 'done': counts[1]} for key, counts in summary[dimension].items()}
+               for dimension in DIMENSIONS}}
@@ -0,0 +1,325 @@
+"""
+Task level sync of todo lists through a remote (`todo sync`).
+
+A remote keeps, for each list name, an append-only log of changes, each with a sequence number: the remote's version of
+the list is the sequence number of its last change (its ETag). Changes are about single tasks, by ID:
+- `{"op": "add", "id", "text", "checked", "after"}`: a task was added, after the task with ID `after` (None: first)
+- `{"op": "check", "id", "checked"}`: a task was marked done or not done
+- `{"op": "remove", "id"}`: a task was removed (a task whose text changed was removed and added)
+
+Next to each todo file a small state file (e.g. `.TODO.md.sync`) records the sequence number it was last synced at and
+a snapshot of its tasks then (ID and checked state), in the section set then: syncing with another section setting is
+an error. A sync:
+1. works out the local changes since the last sync, by comparing the tasks with the snapshot
+2. pulls the remote changes since the recorded sequence number, and applies them, except to tasks also changed
+   locally: conflicts are resolved per task, the local change wins (and a task changed locally but removed remotely
+   is added back)
+3. pushes the local changes, if the remote is still at the version pulled (or starts over, see MAX_ATTEMPTS)
+4. saves the file, and the new state
+
+Only changes go over the wire, however long the lists. New tasks go after the task they followed when they were added
+(as a sibling: nesting is only kept for tasks added in the same list).
+
+Remotes are a folder (`FolderRemote`, shared via a network file system or synced by other means) or an HTTP server
+(`HttpRemote`), like the reference server in `syncserver`, which stores logs in a folder too.
+
+This module must stay cheap to import: standard library only (the store is passed in).
+"""
+import json
+import re
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from . import lockfile
+
+if TYPE_CHECKING:
+    from .api import TodoStore
+
+__all__ = [
+    "NAME_RE",
+    "FolderRemote",
+    "HttpRemote",
+    "SyncConflict",
+    "SyncError",
+    "SyncResult",
+    "open_remote",
+    "state_path",
+    "sync",
+]
+
+VERSION = 1
+
+MAX_ATTEMPTS = 3
+"""Number of times a sync is tried when other machines push changes at the same time."""
+
+NAME_RE = re.compile(r'^[A-Za-z0-9._-]+$')
+"""Valid list names on a remote."""
+
+
+class SyncError(Exception):
+    """The remote could not be used (bad response, invalid list name...)."""
+
+
+class SyncConflict(SyncError):
+    """The remote list changed since it was pulled (its ETag does not match)."""
+
+
+class FolderRemote:
+    """
+    Change logs in a folder: `<name>.jsonl` has one change per line, `<name>.seq` the sequence number of the last one.
+    Pushes are serialized by a lock file (see `lockfile`).
+    """
+
+    LOCK_TIMEOUT = 10.0
+    """Seconds to wait for the lock of a list."""
+
+    def __init__(self, folder: Path):
+        self.folder = folder
+
+    def __repr__(self) -> str:
+        return f"FolderRemote({str(self.folder)!r})"
+
+    def _path(self, name: str, suffix: str) -> Path:
+        if not NAME_RE.match(name):
+            raise SyncError(f"invalid list name '{name}'")
+        return self.folder / f"{name}{suffix}"
+
+    def seq(self, name: str) -> int:
+        """returns the sequence number of the last change of a list (0 for a list without changes)"""
+        try:
+            return int(self._path(name, ".seq").read_text())
+        except FileNotFoundError:
+            return 0
+
+    def pull(self, name: str, since: int) -> tuple[int, list[dict]]:
+        """returns the sequence number of the list and its changes after `since`"""
+        seq = self.seq(name)
+        if seq <= since:
+            return seq, []
+        changes = []
+        with self._path(name, ".jsonl").open(encoding='utf-8') as f:
+            for line in f:
+                change = json.loads(line)
+                if since < change['seq'] <= seq:
+                    changes.append(change)
+        return seq, changes
+
+    def push(self, name: str, expected_seq: int, changes: list[dict]) -> int:
+        """
+        appends changes to a list if it is still at sequence number `expected_seq` (raises SyncConflict otherwise),
+        returns the new sequence number
+        """
+        lock = self._path(name, ".lock")
+        self.folder.mkdir(parents=True, exist_ok=True)
+        try:
+            with lockfile.locked(lock, self.LOCK_TIMEOUT):
+                seq = self.seq(name)
+                if seq != expected_seq:
+                    raise SyncConflict(f"list '{name}' changed (version {seq}, expected {expected_seq})")
+                with self._path(name, ".jsonl").open('a', encoding='utf-8') as f:
+                    for change in changes:
+                        seq += 1
+                        f.write(json.dumps({**change, 'seq': seq}) + '\n')
+                # the log is written first: a crash in between leaves changes that are never pulled, rather than a
+                # sequence number without its changes
+                seq_path = self._path(name, ".seq")
+                tmp = seq_path.with_name(f".{seq_path.name}.tmp")
+                tmp.write_text(str(seq))
+                tmp.replace(seq_path)
+                return seq
+        except TimeoutError as e:
+            raise SyncError(str(e)) from None
+
+
+class HttpRemote:
+    """
+    A sync server (see `syncserver`): `GET <url>/lists/<name>?since=N` returns `{"seq", "changes"}` with the
+    sequence number as ETag, and `POST <url>/lists/<name>` with `{"changes"}` and an `If-Match` header appends them
+    (412 if the ETag does not match).
+    """
+
+    TIMEOUT = 30.0
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+
+    def __repr__(self) -> str:
+        return f"HttpRemote({self.url!r})"
+
+    def _list_url(self, name: str) -> str:
+        if not NAME_RE.match(name):
+            raise SyncError(f"invalid list name '{name}'")
+        return f"{self.url}/lists/{urllib.parse.quote(name)}"
+
+    def _request(self, request: urllib.request.Request) -> dict:
+        try:
+            with urllib.request.urlopen(request, timeout=self.TIMEOUT) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            if e.code == 412:
+                raise SyncConflict(f"list changed on {self.url}")
+            raise SyncError(f"{self.url}: {e.code} {e.reason}")
+        except ValueError as e:
+            raise SyncError(f"{self.url}: invalid response ({e})")
+
+    def pull(self, name: str, since: int) -> tuple[int, list[dict]]:
+        data = self._request(urllib.request.Request(f"{self._list_url(name)}?since={since}"))
+        return data['seq'], data['changes']
+
+    def push(self, name: str, expected_seq: int, changes: list[dict]) -> int:
+        request = urllib.request.Request(self._list_url(name), data=json.dumps({'changes': changes}).encode('utf-8'),
+                                         headers={'Content-Type': 'application/json', 'If-Match': f'"{expected_seq}"'},
+                                         method='POST')
+        return self._request(request)['seq']
+
+
+def open_remote(spec: str):
+    """returns the remote for an http(s) URL or a folder"""
+    if spec.startswith(("http://", "https://")):
+        return HttpRemote(spec)
+    return FolderRemote(Path(spec).expanduser())
+
+
+def state_path(todofile: Path) -> Path:
+    # hidden, like backup files and sidecar indexes: '.TODO.md.sync' for 'TODO.md'
+    return todofile.with_name(f".{todofile.name.removeprefix('.')}.sync")
+
+
+def _load_state(todofile: Path, remote, name: str, section: str) -> dict:
+    try:
+        state = json.loads(state_path(todofile).read_text())
+    except (OSError, ValueError):
+        state = None
+    if state and state.get('version') == VERSION and state.get('remote') == repr(remote) and state.get('name') == name:
+        # the tasks of other sections are not in the snapshot, or would be seen as removed
+        if state.get('section') != section:
+            raise SyncError(f"last synced with section '{state.get('section')}', not '{section}'")
+        return state
+    # never synced with this remote: all tasks are new
+    return {'version': VERSION, 'remote': repr(remote), 'name': name, 'section': section, 'seq': 0, 'tasks': {}}
+
+
+def _add_change(item: dict, previous: Optional[dict]) -> dict:
+    return {'op': 'add', 'id': item['id'], 'text': item['text'].strip(), 'checked': item['checked'],
+            'after': previous['id'] if previous else None}
+
+
+def snapshot(items: list[dict]) -> dict[str, bool]:
+    """returns the ID -> checked state of items, for the first item with each ID"""
+    tasks: dict[str, bool] = {}
+    for item in items:
+        tasks.setdefault(item['id'], item['checked'])
+    return tasks
+
+
+def local_changes(snapshot: dict[str, bool], items: list[dict]) -> list[dict]:
+    """
+    returns the changes that turn a snapshot (ID -> checked, see `snapshot()`) into the current items, of which only
+    the first one with a given ID (same text) is synced
+    """
+    changes = []
+    current = set()
+    previous = None
+    for item in items:
+        if item['id'] in current:
+            continue
+        current.add(item['id'])
+        checked = snapshot.get(item['id'])
+        if checked is None:
+            changes.append(_add_change(item, previous))
+        elif checked != item['checked']:
+            changes.append({'op': 'check', 'id': item['id'], 'checked': item['checked']})
+        previous = item
+    changes += [{'op': 'remove', 'id': id} for id in snapshot if id not in current]
+    return changes
+
+
+def _apply(store: "TodoStore", by_id: dict[str, dict], change: dict) -> bool:
+    """applies a remote change to the store (and `by_id`, its items by ID), returns False if it changed nothing"""
+    item = by_id.get(change['id'])
+    if change['op'] == 'add':
+        if item is not None:
+            return False   # added on both sides
+        item = store.add(change['text'], checked=change['checked'], after=by_id.get(change.get('after')))
+        if change.get('after') is None and store.items[0] is not item:
+            store.move_to([item], 0)   # added first (add() appends)
+        by_id[item['id']] = item
+    elif item is None:
+        return False   # changed remotely, but not here anymore
+    elif change['op'] == 'check':
+        if item['checked'] == change['checked']:
+            return False
+        store.mark(change['checked'], [item])
+    elif change['op'] == 'remove':
+        for removed in store.remove([item], recursive=True):
+            by_id.pop(removed['id'], None)
+    else:
+        raise SyncError(f"unknown change {change['op']!r}")
+    return True
+
+
+@dataclass
+class SyncResult:
+    pulled: int = 0
+    """remote changes applied to the local list"""
+    pushed: int = 0
+    """local changes sent to the remote"""
+    conflicts: list[str] = field(default_factory=list)
+    """IDs of tasks changed on both sides (where the local change won)"""
+    seq: int = 0
+    """version of the remote list the local list is now in sync with"""
+
+
+def sync(store: "TodoStore", remote, name: str) -> SyncResult:
+    """
+    Syncs a todo list with list `name` on the remote, saving it if anything changed. Raises SyncError (or OSError for
+    network and file errors) if the sync can't be done, then nothing is changed locally.
+    """
+    attempt = 1
+    while True:
+        state = _load_state(store.path, remote, name, store.context.settings.section)
+        items = store.load()
+        changes = local_changes(state['tasks'], items)
+        seq, remote_changes = remote.pull(name, state['seq'])
+
+        result = SyncResult(seq=seq)
+        changed = {change['id']: change for change in changes}
+        by_id: dict[str, dict] = {}
+        for item in items:
+            by_id.setdefault(item['id'], item)
+        for change in remote_changes:
+            local = changed.get(change['id'])
+            if local is None:
+                result.pulled += _apply(store, by_id, change)
+                continue
+            if local['op'] != change['op'] or local.get('checked') != change.get('checked'):
+                result.conflicts.append(change['id'])
+            if change['op'] == 'remove' and local['op'] == 'check':
+                local.clear()
+                if change['id'] in by_id:
+                    # the task is still here (unless removed with its parent task), it must be added back everywhere
+                    synced = [item for item in store.items if by_id.get(item['id']) is item]
+                    i = next(i for i, item in enumerate(synced) if item['id'] == change['id'])
+                    local.update(_add_change(synced[i], synced[i - 1] if i else None))
+
+        changes = [change for change in changes if change]
+        if changes:
+            try:
+                result.seq = remote.push(name, seq, changes)
+            except SyncConflict:
+                if attempt == MAX_ATTEMPTS:
+                    raise
+                attempt += 1
+                continue   # someone pushed in between: start over from the file
+            result.pushed = len(changes)
+        store.save()
+        state.update(seq=result.seq, tasks=snapshot(store.items))
+        path = state_path(store.path)
+        tmp = path.with_name(f"{path.name}.tmp")
+        tmp.write_text(json.dumps(state))
+        tmp.replace(path)
+        return result
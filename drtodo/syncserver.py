@@ -0,0 +1,122 @@
+"""
+Reference sync server for `todo sync` (`todo sync-server DIR`): change logs kept in a folder (see `sync.FolderRemote`),
+over HTTP.
+
+- `GET /lists/<name>?since=N` returns `{"seq", "changes"}`: the list version (also as ETag) and its changes after N.
+  304 if the `If-None-Match` header has the current version.
+- `POST /lists/<name>` with `{"changes": [...]}` appends changes if the `If-Match` header has the current version
+  (412 if it doesn't, 428 without it), and returns `{"seq"}`, the new version.
+
+It has no authentication: run it on a trusted network, or behind a proxy that handles it.
+
+This module must stay cheap to import: standard library only.
+"""
+import json
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+
+from .sync import NAME_RE, FolderRemote, SyncConflict, SyncError
+
+__all__ = ["SyncRequestHandler", "make_server", "serve"]
+
+MAX_BODY = 10 * 1024 * 1024
+"""Largest request body accepted, in bytes."""
+
+OPS = ("add", "check", "remove")
+
+
+class SyncRequestHandler(BaseHTTPRequestHandler):
+    remote: FolderRemote
+    """set on the subclass made by make_server()"""
+
+    server_version = "drtodo-sync"
+
+    def _send(self, status: int, data: Optional[dict] = None, seq: Optional[int] = None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        self.send_response(status)
+        if seq is not None:
+            self.send_header('ETag', f'"{seq}"')
+        if data is not None:
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status: int, message: str):
+        self._send(status, {'error': message})
+
+    def _list_name(self, url: urllib.parse.SplitResult) -> Optional[str]:
+        prefix, _, name = url.path.rpartition('/')
+        name = urllib.parse.unquote(name)
+        if prefix != '/lists' or not NAME_RE.match(name):
+            self._error(404, "not found")
+            return None
+        return name
+
+    def do_GET(self):
+        url = urllib.parse.urlsplit(self.path)
+        name = self._list_name(url)
+        if name is None:
+            return
+        try:
+            since = int(urllib.parse.parse_qs(url.query).get('since', ['0'])[0])
+        except ValueError:
+            return self._error(400, "invalid 'since'")
+        seq = self.remote.seq(name)
+        if self.headers.get('If-None-Match') == f'"{seq}"':
+            return self._send(304, seq=seq)
+        seq, changes = self.remote.pull(name, since)
+        self._send(200, {'seq': seq, 'changes': changes}, seq)
+
+    def do_POST(self):
+        name = self._list_name(urllib.parse.urlsplit(self.path))
+        if name is None:
+            return
+        if_match = self.headers.get('If-Match')
+        if if_match is None:
+            return self._error(428, "If-Match header required")
+        try:
+            expected_seq = int(if_match.strip('"'))
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            return self._error(400, "invalid header")
+        if length > MAX_BODY:
+            return self._error(413, "too many changes")
+        try:
+            changes = json.loads(self.rfile.read(length))['changes']
+            if not isinstance(changes, list) or not all(isinstance(change, dict) and change.get('op') in OPS and
+                                                        isinstance(change.get('id'), str) for change in changes):
+                raise ValueError("invalid changes")
+        except (ValueError, KeyError, TypeError) as e:
+            return self._error(400, f"invalid body ({e})")
+        try:
+            seq = self.remote.push(name, expected_seq, changes)
+        except SyncConflict as e:
+            return self._send(412, {'error': str(e)}, self.remote.seq(name))
+        except SyncError as e:
+            return self._error(503, str(e))
+        self._send(200, {'seq': seq}, seq)
+
+
+def make_server(folder: Path, host: str = "127.0.0.1", port: int = 8765) -> ThreadingHTTPServer:
+    """returns a server (not started) for the change logs in `folder`, port 0 picks a free port"""
+    folder.mkdir(parents=True, exist_ok=True)
+    handler = type("Handler", (SyncRequestHandler,), {'remote': FolderRemote(folder)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve(folder: Path, host: str = "127.0.0.1", port: int = 8765):
+    """serves the change logs in `folder` until interrupted"""
+    with make_server(folder, host, port) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    import sys
+
+    serve(Path(sys.argv[1] if len(sys.argv) > 1 else "."))
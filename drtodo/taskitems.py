@@ -1,5 +1,18 @@
+import datetime
+import functools
+import heapq
+import itertools
 import re
-from typing import Generator, Optional, Union
+from collections.abc import Generator, Iterable, Sequence
+from typing import Any, Callable, Optional, Union
+
+# metadata conventions used by `todo add`: "P1 @owner due:2023-05-01 description"
+PRIORITY_RE = re.compile(r'(?:^|\s)[Pp](\d+)(?=\s|$)')
+OWNER_RE = re.compile(r'(?:^|\s)@(\S+)')
+DUE_RE = re.compile(r'(?:^|\s)due:(\S+)')
+HEX_RE = re.compile(r'^[0-9a-f]+$')
+
+SORT_KEYS = ('priority', 'due', 'owner', 'status', 'index', 'text', 'id')
 
 
 def parse_slice(s: str) -> slice:
@@ -12,14 +25,142 @@ def parse_slice(s: str) -> slice:
     return slice(*map(lambda x: int(x.strip()) if x.strip() else None, split))
 
 
+def parse_spec(spec: str, ids: Optional[Iterable[str]] = None) -> dict:
+    """
+    interprets a spec given as a command argument, returns a dict with a single key, one of 'range', 'index',
+    'id' or 'match', according to these heuristics:
+    - if spec has a single : in it, assume it's a range
+    - if spec is a small integer, assume it's a positive index
+    - if spec is a a pure hex string assume it's an ID, but if the IDs of the items are given (`ids`) only if one of
+      them starts with it, so words like 'add' or 'face' still match text
+    - otherwise assume it's a regular expression
+    """
+    try:
+        return {'range': parse_slice(spec)}
+    except ValueError:
+        pass
+    try:
+        index = int(spec)
+        if 0 <= index < 1000:
+            return {'index': index}
+    except ValueError:
+        pass
+    if HEX_RE.match(spec) and (ids is None or any(id.startswith(spec) for id in ids)):
+        return {'id': spec}
+    return {'match': spec}
+
+
+class Matcher:
+    """
+    Matches task text against any number of terms at once, all of them (default) or any of them. Terms are regular
+    expressions, or literal strings if `fixed`, and can be matched case-insensitively (`ignore_case`) and as whole
+    words only (`word`).
+
+    All terms are compiled into a single regular expression, so each item is matched in one call however many terms
+    there are. Literal terms are matched case-insensitively against the casefolded text of items, which is computed
+    once per item (see item_folded()). A Matcher without terms matches everything and is false.
+    """
+
+    def __init__(self, terms: Iterable[str] = (), *, any: bool = False, fixed: bool = False,
+                 ignore_case: bool = False, word: bool = False):
+        self.terms = [terms] if isinstance(terms, str) else list(terms)
+        self.any = any
+        self.fixed = fixed
+        self.ignore_case = ignore_case
+        self.word = word
+        # literal terms are casefolded like the text, regular expressions can't be (e.g. \S would become \s)
+        self.folded = fixed and ignore_case
+        patterns = []
+        for term in self.terms:
+            pattern = re.escape(term.casefold() if self.folded else term) if fixed else term
+            if word:
+                pattern = rf'(?<!\w)(?:{pattern})(?!\w)'
+            patterns.append(pattern)
+        if len(patterns) == 1:
+            pattern = patterns[0]
+        elif any:
+            pattern = '|'.join(f'(?:{p})' for p in patterns)
+        else:
+            # one lookahead per term, all from the start of the text
+            pattern = r'\A' + ''.join(rf'(?=[\s\S]*?(?:{p}))' for p in patterns)
+        try:
+            self.regex = re.compile(pattern, re.IGNORECASE if ignore_case and not fixed else 0)
+        except re.error as e:
+            term = ', '.join(self.terms)
+            raise ValueError(f"invalid regular expression '{term}': {e}")
+
+    def __bool__(self) -> bool:
+        return bool(self.terms)
+
+    def extend(self, terms: Iterable[str]) -> 'Matcher':
+        """returns a new Matcher with more terms and the same options"""
+        return Matcher(self.terms + list(terms), any=self.any, fixed=self.fixed,
+                       ignore_case=self.ignore_case, word=self.word)
+
+    def match_text(self, text: str, folded: Optional[str] = None) -> bool:
+        """matches a text, or its casefolded version if given and needed"""
+        if self.folded:
+            text = folded if folded is not None else text.strip().casefold()
+        return self.regex.search(text) is not None
+
+    def __call__(self, item: dict) -> bool:
+        """matches a task item"""
+        return self.regex.search(item_folded(item) if self.folded else item['text']) is not None
+
+
+def item_folded(item: dict) -> str:
+    """returns the stripped and casefolded text of a task item, computing it only once"""
+    folded = item.get('folded')
+    if folded is None:
+        folded = item['folded'] = item['text'].strip().casefold()
+    return folded
+
+
+def normalize_text(text: str) -> str:
+    """
+    returns what makes two task texts the same task: the text without metadata (priority, owner and due date, see
+    parse_metadata()), with whitespace collapsed and casefolded
+    """
+    for regex in (PRIORITY_RE, OWNER_RE, DUE_RE):
+        text = regex.sub(' ', text)
+    return ' '.join(text.split()).casefold()
+
+
+def item_normalized(item: dict) -> str:
+    """returns the normalized text of a task item (see normalize_text()), computing it only once"""
+    normalized = item.get('normalized')
+    if normalized is None:
+        normalized = item['normalized'] = normalize_text(item['text'])
+    return normalized
+
+
+def apply_spec(spec: Optional[str], *, ids: Optional[Iterable[str]] = None, id: Optional[str] = None,
+               index: Optional[int] = None, range=None, match: Optional[Union[str, Iterable[str], Matcher]] = None) -> dict:
+    """
+    merges a spec (see parse_spec()) into the other selection criteria, returns a dict with 'id', 'index', 'range'
+    and 'match' keys. 'match' is a Matcher (with the spec as one more term if it is a regular expression) or None.
+    """
+    if match is not None and not isinstance(match, Matcher):
+        match = Matcher(match)
+    if spec is not None:
+        criteria = parse_spec(spec, ids)
+        range = criteria.get('range', range)
+        index = criteria.get('index', index)
+        id = criteria.get('id', id)
+        if 'match' in criteria:
+            match = match.extend([criteria['match']]) if match is not None else Matcher(criteria['match'])
+    return {'id': id, 'index': index, 'range': range, 'match': match if match else None}
+
+
 # iterator to traverse tasks that match a spec, id, index or re match (or all)
 def create_iterator(items: list, *,
                     spec: Optional[str] = None,
                     id: Optional[str] = None,
                     index: Optional[int] = None,
                     range: Optional[Union[str, slice, range]] = None,
-                    match: Optional[str] = None,
+                    match: Optional[Union[str, Iterable[str], Matcher]] = None,
                     done: Optional[bool] = None,
+                    max_depth: Optional[int] = None,
                     omit_means_all: bool = False
 ) -> Generator:
     """
@@ -28,9 +169,11 @@ def create_iterator(items: list, *,
     - id: a task ID (partial hexadecimal hash)
     - index: a task index
     - range: a range of task indexes (e.g. 1:3, can use negative indexes from end as well)
-    - match: a regular expression to match against the task text
+    - match: a regular expression to match against the task text, several of them (all must match) or a Matcher
     - done: whether to match only done tasks or only tasks not done
-    use as follows:
+    - max_depth: collapses subtrees, skipping (without visiting) subtasks deeper than this (0 means top level only)
+    items must be all the items of a list, in order (as parsed). It can be any iterable, e.g. a lazy stream of items,
+    unless range or max_depth are used. Use as follows:
 
     ```python
     for item in create_iterator(items, spec='1:3'):
@@ -49,26 +192,12 @@ def create_iterator(items: list, *,
             ...
     ```
     """
-    if spec is not None:
-        # heuristics:
-        # if spec has a single : in it, assume it's a range
-        # if spec is a small integer, assume it's a positive index
-        # if spec is a a pure hex string assume it's an ID
-        # otherwise assume it's a regular expression
-        try:
-            range = parse_slice(spec)
-        except ValueError:
-            try:
-                index = int(spec)
-                if index < 0 or index >= 1000:
-                    raise ValueError
-            except ValueError:
-                if re.match(r'^[0-9a-f]+$', spec):
-                    id = spec
-                else:
-                    match = spec
-
-    if not omit_means_all and sum([spec is not None, id is not None, index is not None,
+    # hex specs are only IDs if an item has such an ID, which needs a list (a stream can't be read twice)
+    ids = (item['id'] for item in items) if isinstance(items, Sequence) else None
+    criteria = apply_spec(spec, ids=ids, id=id, index=index, range=range, match=match)
+    id, index, range, match = criteria['id'], criteria['index'], criteria['range'], criteria['match']
+
+    if not omit_means_all and sum([id is not None, index is not None,
                                    range is not None, match is not None, done is not None]) == 0:
         raise ValueError('no task selection criteria given')
 
@@ -79,8 +208,19 @@ def create_iterator(items: list, *,
         import builtins
         range = builtins.range(*range.indices(len(items)))
 
+    def visit():
+        if max_depth is None:
+            yield from items
+            return
+        i = 0
+        while i < len(items):
+            item = items[i]
+            yield item
+            # items are in pre-order: the subtree of a collapsed item is the next 'span' items, we jump over it
+            i += item.get('span', 1) if item.get('depth', 0) >= max_depth else 1
+
     def wrapped():
-        for item in items:
+        for item in visit():
             if done is not None and item['checked'] != done:
                 continue
             elif id is not None and not item['id'].startswith(id):
@@ -89,8 +229,186 @@ def create_iterator(items: list, *,
                 continue
             elif range is not None and item['index'] not in range:
                 continue
-            elif match is not None and not re.search(match, item['text']):
+            elif match is not None and not match(item):
                 continue
             yield item
 
     return wrapped()
+
+
+def with_subtrees(items: Iterable[dict]) -> Generator:
+    """
+    yields each of the given items followed by all of its subtasks (depth first, in file order), each item only once.
+    Only the subtrees are visited, not the whole list.
+    """
+    seen = set()
+    for item in items:
+        stack = [item]
+        while stack:
+            current = stack.pop()
+            if id(current) in seen:
+                continue
+            seen.add(id(current))
+            yield current
+            stack.extend(reversed(current.get('subtasks', ())))
+
+
+def parse_metadata(text: str) -> dict:
+    """
+    parses the metadata conventions written by `todo add` out of a task text:
+    - priority: P1, P2, etc. (lower number is more urgent)
+    - owner: @userid
+    - due: due:DATE (kept verbatim, see parse_due())
+    returns a dict with 'priority' (int), 'owner' (str) and 'due' (str) keys, any of them None if not found.
+    """
+    priority = PRIORITY_RE.search(text)
+    owner = OWNER_RE.search(text)
+    due = DUE_RE.search(text)
+    return {
+        'priority': int(priority.group(1)) if priority else None,
+        'owner': owner.group(1) if owner else None,
+        'due': due.group(1) if due else None,
+    }
+
+
+def item_metadata(item: dict) -> dict:
+    """returns the metadata for a task item, parsing it only once"""
+    meta = item.get('meta')
+    if meta is None:
+        meta = item['meta'] = parse_metadata(item['text'])
+    return meta
+
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+RELATIVE_DUE_RE = re.compile(r'^\+?(\d+)([dw])$')
+ISO_DATETIME_RE = re.compile(r'^\d{4}-\d\d-\d\d[t ]')
+DUE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y%m%d', '%d%b%Y', '%d%B%Y', '%b%d%Y', '%B%d%Y')
+
+
+def parse_due(due: Optional[str], today: Optional[datetime.date] = None) -> Optional[datetime.date]:
+    """
+    parses a due string into a date if possible, returns None otherwise. Accepted formats:
+    - dates: 2023-05-01 (also with a time, e.g. 2023-05-01T17:00), 2023/05/01, 2023.05.01, 20230501, 1May2023
+    - relative to `today` (defaults to the current date): today, tomorrow, yesterday, weekday names (next one, e.g.
+      fri or friday), +3d or 3d (days), +2w or 2w (weeks)
+    Results are memoized per distinct string (and date), as the same due strings tend to be parsed over and over.
+    """
+    if not due:
+        return None
+    return _parse_due(due.strip().casefold(), today or datetime.date.today())
+
+
+def parse_absolute_due(due: Optional[str]) -> Optional[datetime.date]:
+    """parses a due string like parse_due(), but only dates: None for dues relative to the current date"""
+    if not due:
+        return None
+    return _parse_due(due.strip().casefold(), None)
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_due(due: str, today: Optional[datetime.date]) -> Optional[datetime.date]:
+    if today is not None:
+        if due in ('today', 'tod'):
+            return today
+        if due in ('tomorrow', 'tom'):
+            return today + datetime.timedelta(days=1)
+        if due == 'yesterday':
+            return today - datetime.timedelta(days=1)
+        for weekday, name in enumerate(WEEKDAYS):
+            if len(due) >= 3 and name.startswith(due):
+                return today + datetime.timedelta(days=(weekday - today.weekday()) % 7 or 7)
+        m = RELATIVE_DUE_RE.match(due)
+        if m:
+            return today + datetime.timedelta(days=int(m.group(1)) * (7 if m.group(2) == 'w' else 1))
+    if ISO_DATETIME_RE.match(due):
+        due = due[:10]   # drop the time of ISO datetimes
+    for fmt in DUE_FORMATS:
+        try:
+            return datetime.datetime.strptime(due, fmt).date()
+        except ValueError:
+            pass
+    return None
+
+
+@functools.total_ordering
+class _Reversed:
+    """wraps a value to invert its ordering, for descending sort keys of any type (strings included)"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _sort_value(item: dict, key: str) -> tuple[int, Any]:
+    # returns (rank, value): rank orders the kind of value so missing values always go last and values of
+    # different types are never compared with each other
+    if key == 'priority':
+        priority = item_metadata(item)['priority']
+        return (0, priority) if priority is not None else (2, 0)
+    elif key == 'due':
+        due = item_metadata(item)['due']
+        date = parse_due(due)
+        if date is not None:
+            return (0, date.toordinal())
+        return (1, due) if due else (2, '')
+    elif key == 'owner':
+        owner = item_metadata(item)['owner']
+        return (0, owner.casefold()) if owner else (2, '')
+    elif key == 'status':
+        return (0, item['checked'])   # not done first
+    elif key == 'text':
+        return (0, item['text'].strip().casefold())
+    else:
+        return (0, item[key])
+
+
+def parse_sort_spec(spec: str) -> list[tuple[str, bool]]:
+    """
+    parses a comma separated list of sort keys, each optionally prefixed with '-' for descending order,
+    e.g. 'priority,due,-index', into a list of (key, descending) tuples. Valid keys are in SORT_KEYS.
+    """
+    fields = []
+    for part in spec.split(','):
+        part = part.strip()
+        descending = part.startswith('-')
+        name = part.lstrip('+-').strip().lower()
+        if name not in SORT_KEYS:
+            raise ValueError(f"invalid sort key '{part}', must be one of {', '.join(SORT_KEYS)}")
+        fields.append((name, descending))
+    return fields
+
+
+def make_sort_key(spec: str) -> Callable[[dict], tuple]:
+    """
+    creates a sort key function for task items from a sort spec (see parse_sort_spec()).
+    Items missing a key (e.g. no due date) always sort after items that have it.
+    """
+    fields = parse_sort_spec(spec)
+
+    def key(item: dict) -> tuple:
+        result = []
+        for name, descending in fields:
+            rank, value = _sort_value(item, name)
+            result.append((rank, _Reversed(value) if descending else value))
+        return tuple(result)
+
+    return key
+
+
+def sort_items(items: Iterable[dict], key: Optional[Callable[[dict], Any]] = None, top: Optional[int] = None) -> Iterable[dict]:
+    """
+    returns items sorted by key (if given) and limited to the first `top` items (if given).
+    Selecting the top items uses a bounded heap so only `top` items are ever kept sorted, and without a key
+    items are lazily passed through in their original order.
+    """
+    if key is None:
+        return itertools.islice(items, top) if top is not None else items
+    if top is not None:
+        return heapq.nsmallest(top, items, key=key)
+    return sorted(items, key=key)
@@ -0,0 +1,197 @@
+"""
+Full screen interface to browse and edit a todo list (`todo tui`), made for very long lists.
+
+The file is parsed once, into a TodoStore (see `api`). Everything else happens in memory:
+- only the rows visible on screen are drawn, however long the list is
+- typing a filter narrows the list as you type, by substring over the casefolded text of items (computed once per
+  item, see taskitems.item_folded()); a longer filter only looks at what the previous one matched
+- toggling, deleting and moving items changes the parsed list, and rows hold items rather than indexes, so nothing
+  shifts under the cursor when items are renumbered
+- changes are saved (with backups, like any command) a few seconds after the last one, and on exit, rather than
+  once per keystroke
+
+`TuiState` has all the logic and no curses, `run()` draws it and feeds it keys.
+"""
+import time
+from typing import Optional
+
+from . import taskitems
+from .api import TodoStore
+
+__all__ = ["SAVE_DELAY", "TuiState", "run"]
+
+SAVE_DELAY = 2.0
+"""Seconds without changes after which changes are saved."""
+
+HELP = "↑↓ move  space toggle  d delete  J/K move item  / filter  s save  q quit"
+
+
+class TuiState:
+    """What the interface shows (filtered rows, cursor, scroll position) and the edits it makes to a store."""
+
+    def __init__(self, store: TodoStore, save_delay: float = SAVE_DELAY):
+        self.store = store
+        self.save_delay = save_delay
+        self.filter = ''
+        self.rows: list[dict] = list(store.items)
+        self.cursor = 0
+        self.top = 0
+        self.message = ''
+        self.last_change: Optional[float] = None
+
+    @property
+    def current(self) -> Optional[dict]:
+        return self.rows[self.cursor] if self.rows else None
+
+    def set_filter(self, text: str):
+        """filters rows to items whose text contains `text` (case-insensitive), keeping the cursor on its item"""
+        folded = text.casefold()
+        # a longer filter can only match a subset of what the current one matched
+        candidates = self.rows if folded.startswith(self.filter.casefold()) else self.store.items
+        current = self.current
+        self.filter = text
+        self.rows = [item for item in candidates if folded in taskitems.item_folded(item)]
+        self._follow(current)
+
+    def refresh(self):
+        """recomputes rows after items were added, removed or moved"""
+        current = self.current
+        folded = self.filter.casefold()
+        self.rows = [item for item in self.store.items if folded in taskitems.item_folded(item)]
+        self._follow(current)
+
+    def _follow(self, item: Optional[dict]):
+        for row, candidate in enumerate(self.rows):
+            if candidate is item:
+                self.cursor = row
+                return
+        self.cursor = min(self.cursor, max(len(self.rows) - 1, 0))
+
+    def move_cursor(self, delta: int):
+        self.cursor = max(0, min(self.cursor + delta, len(self.rows) - 1))
+
+    def visible(self, height: int) -> list[tuple[int, dict]]:
+        """returns the (row number, item) pairs to draw in `height` lines, scrolling to keep the cursor in view"""
+        if self.cursor < self.top:
+            self.top = self.cursor
+        elif self.cursor >= self.top + height:
+            self.top = self.cursor - height + 1
+        self.top = max(0, min(self.top, len(self.rows) - height))
+        return list(enumerate(self.rows[self.top:self.top + height], self.top))
+
+    def _changed(self, message: str):
+        self.message = message
+        self.last_change = time.monotonic()
+
+    def toggle(self):
+        item = self.current
+        if item is not None:
+            self.store.mark(not item['checked'], [item])
+            self._changed(f"{'done' if item['checked'] else 'not done'}: {item['id'][:7]}")
+
+    def delete(self, recursive: bool = False):
+        item = self.current
+        if item is None:
+            return
+        removed = self.store.remove([item], recursive=recursive)
+        # the rows after it (or its subtasks) take its place
+        removed_ids = {id(it) for it in removed}
+        self.rows = [row for row in self.rows if id(row) not in removed_ids]
+        self.cursor = min(self.cursor, max(len(self.rows) - 1, 0))
+        self._changed(f"deleted {len(removed)} item(s)")
+
+    def move(self, offset: int):
+        item = self.current
+        if item is not None and self.store.move(item, offset):
+            self.refresh()
+            self._changed(f"moved {item['id'][:7]}")
+
+    def save(self) -> bool:
+        saved = self.store.save()
+        self.last_change = None
+        if saved:
+            self.message = f"saved {self.store.path.name}"
+        return saved
+
+    def tick(self, now: Optional[float] = None) -> bool:
+        """saves if there were changes and none for a while, returns whether it saved"""
+        now = time.monotonic() if now is None else now
+        if self.last_change is not None and now - self.last_change >= self.save_delay:
+            return self.save()
+        return False
+
+
+def _row_text(item: dict, width: int) -> str:
+    first_line = item['text'].strip().split('\n', 1)[0]
+    text = f"{item['index']:>5} {'[x]' if item['checked'] else '[ ]'} {'  ' * item.get('depth', 0)}{first_line}"
+    return text[:width - 1]
+
+
+def run(state: TuiState):
+    """runs the interface until the user quits, then saves any pending changes"""
+    import curses
+
+    def main(screen):
+        curses.curs_set(0)
+        screen.timeout(250)   # wake up regularly for the debounced save
+        filtering = False
+        while True:
+            height, width = screen.getmaxyx()
+            screen.erase()
+            list_height = max(height - 2, 1)
+            for line, (row, item) in enumerate(state.visible(list_height)):
+                attr = curses.A_REVERSE if row == state.cursor else curses.A_DIM if item['checked'] else curses.A_NORMAL
+                screen.addnstr(line, 0, _row_text(item, width), width - 1, attr)
+            pending = " *" if state.last_change is not None else ""
+            status = f" {state.store.path.name}{pending}  {len(state.rows)}/{len(state.store.items)}  /{state.filter}"
+            screen.addnstr(height - 2, 0, status.ljust(width - 1), width - 1, curses.A_REVERSE)
+            screen.addnstr(height - 1, 0, state.message or HELP, width - 1)
+            screen.refresh()
+
+            try:
+                key = screen.get_wch()   # str for characters, int for special keys
+            except curses.error:
+                key = None   # timed out
+            state.tick()
+            if key is None:
+                continue
+            if filtering:
+                if key in (curses.KEY_BACKSPACE, '\x7f', '\b'):
+                    state.set_filter(state.filter[:-1])
+                elif key in ('\n', '\x1b', curses.KEY_ENTER):
+                    filtering = False
+                elif isinstance(key, str) and key.isprintable():
+                    state.set_filter(state.filter + key)
+                continue
+            state.message = ''
+            if key in (curses.KEY_UP, 'k'):
+                state.move_cursor(-1)
+            elif key in (curses.KEY_DOWN, 'j'):
+                state.move_cursor(1)
+            elif key == curses.KEY_PPAGE:
+                state.move_cursor(-list_height)
+            elif key == curses.KEY_NPAGE:
+                state.move_cursor(list_height)
+            elif key == curses.KEY_HOME:
+                state.move_cursor(-len(state.rows))
+            elif key == curses.KEY_END:
+                state.move_cursor(len(state.rows))
+            elif key in (' ', 'x'):
+                state.toggle()
+            elif key in ('d', 'D'):
+                state.delete(recursive=key == 'D')
+            elif key in ('K', 'J'):
+                state.move(-1 if key == 'K' else 1)
+            elif key == '/':
+                filtering = True
+            elif key == '\x1b':
+                state.set_filter('')
+            elif key == 's':
+                state.save()
+            elif key in ('q', 'Q'):
+                break
+
+    try:
+        curses.wrapper(main)
+    finally:
+        state.save()
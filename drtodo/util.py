@@ -1,9 +1,43 @@
+import os
+import shlex
+import subprocess
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Optional
+
 import rich
 import rich.markdown
+from rich.console import Console
+
 from .rich_display import console
 
-def print_md_as_raw(mdstring: str):
-    console().print(mdstring, markup=False, highlight=False)
 
-def print_md_pretty(mdstring: str):
-    console().print(rich.markdown.Markdown(mdstring))
+def print_md_as_raw(mdstring: str, out: Optional[Console] = None, end: str = '\n'):
+    (out or console()).print(mdstring, markup=False, highlight=False, end=end)
+
+def print_md_pretty(mdstring: str, out: Optional[Console] = None):
+    (out or console()).print(rich.markdown.Markdown(mdstring))
+
+
+@contextmanager
+def pager_console() -> Iterator[Console]:
+    """
+    Yields a console that writes to a pager ($PAGER or 'less -R') as output is printed, so long output can be read
+    while it is still being produced. Falls back to the regular console if the pager can't be started.
+    """
+    try:
+        pager = subprocess.Popen(shlex.split(os.environ.get('PAGER') or 'less -R'), stdin=subprocess.PIPE, text=True)
+    except OSError:
+        yield console()
+        return
+    assert pager.stdin is not None
+    try:
+        yield Console(file=pager.stdin, force_terminal=console().is_terminal, width=console().width)
+    except BrokenPipeError:
+        pass   # user quit the pager early
+    finally:
+        try:
+            pager.stdin.close()
+        except BrokenPipeError:
+            pass
+        pager.wait()
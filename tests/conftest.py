@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+os.environ["DRTODO_IGNORE_CONFIG"] = "True"
+# ensures consistent behavior regardless of local config files
+# NOTE: this means that config loading is not effectively tested here
+os.environ["DRTODO_CACHE_DIR"] = tempfile.mkdtemp(prefix="drtodo-test-cache-")
+# caches and indexes go to a fresh folder so they are exercised without touching the user's cache
+os.environ["HOME"] = tempfile.mkdtemp(prefix="drtodo-test-home-")
+# so does the DrToDo folder (~/.drtodo)
+
+SAMPLE = Path(__file__).parent.parent / "TODO.md"
+"""The sample todo file most command tests work on (a copy of it, see `sample_todofile`)."""
+
+
+@pytest.fixture(autouse=True)
+def sample_todofile(tmp_path_factory, monkeypatch):
+    """
+    a copy of the sample TODO.md in a temp folder, set as the todo file of the CLI for every test, so tests never
+    write to (or next to) the files of the repo; the section setting is restored after each test
+    """
+    from drtodo import config
+
+    todofile = tmp_path_factory.mktemp("sample") / "TODO.md"
+    shutil.copyfile(SAMPLE, todofile)
+    monkeypatch.setattr(config.settings, "section", config.settings.section)
+    monkeypatch.setattr(config.globals, "todo_files", [todofile])
+    return todofile
+
+
+@pytest.fixture
+def todofile(tmp_path, monkeypatch):
+    """an empty TODO.md in a temp folder, set as the todo file of the CLI (without section setting)"""
+    from drtodo import config
+
+    todofile = tmp_path / "TODO.md"
+    todofile.touch()
+    monkeypatch.setattr(config.settings, "section", "")
+    monkeypatch.setattr(config.globals, "todo_files", [todofile])
+    return todofile
+
+
+@pytest.fixture
+def sync_server(tmp_path):
+    """URL of a sync server running in a thread, serving change logs from a temp folder"""
+    import threading
+
+    from drtodo import syncserver
+
+    server = syncserver.make_server(tmp_path / "server", port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
@@ -0,0 +1,34 @@
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_agenda():
+    import datetime
+
+    from drtodo import taskitems
+
+    day = datetime.date(2026, 10, 1)
+    assert taskitems.parse_due("1oct2026") == taskitems.parse_due("1October2026") == day
+    assert taskitems.parse_due("2026-10-01T09:30") == taskitems.parse_due("2026-10-01 09:30") == day
+
+    today = datetime.date.today()
+    dues = {"agenda overdue": today - datetime.timedelta(days=2), "agenda today": today,
+            "agenda soon": today + datetime.timedelta(days=3), "agenda later": today + datetime.timedelta(days=30)}
+    for text, due in dues.items():
+        result = runner.invoke(app, ["--section", "", "add", text, "--due", due.isoformat()])
+        assert result.exit_code == 0
+    result = runner.invoke(app, ["--section", "", "add", "agenda relative", "--due", "tomorrow"])
+    assert f"due:{(today + datetime.timedelta(days=1)).isoformat()}" in result.stdout
+    result = runner.invoke(app, ["--section", "", "agenda", "--days", "5"])
+    assert result.exit_code == 0
+    out = result.stdout
+    assert out.index("Overdue") < out.index("agenda overdue") < out.index("Today") < out.index("agenda today") \
+        < out.index("Next 5 days") < out.index("agenda relative") < out.index("agenda soon")
+    assert "agenda later" not in out
+
+    # cached index is updated when the file changes
+    runner.invoke(app, ["--section", "", "done", "agenda today"])
+    result = runner.invoke(app, ["--section", "", "agenda"])
+    assert "agenda today" not in result.stdout and "agenda soon" in result.stdout
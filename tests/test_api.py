@@ -0,0 +1,75 @@
+import pytest
+
+
+def test_api(tmp_path):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from drtodo import config
+    from drtodo.api import TodoContext
+
+    files = []
+    for n in range(4):
+        todofile = tmp_path / f"TODO{n}.md"
+        todofile.write_text(f"# Other\n\n- [ ] other {n}\n\n## Work\n\n- [ ] task {n}\n  - [ ] subtask {n}\n- [x] done {n}\n")
+        files.append(todofile)
+    section = config.settings.section
+
+    def work(todofile):
+        # each context has its own cache folder and metrics file, saves from all threads observe the same metrics
+        store = TodoContext([todofile], section="## Work", keep_backups=0, cache_dir=str(tmp_path / "cache" / todofile.stem),
+                            metrics_file=str(tmp_path / "metrics" / f"{todofile.stem}.prom")).store()
+        assert [item['text'] for item in store.select(done=False)] == [f"task {todofile.stem[-1]}\n", f"subtask {todofile.stem[-1]}\n"]
+        marked = store.mark(True, index=0, recursive=True)
+        store.add("P1 new task")
+        assert store.save() and not store.save()
+        return len(marked)
+
+    with ThreadPoolExecutor(4) as pool:
+        assert list(pool.map(work, files)) == [2, 2, 2, 2]
+    assert config.settings.section == section   # contexts don't touch the global settings
+    assert sorted(path.parent.parent.name for path in tmp_path.glob("cache/*/counts/*.json")) == [f.stem for f in files]
+    assert all("drtodo_operation_duration_seconds_count" in f.read_text() for f in tmp_path.glob("metrics/*.prom"))
+    assert "- [x] task 0\n  - [x] subtask 0\n- [x] done 0\n- [ ] P1 new task\n" in files[0].read_text()
+    assert not list(tmp_path.glob(".*.bak-*"))
+
+    async def remove_all():
+        store = TodoContext(files[1:2], keep_backups=0).store()
+        await store.aload()
+        with pytest.raises(ValueError):
+            await store.aremove()   # no items or criteria
+        removed = await store.aremove(match="task", recursive=True)
+        await store.asave()
+        # items can still be changed once saved
+        await store.aadd("after save")
+        await store.aremove(match="done")
+        await store.asave()
+        return [item['text'].strip() for item in removed]
+
+    assert asyncio.run(remove_all()) == ["task 1", "subtask 1", "P1 new task"]
+    assert files[1].read_text() == "# Other\n\n- [ ] other 1\n\n## Work\n\n- [ ] after save\n"
+
+    # moves between two stores both ways at the same time don't deadlock
+    import sys
+    import threading
+
+    context = TodoContext(files[2:], keep_backups=0)
+    stores = [context.store(todofile) for todofile in files[2:]]
+    total = sum(len(store.items) for store in stores)
+
+    def shuttle(source, target):
+        for _ in range(1000):
+            source.move_to([item for item in source.items if item['depth'] == 0][-1:], "## Work", store=target)
+
+    threads = [threading.Thread(target=shuttle, args=pair, daemon=True) for pair in (stores, stores[::-1])]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)   # switch threads as often as possible
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+    finally:
+        sys.setswitchinterval(interval)
+    assert not any(thread.is_alive() for thread in threads)
+    assert sum(len(store.items) for store in stores) == total
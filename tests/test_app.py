@@ -1,14 +1,7 @@
 # from typer.testing import CliRunner
-import os
-
-os.environ["DRTODO_IGNORE_CONFIG"] = "True"
-# ensures consistent behavior regardless of local config files
-# NOTE: this means that config loading is not effectively tested here
-
-from drtodo import __version__       # noqa: E402
-from drtodo.main import app          # noqa: E402
-from typer_aliases import CliRunner  # noqa: E402
-
+from drtodo import __version__
+from drtodo.main import app
+from typer_aliases import CliRunner
 
 runner = CliRunner(mix_stderr=False)
 
@@ -89,6 +82,31 @@ def test_show():
     assert '##' not in result.stdout
 
 
+def test_show_section_lines():
+    result = runner.invoke(app, ['show', '--raw', '--section', '## Bugs assigned to me'])
+    assert result.exit_code == 0
+    assert result.stdout.startswith("## Bugs assigned to me")
+    assert "- [ ] bug 2" in result.stdout
+    assert "write a readme" not in result.stdout
+    assert "Appendix" not in result.stdout
+
+    # a section includes its subsections
+    result = runner.invoke(app, ['show', '--raw', '--section', 'this is my md file'])
+    assert result.exit_code == 0
+    assert "ice cream" in result.stdout
+    assert "bug 1" in result.stdout
+    assert "Appendix" not in result.stdout
+
+    result = runner.invoke(app, ['show', '--raw', '--lines', '0:1'])
+    assert result.exit_code == 0
+    assert result.stdout == "This is my cool project readme file.\n"
+
+    result = runner.invoke(app, ['show', '--lines', '-1:'])
+    assert result.exit_code == 2
+    result = runner.invoke(app, ['show', '--lines', '1:5:0'])
+    assert result.exit_code == 2 and "step can't be zero" in result.stderr
+
+
 def test_version():
     result = runner.invoke(app, ["--version"])
     assert result.exit_code == 0
@@ -105,7 +123,7 @@ def test_remove():
     assert result.exit_code == 0
     assert "make it useful" not in result.stdout
 
-    # restore the backup so we can run the tests again
+    # the backup brings it back
     result = runner.invoke(app, ["backup", "--force", "restore"])
     assert result.exit_code == 0
     assert "restored:" in result.stdout
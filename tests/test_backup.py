@@ -0,0 +1,48 @@
+import pytest
+
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_no_op_saves(todofile, tmp_path, monkeypatch):
+    from drtodo import backup_command, config
+
+    todofile.write_text("# Tasks\n\n- [ ] one\n- [ ] two\n")
+    monkeypatch.setattr(config.settings, "sidecar_index", False)
+    saves = []
+    save_with_backups = backup_command.save_with_backups
+    monkeypatch.setattr(backup_command, "save_with_backups", lambda *args: saves.append(save_with_backups(*args)))
+
+    for args in (["undone", "1"], ["remove", "-m", "nothing"], ["clean", "--remove"], ["done", "0"], ["done", "0"]):
+        runner.invoke(app, args)
+    # only the first done changed anything: the file was written (and backed up) once
+    assert saves == [False, False, False, True, False]
+    assert todofile.read_text() == "# Tasks\n\n- [x] one\n- [ ] two\n"
+    assert len(list(tmp_path.glob(".TODO.md.bak-*"))) == 1
+
+
+def test_backup_diff(todofile, monkeypatch):
+    from drtodo import backup_command, config, filecache
+
+    todofile.write_text("# Tasks\n\n- [ ] one\n- [ ] two\n- [x] three\n")
+    monkeypatch.setattr(config.settings, "keep_backups", 4)
+    runner.invoke(app, ["done", "one"])
+    runner.invoke(app, ["add", "four"])
+    runner.invoke(app, ["undone", "three"])
+    runner.invoke(app, ["rm", "two"])
+
+    result = runner.invoke(app, ["backup", "diff"])
+    assert result.exit_code == 0
+    assert result.stdout.startswith("Removed\n") and "two" in result.stdout and "three" not in result.stdout
+    result = runner.invoke(app, ["backup", "diff", "-4", "--count"])
+    assert result.stdout == "1 added, 1 checked, 1 unchecked, 1 removed\n"
+    assert "Checked\n" not in runner.invoke(app, ["backup", "diff", "3"]).stdout
+    assert runner.invoke(app, ["backup", "diff", "-5"]).exit_code == 2
+    assert runner.invoke(app, ["backup", "diff", "x"]).exit_code == 2
+
+    # backups are only scanned once, even as they rotate
+    runner.invoke(app, ["add", "five"])
+    monkeypatch.setattr(filecache, "store", lambda *args: pytest.fail("backup scanned again"))
+    assert backup_command.file_items(backup_command.make_backup_path(todofile, 4), "")[0]['checked']
@@ -0,0 +1,46 @@
+import os
+
+from drtodo import completion, main, sidecar
+from drtodo.main import app
+
+
+def test_completion(sample_todofile, monkeypatch, capsys):
+    import click
+    import typer
+
+    # the fast path finds the todo file from the current folder: a repo configured for DrToDo
+    todofile = sample_todofile
+    (todofile.parent / ".git").mkdir()
+    (todofile.parent / ".drtodo.toml").write_text("section = '## TODO'\n")
+    monkeypatch.chdir(todofile.parent)
+    os.utime(todofile)   # stale index: completion data is parsed then indexed
+    ctx = click.Context(typer.main.get_command(app))
+    ctx.params['section'] = ""
+    data = main._completion_data(ctx)
+    index = sidecar.read_index(todofile, "")
+    assert index is not None and "## TODO" in index['headings']
+
+    item = data[0].items[0]
+    assert ("0", completion.describe(item)) in completion.complete_tasks(data, "")
+    assert completion.complete_tasks(data, item['id'][:3], indices=False) == [(item['id'][:7], completion.describe(item))]
+    assert ("## TODO", "TODO") in completion.complete_sections(data, "## to")
+    assert ("TODO", "## TODO") in completion.complete_sections(data, "to")
+
+    # the fast path answers from the index alone
+    monkeypatch.setenv("_TODO_COMPLETE", "complete_bash")
+    monkeypatch.setenv("COMP_WORDS", "todo --section '' done --index ")
+    monkeypatch.setenv("COMP_CWORD", "5")
+    assert completion.fast_complete("todo")
+    assert capsys.readouterr().out.split() == [str(i['index']) for i in data[0].items]
+
+    monkeypatch.setenv("_TODO_COMPLETE", "complete_zsh")
+    monkeypatch.setenv("_TYPER_COMPLETE_ARGS", "todo --section TO")
+    assert completion.fast_complete("todo")
+    assert '"## TODO"' in capsys.readouterr().out
+
+    # but leaves anything else to typer
+    monkeypatch.setenv("_TYPER_COMPLETE_ARGS", "todo done --range ")
+    assert not completion.fast_complete("todo")
+    os.utime(todofile)
+    monkeypatch.setenv("_TYPER_COMPLETE_ARGS", "todo --section '' done ")
+    assert not completion.fast_complete("todo")
@@ -0,0 +1,29 @@
+def test_export(tmp_path):
+    from drtodo import export
+
+    files = []
+    for i in range(3):
+        files.append(tmp_path / f"todo{i}.md")
+        files[-1].write_text(f"# Now\n\n- [ ] task {i}\n  - [x] sub <b>\n\n## Later\n\n- [ ] later {i}\n")
+    out = tmp_path / "out"
+    assert export.export(files, out, "html", jobs=1) == export.ExportResult(files=3, exported=3, written=10)
+    page = (out / export._slug(str(files[0].resolve())) / "now.html").read_text()
+    assert "task 0" in page and "sub &lt;b&gt;" in page and "checked" in page
+    assert export.export(files, out, "html", jobs=1) == export.ExportResult(files=3, exported=0, written=0)
+
+    # only the pages of what changed are written again
+    files[1].write_text(files[1].read_text().replace("later 1", "later one"))
+    assert export.export(files, out, "html", jobs=1) == export.ExportResult(files=3, exported=1, written=1)
+    files[2].write_text("- [ ] no section\n")
+    assert export.export(files[1:], out, "html", jobs=1) == export.ExportResult(files=2, exported=1, written=3)
+    # pages of files and sections that are gone are removed
+    slugs = [export._slug(str(todofile.resolve())) for todofile in files]
+    assert list((out / slugs[0]).iterdir()) == []
+    assert not (out / slugs[2] / "later.html").exists()
+    export.export(files, tmp_path / "md", "markdown", jobs=1)
+    assert "- [ ] no section" in (tmp_path / "md" / slugs[2] / "top.md").read_text()
+    # a section named Index does not overwrite the index page of the file
+    files[0].write_text("# Index\n\n- [ ] indexed\n")
+    export.export(files, out, "html", jobs=1)
+    assert "index-.html" in (out / slugs[0] / "index.html").read_text()
+    assert "indexed" in (out / slugs[0] / "index-.html").read_text()
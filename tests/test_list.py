@@ -0,0 +1,176 @@
+import pytest
+
+from drtodo import main
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_sort_top():
+    result = runner.invoke(app, ["add", "-p", "2", "-d", "2031-01-15", "sort test second"])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["add", "-p", "1", "-d", "2031-02-01", "sort test first"])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["list", "--sort", "priority,due", "--top", "2"])
+    assert result.exit_code == 0
+    lines = result.stdout.splitlines()
+    assert len(lines) == 3   # header plus 2 items
+    assert "sort test first" in lines[1]
+    assert "sort test second" in lines[2]
+
+    result = runner.invoke(app, ["list", "--sort", "due", "--top", "1"])
+    assert result.exit_code == 0
+    assert "sort test second" in result.stdout
+    assert "sort test first" not in result.stdout
+
+    result = runner.invoke(app, ["list", "--sort", "-index", "--top", "1"])
+    assert result.exit_code == 0
+    assert "sort test first" in result.stdout
+
+    result = runner.invoke(app, ["list", "--top", "1"])
+    assert result.exit_code == 0
+    assert "write a readme" in result.stdout
+    assert "make it useful" not in result.stdout
+
+    result = runner.invoke(app, ["list", "--sort", "bogus"])
+    assert result.exit_code == 2
+
+
+def test_list_pagination(todofile, monkeypatch):
+    from drtodo import linescan
+
+    todofile.write_text("# Tasks\n\n" + "".join(f"- [{'x' if i % 2 else ' '}] task {i}\n  more {i}\n" for i in range(100)))
+
+    result = runner.invoke(app, ["list", "--offset", "10", "--limit", "3"])
+    assert result.exit_code == 0
+    assert [line.split()[0] for line in result.stdout.splitlines()[1:]] == ["10:", "11:", "12:"]
+
+    # the streaming engine finds the same items as the parser, and stops reading once the limit is reached
+    read = []
+
+    stream_tasks = linescan.stream_tasks
+
+    def counting_stream(lines, section):
+        for item in stream_tasks(lines, section):
+            read.append(item)
+            yield item
+
+    monkeypatch.setattr(linescan, "stream_tasks", counting_stream)
+    result = runner.invoke(app, ["list", "--limit", "2"])
+    assert "task 1" in result.stdout and "task 2" not in result.stdout
+    assert len(read) == 2
+    full = runner.invoke(app, ["list"]).stdout.splitlines()
+    assert result.stdout.splitlines() == full[:3]
+
+    result = runner.invoke(app, ["list", "--count", "--match", "task 1"])
+    assert result.stdout.strip() == "11"
+    result = runner.invoke(app, ["list", "--sort", "-index", "--limit", "1", "--offset", "1"])
+    assert "task 98" in result.stdout and "task 99" not in result.stdout
+
+
+def test_list_streaming_fallback(todofile):
+    from drtodo import linescan
+
+    # an ordered list, and a task in an indented code block, are not scanned exactly: the parser takes over
+    todofile.write_text("# Tasks\n\n- [ ] first\n\n## More\n\n2. [ ] a\n3. [ ] b\n    - [ ] sub b\n\nnotes:\n\n"
+                        "    - [ ] in code\n\n- [ ] c\n")
+    with todofile.open() as f, pytest.raises(linescan.NotExact):
+        list(linescan.stream_tasks(f, ""))
+    streamed = runner.invoke(app, ["list", "--limit", "10"])
+    assert streamed.exit_code == 0
+    assert streamed.stdout == runner.invoke(app, ["list"]).stdout
+    assert [(item['text'].strip(), item['depth']) for item in linescan.stream_file_tasks(todofile)] == \
+        [("first", 0), ("a", 0), ("b", 0), ("sub b", 1), ("c", 0)]
+    assert runner.invoke(app, ["count"]).stdout.strip() == "5 open, 0 done"
+
+
+def test_match_terms(todofile):
+    from drtodo import taskitems
+    from drtodo.mdparser import TodoListParser
+
+    todofile.write_text("# Tasks\n\n- [ ] Add a face to the README\n- [ ] fix the Bug in C++ code\n"
+                        "- [ ] debug bugs\n- [ ] add tests (later)\n")
+
+    def listed(*args):
+        result = runner.invoke(app, ["list", *args])
+        assert result.exit_code == 0, result.stdout
+        return [int(line.split(':')[0]) for line in result.stdout.splitlines()[1:]]
+
+    # hex looking words only select IDs that exist, otherwise they match text
+    assert listed("face") == [0]
+    assert listed("add") == [3]
+    items = TodoListParser("").parse(todofile)
+    assert listed(items[2]['id'][:4]) == [2]
+    assert listed("-m", "bug", "-m", "code") == []
+    assert listed("-m", "Bug", "-m", "code") == [1]
+    assert listed("-m", "bug", "-g", "add", "--any") == [2, 3]
+    assert listed("-m", "bug", "-I") == [1, 2]
+    assert listed("-m", "bug", "-I", "-w") == [1]
+    assert listed("-F", "-m", "C++", "-m", "(LATER)", "--any", "-I") == [1, 3]
+    assert listed("-F", "-I", "-w", "-m", "c++") == [1]
+    assert listed("-I", "-F", "add") == [0, 3]
+    assert runner.invoke(app, ["list", "-m", "("]).exit_code == 2
+
+    matcher = taskitems.Matcher(["ug", "de"], fixed=True)
+    assert [matcher.match_text(text) for text in ("debug", "bug", "code")] == [True, False, False]
+    assert not taskitems.Matcher()
+
+
+def test_list_history(todofile, tmp_path, monkeypatch):
+    from git.repo import Repo
+
+    from drtodo import history
+
+    repo = Repo.init(tmp_path)
+    with repo.config_writer() as writer:
+        writer.set_value("user", "name", "test").set_value("user", "email", "test@example.com")
+    todofile.write_text("# Tasks\n\n- [ ] one\n- [ ] two\n  - [ ] two.a\n- [x] three\n")
+    repo.index.add(["TODO.md"])
+    repo.index.commit("first")
+    repo.create_tag("v1")
+    todofile.write_text("# Tasks\n\n- [x] one\n- [ ] two\n  - [ ] two.b\n- [ ] three\n- [ ] four\n")
+
+    result = runner.invoke(app, ["list", "--since", "v1"])
+    assert result.exit_code == 0
+    lines = [line.split() for line in result.stdout.splitlines()[1:]]
+    assert [line[-1] if len(line) == 1 else line[-1] + line[0] for line in lines] == \
+        ["Added", "two.b2:", "four4:", "Completed", "one0:", "Reopened", "three3:", "Removed", "two.a2:"]
+    result = runner.invoke(app, ["list", "--since", "v1", "--count", "--match", "two"])
+    assert result.stdout.splitlines()[1] == "1 added, 0 completed, 0 reopened, 1 removed"
+    result = runner.invoke(app, ["list", "--at", "v1", "--depth", "0"])
+    assert [line.split()[-1] for line in result.stdout.splitlines()[1:]] == ["one", "two", "three"]
+    assert runner.invoke(app, ["list", "--at", "nope"]).exit_code == 2
+    result = runner.invoke(app, ["list", "--since", "v1", "--limit", "1"])
+    assert result.exit_code == 2 and "--since" in result.stderr
+
+    # parsed blobs are cached by SHA: reading the same version again reads no markdown
+    with history.History(todofile, "") as h:
+        monkeypatch.setattr(history, "_read_items", None)
+        assert [item['text'] for item in h.items_at("v1")][:2] == ["one\n", "two\n"]
+
+
+def test_render_cache(todofile, monkeypatch):
+    from drtodo import config, rendercache
+
+    todofile.write_text("# Tasks\n\n- [ ] one *two*\n- [x] three\n")
+    first = runner.invoke(app, ["list"]).stdout
+
+    rendered = []
+    render = main._render_todo_item
+    monkeypatch.setattr(main, "_render_todo_item", lambda item, *args: rendered.append(item['index']) or render(item, *args))
+    assert runner.invoke(app, ["list"]).stdout == first and rendered == []
+    runner.invoke(app, ["done", "0"])
+    assert "🔘 one two" in runner.invoke(app, ["list"]).stdout and rendered == [0]
+    # lines are kept when items move: the index is not part of them
+    runner.invoke(app, ["add", "new"])
+    assert rendered == [0, 2]
+    runner.invoke(app, ["move", "2", "--to", "0"])
+    result = runner.invoke(app, ["list"])
+    assert rendered == [0, 2] and rendercache.INDEX_PLACEHOLDER not in result.stdout
+    assert [line.split(":")[0].strip() for line in result.stdout.splitlines()[1:]] == ["0", "1", "2"]
+    assert "1:" in next(line for line in result.stdout.splitlines() if "one two" in line)
+    # a different style invalidates all lines
+    monkeypatch.setattr(config.settings, "hide_hash", True)
+    runner.invoke(app, ["list"])
+    assert sorted(rendered[2:]) == [0, 1, 2]
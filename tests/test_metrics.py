@@ -0,0 +1,53 @@
+import os
+import time
+
+import pytest
+
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_metrics(todofile, tmp_path, monkeypatch):
+    import re
+
+    from drtodo import config, metrics
+
+    def count(operation: str) -> int:
+        m = re.search('drtodo_operation_duration_seconds_count{operation="' + operation + '"} ([0-9]+)\n',
+                      metrics_file.read_text())
+        return int(m.group(1)) if m else 0
+
+    todofile.write_text("# Tasks\n\n- [ ] one\n- [x] two\n\n## Later\n\n- [ ] three\n")
+    metrics_file = tmp_path / "metrics" / "todo.prom"
+    result = runner.invoke(app, ["metrics"])
+    assert f'drtodo_tasks{{file="{todofile.resolve()}",section="## Later",state="open"}} 1\n' in result.stdout
+    assert result.stdout.endswith("# EOF\n")
+
+    monkeypatch.setattr(config.settings, "metrics_file", str(metrics_file))
+    monkeypatch.setattr(metrics, "_histograms", {})
+    runner.invoke(app, ["add", "four"])
+    assert f'drtodo_tasks{{file="{todofile.resolve()}",section="## Later",state="open"}} 2\n' in metrics_file.read_text()
+    assert count("save") == 1
+    # histograms add up across commands, even those that don't save anything
+    rendered = count("render")
+    runner.invoke(app, ["list"])
+    assert count("render") == rendered + 4 and count("save") == 1
+    runner.invoke(app, ["done", "four"])
+    text = metrics_file.read_text()
+    assert count("save") == 2
+    assert f'drtodo_tasks{{file="{todofile.resolve()}",section="## Later",state="done"}} 1\n' in text
+
+    # the state is updated under a lock file: another process holding it is waited for, a stale one is broken
+    lock = metrics_file.parent / ".todo.prom.json.lock"
+    lock.touch()
+    os.utime(lock, (time.time() + 60, time.time() + 60))   # held, and not stale while waiting for it
+    monkeypatch.setattr(metrics, "LOCK_TIMEOUT", 0.2)
+    metrics.observe("save", 0.01)
+    with pytest.raises(TimeoutError):
+        metrics.write(metrics_file)
+    os.utime(lock, (0, 0))
+    metrics.write(metrics_file)
+    assert count("save") == 3
+    assert sorted(p.name for p in metrics_file.parent.iterdir()) == [".todo.prom.json", "todo.prom"]
@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from drtodo import profiling
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_profile():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        report = Path(tmpdir) / "profile.json"
+        try:
+            result = runner.invoke(app, ["--profile", "--profile-format", "json", "--profile-output", str(report), "list"])
+        finally:
+            profiling.disable()
+        assert result.exit_code == 0
+        assert "make it useful" in result.stdout
+        phases = json.loads(report.read_text())['phases']
+        assert "parse.mistune" in phases
+        assert phases["render"]['count'] >= 2   # one per item listed
+
+        try:
+            result = runner.invoke(app, ["--profile", "--profile-format", "trace", "--profile-output", str(report), "list"])
+        finally:
+            profiling.disable()
+        assert result.exit_code == 0
+        events = json.loads(report.read_text())['traceEvents']
+        assert all(e['ph'] == 'X' for e in events)
+        assert "parse.traverse" in [e['name'] for e in events]
+
+    result = runner.invoke(app, ["--profile", "--profile-format", "bogus", "list"])
+    assert result.exit_code != 0
+    assert not profiling.enabled()
+
+    # tracing started by someone else goes on after profiling
+    import tracemalloc
+
+    tracemalloc.start()
+    try:
+        profiling.enable(output=Path(os.devnull))
+        profiling.disable()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
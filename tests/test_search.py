@@ -0,0 +1,39 @@
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_search():
+    result = runner.invoke(app, ["--section", "", "search", "bug"])
+    assert result.exit_code == 0
+    assert "bug 1" in result.stdout
+    assert "bug 2" in result.stdout
+    assert "useful" not in result.stdout
+    # later items rank higher when relevance is the same
+    assert result.stdout.find("bug 2") < result.stdout.find("bug 1")
+
+    result = runner.invoke(app, ["search", "use*"])
+    assert result.exit_code == 0
+    assert "make it useful" in result.stdout
+
+    result = runner.invoke(app, ["search", '"it useful"'])
+    assert result.exit_code == 0
+    assert "make it useful" in result.stdout
+
+    result = runner.invoke(app, ["search", '"useful it"'])
+    assert result.exit_code == 0
+    assert "make it useful" not in result.stdout
+
+    # the index is updated when the file changes
+    result = runner.invoke(app, ["add", "searchable zebra item"])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["search", "zebra"])
+    assert result.exit_code == 0
+    assert "searchable zebra item" in result.stdout
+    runner.invoke(app, ["remove", "zebra"])
+    result = runner.invoke(app, ["search", "zebra"])
+    assert "searchable zebra item" not in result.stdout
+
+    result = runner.invoke(app, ["search", "!!!"])
+    assert result.exit_code == 2
@@ -0,0 +1,62 @@
+import os
+
+from drtodo import linescan, sidecar
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_sidecar_index(sample_todofile):
+    todofile = sample_todofile
+    result = runner.invoke(app, ["--section", "", "add", "sidecar indexed item"])
+    assert result.exit_code == 0
+    index = sidecar.read_index(todofile, "")
+    assert index is not None
+    entry = sidecar.find_entries(index, index_number=4)[0]
+    assert entry[sidecar.TEXT].startswith("sidecar indexed item")
+    assert todofile.read_bytes()[entry[sidecar.OFFSET]:entry[sidecar.OFFSET] + 3] == b"[ ]"
+
+    # marked in place through the sidecar index, which stays valid
+    result = runner.invoke(app, ["done", entry[sidecar.ID][:7]])
+    assert result.exit_code == 0
+    assert "sidecar indexed item" in result.stdout
+    assert todofile.read_bytes()[entry[sidecar.OFFSET]:entry[sidecar.OFFSET] + 3] == b"[x]"
+    index = sidecar.read_index(todofile, "")
+    assert index is not None and sidecar.find_entries(index, index_number=4)[0][sidecar.CHECKED]
+
+    # a file changed behind our back invalidates the index and falls back to a full parse
+    os.utime(todofile)
+    assert sidecar.read_index(todofile, "") is None
+    result = runner.invoke(app, ["undone", "4"])
+    assert result.exit_code == 0
+    assert "- [ ] sidecar indexed item" in todofile.read_text()
+    assert sidecar.read_index(todofile, "") is not None
+
+
+def test_sidecar_index_sections(todofile, monkeypatch):
+    from drtodo import config
+
+    todofile.write_text("## DONE\n\n- [ ] review\n\n## TODO\n\n- [ ] review\n- [ ] other\n")
+    monkeypatch.setattr(config.settings, "section", "## TODO")
+    # each item is indexed at its own line, not at the same text in another section
+    for args in (["done", "1"], ["undone", "1"], ["done", "0"]):
+        assert runner.invoke(app, args).exit_code == 0
+    assert todofile.read_text() == "## DONE\n\n- [ ] review\n\n## TODO\n\n- [x] review\n- [ ] other\n"
+    index = sidecar.read_index(todofile, "## TODO")
+    assert index is not None and [entry[sidecar.HEADING] for entry in index['items']] == ["## TODO", "## TODO"]
+
+
+def test_sidecar_index_exact(todofile):
+    # the task lines in the HTML and indented code blocks are not items: the index must not point at them
+    for text in ("# TODO\n\n<div>\n- [ ] foo\n</div>\n\n- [ ] foo\n- [ ] bar\n",
+                 "# TODO\n\n    - [ ] foo\n\n- [ ] foo\n- [ ] bar\n"):
+        todofile.write_text(text)
+        for args in (["done", "1"], ["done", "0"]):
+            assert runner.invoke(app, args).exit_code == 0
+        assert [item['checked'] for item in linescan.parse_tasks(todofile.read_text())] == [True, True]
+        assert "- [ ] foo\n" in todofile.read_text()
+    # the line scan can't be exact on HTML, so no index is written for it
+    todofile.write_text("# TODO\n\n<div>\n- [ ] foo\n</div>\n\n- [ ] foo\n- [ ] bar\n")
+    assert runner.invoke(app, ["done", "0"]).exit_code == 0
+    assert sidecar.read_index(todofile, "") is None
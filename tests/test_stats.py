@@ -0,0 +1,105 @@
+import json
+
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_stats():
+    result = runner.invoke(app, ["--section", "", "stats", "--format", "json"])
+    assert result.exit_code == 0
+    before = json.loads(result.stdout)['total']
+
+    result = runner.invoke(app, ["--section", "", "add", "stats item", "--owner", "statsowner", "--priority", "2"])
+    assert result.exit_code == 0
+    try:
+        result = runner.invoke(app, ["--section", "", "stats", "--format", "json"])
+        total = json.loads(result.stdout)['total']
+        assert total['open'] == before['open'] + 1
+        assert total['owner']['statsowner'] == {'open': 1, 'done': 0}
+        assert total['priority']['P2']['open'] == before['priority'].get('P2', {}).get('open', 0) + 1
+
+        result = runner.invoke(app, ["--section", "", "stats"])
+        assert result.exit_code == 0
+        assert "statsowner" in result.stdout
+    finally:
+        runner.invoke(app, ["--section", "", "remove", "stats item"])
+
+    result = runner.invoke(app, ["stats", "--format", "xml"])
+    assert result.exit_code == 2
+
+
+def test_sql_index(todofile, monkeypatch):
+    from drtodo import config, sqlindex
+
+    todofile.write_text("# Tasks\n\n- [ ] P2 @bob due:2030-01-02 alpha\n  - [x] P1 beta\n- [ ] @Amy gamma\n"
+                        "- [x] due:someday delta\n\n## More\n\n- [ ] P3 due:2029-12-31 epsilon\n- [ ] due:tomorrow zeta\n")
+    other = todofile.with_name("OTHER.md")
+    other.write_text("- [ ] P1 due:2029-06-01 eta\n")
+
+    queries = [["list"], ["list", "--sort", "priority,-index"], ["list", "--sort", "due", "--limit", "3", "--offset", "1"],
+               ["list", "--sort", "owner,text"], ["list", "-m", "^[a-d]"], ["list", "1:"], ["list", "--range", "-2:"],
+               ["list", "--depth", "0"], ["list", "--count"], ["stats", "--format", "json"]]
+    expected = [runner.invoke(app, args).stdout for args in queries]
+    # sorted across files
+    monkeypatch.setattr(config.globals, "todo_files", [todofile, other])
+    expected_both = [runner.invoke(app, ["list", "--sort", key]).stdout for key in ("due", "priority")]
+    monkeypatch.setattr(config.settings, "sql_index", True)
+    assert [runner.invoke(app, ["list", "--sort", key]).stdout for key in ("due", "priority")] == expected_both
+    monkeypatch.setattr(config.globals, "todo_files", [todofile])
+    assert [runner.invoke(app, args).stdout for args in queries] == expected
+    with sqlindex.SqlIndex.open() as db:
+        # relative dues are dated when querying, not when the file was read
+        assert db.connection.execute("SELECT due_date FROM tasks WHERE text LIKE '%zeta%'").fetchone()[0] is None
+        # ID prefixes are literal
+        assert db.count([todofile], id="%") == db.count([todofile], id="_") == 0
+        assert db.count([todofile], id="c85f6") == 1
+
+    # the mirror follows changes to the markdown file
+    result = runner.invoke(app, ["done", "gamma"])
+    assert result.exit_code == 0
+    result = runner.invoke(app, ["list", "--count", "--match", "gamma"])
+    assert result.stdout.strip() == "1"
+    with sqlindex.SqlIndex.open() as db:
+        row = db.connection.execute("SELECT checked FROM tasks WHERE text LIKE '%gamma%'").fetchone()
+        assert row[0] == 1
+
+    result = runner.invoke(app, ["list", "-m", "("])
+    assert result.exit_code == 2
+
+
+def test_count(todofile, tmp_path, monkeypatch, capsys):
+    from drtodo import counts, fastpath
+
+    todofile.write_text("# Tasks\n\n- [ ] one\n  - [x] two\n- [ ] three\n")
+    assert runner.invoke(app, ["count"]).stdout == "2 open, 1 done\n"
+    assert runner.invoke(app, ["count", "-f", "json"]).stdout == '{"open": 2, "done": 1}\n'
+    runner.invoke(app, ["done", "--all"])
+    assert runner.invoke(app, ["count", "--format", "prompt"]).stdout == ""
+    runner.invoke(app, ["undone", "1"])   # patched in place with the sidecar index
+    assert runner.invoke(app, ["count"]).stdout == "1 open, 2 done\n"
+    runner.invoke(app, ["done", "1"])
+    assert runner.invoke(app, ["count", "-f", "xml"]).exit_code == 2
+
+    # counter files are used while the file is unchanged, and refreshed with a line scan when it is not
+    cache_dir = tmp_path / "cache"
+    assert counts.count_file(todofile, "", cache_dir) == (0, 3)
+    with monkeypatch.context() as m:
+        m.setattr(counts, "stream_file_tasks", None)
+        assert counts.count_file(todofile, "", cache_dir) == (0, 3)
+    todofile.write_text("- [ ] four\n")
+    assert counts.count_file(todofile, "", cache_dir) == (1, 0)
+
+    # counts stored on save and counts refreshed by a scan agree, on markdown the line scan can't read exactly too
+    todofile.write_text("1. [ ] a\n2. [ ] b\n    - [ ] sub\n\n> - [ ] quoted\n\n- [ ] c\n  lazy\n- [ ] d\n")
+    assert runner.invoke(app, ["done", "0"]).exit_code == 0
+    assert runner.invoke(app, ["count"]).stdout == "5 open, 1 done\n"
+    assert counts.count_file(todofile, "", None) == (5, 1)
+
+    light = fastpath.LightConfig([todofile], "", True, cache_dir)
+    monkeypatch.setattr(fastpath, "light_config", lambda **kwargs: light)
+    assert counts.fast_count(["-G", "count", "--format=prompt"])
+    assert capsys.readouterr().out == "5\n"
+    assert not counts.fast_count(["count", "--all"])
+    assert not counts.fast_count(["list"])
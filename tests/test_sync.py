@@ -0,0 +1,101 @@
+import os
+import time
+
+import pytest
+
+from drtodo import lockfile
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_lockfile(tmp_path):
+    import subprocess
+    import sys
+
+    from drtodo.sync import FolderRemote, SyncError
+
+    lock = tmp_path / "list.lock"
+    # held by a live process, however old: waited for
+    lock.write_text(f"{lockfile._host()}:{os.getpid()}")
+    os.utime(lock, (0, 0))
+    with pytest.raises(TimeoutError), lockfile.locked(lock, 0.2):
+        pass
+    remote = FolderRemote(tmp_path)
+    remote.LOCK_TIMEOUT = 0.2
+    with pytest.raises(SyncError, match="is locked"):
+        remote.push("list", 0, [{'op': 'add'}])
+    # left by a process that is gone, however recent: broken at once
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True,
+                          check=True)
+    lock.write_text(f"{lockfile._host()}:{dead.stdout.strip()}")
+    start = time.monotonic()
+    assert remote.push("list", 0, [{'op': 'add'}]) == 1
+    assert time.monotonic() - start < 1.0 and not lock.exists()
+    # on another host: broken once older than the timeout
+    lock.write_text("elsewhere:1")
+    os.utime(lock, (time.time() + 60, time.time() + 60))   # not stale while waiting for it
+    with pytest.raises(TimeoutError), lockfile.locked(lock, 0.2):
+        pass
+    os.utime(lock, (0, 0))
+    with lockfile.locked(lock, 0.2):
+        assert lock.read_text() == f"{lockfile._host()}:{os.getpid()}"
+    assert not lock.exists()
+
+
+def test_sync(tmp_path, monkeypatch, sync_server):
+    from drtodo import config
+
+    a, b = tmp_path / "a" / "TODO.md", tmp_path / "b" / "TODO.md"
+    a.parent.mkdir()
+    b.parent.mkdir()
+    a.write_text("# Tasks\n\n- [ ] one\n- [ ] two\n")
+    b.write_text("# Tasks\n")
+    monkeypatch.setattr(config.settings, "section", "")
+
+    def sync(todofile, *args):
+        monkeypatch.setattr(config.globals, "todo_files", [todofile])
+        result = runner.invoke(app, [*args, "sync", "--remote", sync_server, "--name", "tasks"])
+        assert result.exit_code == 0, result.stderr
+        return result
+
+    sync(a)
+    sync(b)   # into a file without a list
+    assert b.read_text() == "# Tasks\n\n- [ ] one\n- [ ] two\n"
+
+    a.write_text("# Tasks\n\n- [x] one\n- [ ] two\n")
+    b.write_text("# Tasks\n\n- [ ] one\n- [ ] three\n")
+    sync(a)
+    sync(b)
+    sync(a)
+    assert a.read_text() == b.read_text() == "# Tasks\n\n- [x] one\n- [ ] three\n"
+
+    # changed on both sides: the local change wins, a task done here but removed there is added back
+    a.write_text("# Tasks\n\n- [x] one\n- [x] three\n")
+    b.write_text("# Tasks\n\n- [x] one\n")
+    sync(b)
+    assert "1 item(s) changed on both sides" in sync(a).stderr
+    sync(b)
+    assert a.read_text() == b.read_text() == "# Tasks\n\n- [x] one\n- [x] three\n"
+
+    # nothing changed: nothing pushed, nothing written
+    before = (tmp_path / "server" / "tasks.seq").read_text()
+    sync(a)
+    assert (tmp_path / "server" / "tasks.seq").read_text() == before
+
+    # a task added before all the others is added first there too
+    a.write_text("# Tasks\n\n- [ ] zero\n- [x] one\n- [x] three\n")
+    sync(a)
+    sync(b)
+    assert b.read_text() == a.read_text()
+
+    # the snapshot only has the tasks of the section set then: with another one, the others would be removed remotely
+    monkeypatch.setattr(config.globals, "todo_files", [a])
+    result = runner.invoke(app, ["--section", "## Work", "sync", "--remote", sync_server, "--name", "tasks"])
+    assert result.exit_code == 2 and "last synced with section ''" in result.stderr
+    assert (tmp_path / "server" / "tasks.seq").read_text() == str(int(before) + 1)
+
+    monkeypatch.setattr(config.globals, "todo_files", [a])
+    result = runner.invoke(app, ["sync", "--remote", sync_server, "--name", "no/such"])
+    assert result.exit_code == 2 and "invalid list name" in result.stderr
@@ -0,0 +1,87 @@
+from drtodo.main import app
+from typer_aliases import CliRunner
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_task_tree(todofile):
+    from drtodo.mdparser import TodoListParser
+
+    todofile.write_text("# Tree\n\n- [ ] epic\n  - [ ] sub a\n    - [ ] sub a1\n  - [ ] sub b\n- [ ] other\n")
+
+    todo = TodoListParser("")
+    items = todo.parse(todofile)
+    epic, sub_a, sub_a1, sub_b, _ = items
+    assert epic['subtasks'] == [sub_a, sub_b] and sub_a1['parent_task'] is sub_a
+    assert [item['depth'] for item in items] == [0, 1, 2, 1, 0]
+    assert [item['span'] for item in items] == [4, 2, 1, 1, 1]
+
+    result = runner.invoke(app, ["list", "--depth", "0"])
+    assert result.exit_code == 0
+    assert "epic" in result.stdout and "other" in result.stdout and "sub" not in result.stdout
+
+    result = runner.invoke(app, ["done", "--recursive", "0"])
+    assert result.exit_code == 0
+    assert todofile.read_text().count("[x]") == 4
+
+    # subtasks of a removed item take its place, unless removed too
+    result = runner.invoke(app, ["remove", "1"])
+    assert result.exit_code == 0
+    assert todofile.read_text() == "# Tree\n\n- [x] epic\n  - [x] sub a1\n  - [x] sub b\n- [ ] other\n"
+    result = runner.invoke(app, ["remove", "-R", "0"])
+    assert result.exit_code == 0
+    assert todofile.read_text() == "# Tree\n\n- [ ] other\n"
+
+
+def test_move(todofile, tmp_path, monkeypatch):
+    from drtodo import config
+    from drtodo.mdparser import TaskListTraverser
+
+    todofile.write_text("# Tasks\n\n- [ ] one\n  - [ ] sub\n- [x] two\n- [ ] three\n\n## Later\n\nSome text.\n\n"
+                        "### Soon\n\n- [ ] s1\n")
+    globalfile = tmp_path / "GLOBAL.md"
+    globalfile.write_text("# Global\n\n- [ ] g1\n")
+    monkeypatch.setattr(config.globals, "_global_todofile", globalfile)
+
+    result = runner.invoke(app, ["mv", "three", "--to", "0"])
+    assert result.exit_code == 0
+    assert todofile.read_text().startswith("# Tasks\n\n- [ ] three\n- [ ] one\n  - [ ] sub\n- [x] two\n")
+    # items keep their IDs and subtasks go with them, several items move in one go, to the end of the section (before
+    # its subsections)
+    result = runner.invoke(app, ["mv", "-m", "one|two", "--to", "## Later"])
+    assert result.exit_code == 0
+    assert todofile.read_text() == ("# Tasks\n\n- [ ] three\n\n## Later\n\nSome text.\n\n- [ ] one\n  - [ ] sub\n"
+                                    "- [x] two\n\n### Soon\n\n- [ ] s1\n")
+    assert runner.invoke(app, ["list", TaskListTraverser.calc_git_hash("sub")]).stdout.count("sub") == 1
+    result = runner.invoke(app, ["mv", "three", "--to-global"])
+    assert result.exit_code == 0
+    assert globalfile.read_text() == "# Global\n\n- [ ] g1\n- [ ] three\n"
+    assert "three" not in todofile.read_text()
+
+    assert runner.invoke(app, ["mv", "one", "--to", "## Nowhere"]).exit_code == 2
+    assert runner.invoke(app, ["mv", "one"]).exit_code == 2
+    assert runner.invoke(app, ["mv", "one", "--to", "1"]).exit_code == 2   # next to its own subtask
+    assert "one" in todofile.read_text()
+
+
+def test_dedupe(todofile):
+    todofile.write_text("# Tasks\n\n- [ ] write docs\n- [ ] Write  docs P1\n- [x] write docs\n- [ ] review\n"
+                        "  - [ ] write docs\n  - [ ] test\n- [ ] fix @bob\n  - [ ] test\n- [ ] Fix\n- [ ] @amy\n- [ ] P1\n")
+    before = todofile.read_text()
+    result = runner.invoke(app, ["dedupe", "--dry-run"])
+    assert result.exit_code == 0 and todofile.read_text() == before
+    assert result.stderr == "3 duplicate(s) found\n"
+    assert result.stdout.count("similar:") == 2 and result.stdout.count("exact:") == 1
+    assert "exact, kept as it has subtasks" not in result.stdout
+
+    result = runner.invoke(app, ["dedupe"])
+    # the done one is kept, subtasks of different tasks are not duplicates, an item with subtasks is kept, items
+    # with only metadata have no text to compare
+    assert todofile.read_text() == ("# Tasks\n\n- [x] write docs\n- [ ] review\n  - [ ] write docs\n  - [ ] test\n"
+                                    "- [ ] fix @bob\n  - [ ] test\n- [ ] @amy\n- [ ] P1\n")
+    assert runner.invoke(app, ["dedupe"]).stderr == "0 duplicate(s) removed\n"
+
+    result = runner.invoke(app, ["add", "REVIEW"])
+    assert result.exit_code == 0 and "similar item 1" in result.stderr
+    result = runner.invoke(app, ["add", "P2"])
+    assert result.exit_code == 0 and "similar" not in result.stderr
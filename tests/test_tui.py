@@ -0,0 +1,45 @@
+def test_tui_state(tmp_path):
+    from drtodo.api import TodoContext
+    from drtodo.tui import TuiState
+
+    todofile = tmp_path / "TODO.md"
+    todofile.write_text("# Tasks\n\n- [ ] Alpha\n  - [ ] alpha child\n- [ ] Beta\n" +
+                        "".join(f"- [ ] item {i}\n" for i in range(1000)))
+    store = TodoContext([todofile], keep_backups=0).store()
+    state = TuiState(store, save_delay=2)
+
+    state.move_cursor(500)
+    assert [row for row, _ in state.visible(10)] == list(range(491, 501))
+    state.set_filter("ALP")
+    assert [item['text'].strip() for item in state.rows] == ["Alpha", "alpha child"]
+    state.set_filter("ALPHA C")   # narrows what already matched
+    assert [item['text'].strip() for item in state.rows] == ["alpha child"]
+    state.toggle()
+    state.set_filter("")
+    assert state.current['text'].strip() == "alpha child" and len(state.rows) == 1003
+
+    state.move(1)   # alpha child has no sibling to move past
+    assert [item['text'].strip() for item in store.items[:3]] == ["Alpha", "alpha child", "Beta"]
+    state.move_cursor(1)
+    state.move(-1)   # Beta moves up past Alpha and its subtasks
+    assert [item['text'].strip() for item in store.items[:4]] == ["Beta", "Alpha", "alpha child", "item 0"]
+    assert state.current['text'].strip() == "Beta" and state.current['index'] == 0 and state.cursor == 0
+    state.move_cursor(2000)
+    state.delete()
+    assert state.current['text'].strip() == "item 998" and len(state.rows) == 1002
+
+    # changes are only written once they settle
+    assert not state.tick(state.last_change + 1) and "Beta\n- [ ] Alpha" not in todofile.read_text()
+    assert state.tick(state.last_change + 2)
+    assert todofile.read_text().startswith("# Tasks\n\n- [ ] Beta\n- [ ] Alpha\n  - [x] alpha child\n- [ ] item 0\n")
+    assert "item 999" not in todofile.read_text()
+
+    # deleting an item with subtasks leaves them in its place, D deletes them too
+    state.move_cursor(-2000)
+    state.move_cursor(1)
+    state.delete()
+    assert [item['text'].strip() for item in state.rows[:3]] == ["Beta", "alpha child", "item 0"]
+    assert state.current['text'].strip() == "alpha child" and state.current['depth'] == 0
+    state.move_cursor(-1)
+    state.delete(recursive=True)
+    assert state.current['text'].strip() == "alpha child" and len(state.rows) == 1000
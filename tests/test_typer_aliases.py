@@ -0,0 +1,77 @@
+import tempfile
+from pathlib import Path
+
+import pytest
+
+from typer_aliases import CliRunner, Typer
+
+runner = CliRunner(mix_stderr=False)
+
+
+def test_lazy_typer():
+    lazyapp = Typer(no_args_is_help=True)
+
+    @lazyapp.command()
+    @lazyapp.command_alias(name="r")
+    def real():
+        """Real command"""
+
+    lazyapp.add_lazy_typer("no_such_module_anywhere:app", name="ghost", help="Ghost commands")
+
+    # listing commands must not import the lazy module
+    result = runner.invoke(lazyapp, ["--help"])
+    assert result.exit_code == 0
+    assert "Ghost commands" in result.stdout
+    assert "[or r]" in result.stdout
+
+    # dispatching does
+    result = runner.invoke(lazyapp, ["ghost"])
+    assert isinstance(result.exception, ModuleNotFoundError)
+
+
+def test_help_cache(capsys):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cachedapp = Typer(no_args_is_help=True, help_cache_dir=lambda: Path(tmpdir), help_cache_key="v1")
+
+        @cachedapp.command()
+        def first():
+            """First command"""
+
+        @cachedapp.command()
+        def second():
+            """Second command"""
+
+        with pytest.raises(SystemExit) as e:
+            cachedapp(args=["--help"], prog_name="cached")
+        assert e.value.code == 0
+        first_help = capsys.readouterr().out
+        assert "First command" in first_help
+        assert len(list(Path(tmpdir).glob("help-v1-*.txt"))) == 1
+
+        # served from the cache, even if the app changes (the key must change instead)
+        cachedapp.registered_commands.clear()
+        with pytest.raises(SystemExit) as e:
+            cachedapp(args=["--help"], prog_name="cached")
+        assert e.value.code == 0
+        assert capsys.readouterr().out == first_help
+
+
+def test_lazy_imports(todofile):
+    import subprocess
+    import sys
+
+    todofile.write_text("- [ ] one\n- [x] two\n")
+    # in a new interpreter: modules for other commands (and what they import) must not be imported by `todo list`
+    code = ("import sys\n"
+            "from pathlib import Path\n"
+            "from drtodo import config, main\n"
+            "from typer_aliases import CliRunner\n"
+            "config.globals.todo_files = [Path(sys.argv[1])]\n"
+            "config.settings.section = ''\n"
+            "result = CliRunner(mix_stderr=False).invoke(main.app, ['list'])\n"
+            "assert result.exit_code == 0 and 'two' in result.stdout, result\n"
+            "print(' '.join(sorted(sys.modules)))\n")
+    result = subprocess.run([sys.executable, "-c", code, str(todofile)], capture_output=True, text=True, check=True)
+    modules = set(result.stdout.split())
+    assert "drtodo.main" in modules
+    assert not modules & {"drtodo.backup_command", "drtodo.sync", "drtodo.api", "sqlite3", "http.server", "asyncio"}
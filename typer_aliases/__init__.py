@@ -1,6 +1,6 @@
 """Typer Aliases is a Typer wrapper to add arbitrary aliases to Typer commands with one line of code."""
 __version__ = "1.0.0"
-from .core import TyperAliases
+from .core import CliRunner, TyperAliases
 from .core import TyperAliases as Typer
-from .core import CliRunner
-__all__ = ["Typer", "TyperAliases", "CliRunner"]
+
+__all__ = ["CliRunner", "Typer", "TyperAliases"]
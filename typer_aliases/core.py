@@ -1,11 +1,75 @@
+import contextlib
+import importlib
 import inspect
+import io
+import shutil
+import sys
+
 # from functools import wraps
-from typing import Callable, Optional
+from pathlib import Path
+from typing import Any, Callable, Optional
 
+import click
 import typer
+import typer.core
+import typer.main
+import typer.models
 import typer.testing
 
 
+class LazyTyperGroup(typer.core.TyperGroup):
+    """
+    A Typer click group that also holds subcommand groups registered with `TyperAliases.add_lazy_typer()`.
+    Their modules are only imported when one of them is dispatched (or its own help is shown). When listing
+    commands in help, lightweight stand-ins with the registered help are used instead.
+    """
+
+    _owner: Optional["TyperAliases"] = None
+    """The TyperAliases app whose lazy groups this group resolves, set on a per-app subclass."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._formatting_help = False
+
+    def _lazy_typers(self) -> dict[str, dict]:
+        return self._owner._lazy_typers if self._owner is not None else {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        commands = super().list_commands(ctx)
+        return commands + [name for name in self._lazy_typers() if name not in commands]
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> Optional[click.Command]:
+        command = super().get_command(ctx, cmd_name)
+        if command is None and cmd_name in self._lazy_typers():
+            lazy = self._lazy_typers()[cmd_name]
+            if self._formatting_help:
+                # just listing commands: don't import anything, use what was given at registration
+                return click.Command(cmd_name, help=lazy['kwargs'].get('help'), hidden=lazy['kwargs'].get('hidden', False))
+            command = self._load(cmd_name, lazy)
+        return command
+
+    def format_help(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        self._formatting_help = True
+        try:
+            return super().format_help(ctx, formatter)
+        finally:
+            self._formatting_help = False
+
+    def _load(self, name: str, lazy: dict) -> click.Command:
+        module_name, _, attribute = lazy['import_path'].partition(':')
+        typer_instance = getattr(importlib.import_module(module_name), attribute)
+        if isinstance(typer_instance, TyperAliases):
+            typer_instance._init_typer_aliases()
+        assert self._owner is not None
+        command = typer.main.get_group_from_info(
+            typer.models.TyperInfo(typer_instance, name=name, **lazy['kwargs']),
+            pretty_exceptions_short=self._owner.pretty_exceptions_short,
+            rich_markup_mode=self.rich_markup_mode,
+        )
+        self.add_command(command, name)
+        return command
+
+
 class TyperAliases(typer.Typer):
     """
     Adds support for command aliases to typer apps. Just import this instead of typer, everything works as before,
@@ -32,6 +96,9 @@ class TyperAliases(typer.Typer):
     def main():
         ...
     ```
+
+    Subcommand groups can also be registered lazily with `app.add_lazy_typer("package.module:app", name=...)` so
+    their modules are only imported when used.
     """
 
     # simplest and cleanest way to add aliases is to derive from the Typer class, add a new method for the
@@ -52,9 +119,23 @@ class TyperAliases(typer.Typer):
     def __init__(self, *args,
                  alias_help_formatter: Optional[Callable[[str], str]] = None,
                  aliases_help_formatter: Optional[Callable[[str, list[str]], str]] = None,
+                 help_cache_dir: Optional[Callable[[], Optional[Path]]] = None,
+                 help_cache_key: str = "",
                  **kwargs):
+        """
+        help_cache_dir: if given, returns the folder where the output of the top level `--help` is cached (or None to
+            disable caching). Cached help is reused as long as help_cache_key and the terminal width don't change,
+            so the key must change whenever help could change (e.g. the package version).
+        """
         self._alias_help_formatter=alias_help_formatter
         self._aliases_help_formatter=aliases_help_formatter
+        self._aliases_initialized = False
+        self._lazy_typers: dict[str, dict] = {}
+        self._help_cache_dir = help_cache_dir
+        self._help_cache_key = help_cache_key
+        if kwargs.get('cls') is None:
+            # a subclass per app, so the click group can find the lazy groups registered here
+            kwargs['cls'] = type("LazyTyperGroup", (LazyTyperGroup,), {'_owner': self})
         super().__init__(*args, **kwargs)
 
     def _init_typer_aliases(self,
@@ -62,7 +143,11 @@ class TyperAliases(typer.Typer):
                             aliases_help_formatter: Optional[Callable[[str, list[str]], str]] = None):
         """
         Initializes typer aliases for all hidden commands and properly sets the help text for them.
+        This is done only once, calling it again does nothing.
         """
+        if self._aliases_initialized:
+            return
+        self._aliases_initialized = True
 
         def get_command_name(command_info) -> str:
             # borrowed from Typer.main.get_command_from_info()
@@ -95,18 +180,19 @@ class TyperAliases(typer.Typer):
                 return f"{base_help} [or {', '.join(aliases)}]"
 
         def adjust_commands_help(command_list, alias_help_formatter, aliases_help_formatter):
-            aliased_commands = set()
-            # for each command that is not hidden, find any hidden command with the same callback
-            for visible_command in [cmd for cmd in command_list if not cmd.hidden]:
-                for hidden_command in [cmd for cmd in command_list if cmd.hidden]:
-                    if visible_command.callback == hidden_command.callback:
-                        if not hidden_command.help:
-                            hidden_command.help = alias_help_formatter(get_command_name(visible_command))
-                        setattr(visible_command, 'aliases', getattr(visible_command, 'aliases', []) + [hidden_command])
-                        aliased_commands.add(visible_command)
+            aliased_commands = {}
+            # for each hidden command, find the command that is not hidden with the same callback
+            visible_commands = {cmd.callback: cmd for cmd in command_list if not cmd.hidden}
+            for hidden_command in [cmd for cmd in command_list if cmd.hidden]:
+                visible_command = visible_commands.get(hidden_command.callback)
+                if visible_command is not None:
+                    if not hidden_command.help:
+                        hidden_command.help = alias_help_formatter(get_command_name(visible_command))
+                    setattr(visible_command, 'aliases', getattr(visible_command, 'aliases', []) + [hidden_command])
+                    aliased_commands[id(visible_command)] = visible_command
 
             # adjust help text for aliased commands
-            for cmd in aliased_commands:
+            for cmd in aliased_commands.values():
                 basehelp = get_command_help(cmd)
                 if basehelp:
                     cmd.help =  aliases_help_formatter(basehelp, [get_command_name(alias) for alias in cmd.aliases])
@@ -159,12 +245,67 @@ class TyperAliases(typer.Typer):
         """
         return typer.Typer.command(self, *args, name=name, hidden=True, **kwargs)
 
+    def add_lazy_typer(self, import_path: str, *, name: str, **kwargs):
+        """
+        Like `add_typer()` but the Typer app is given as an import path like 'package.module:app', and is only
+        imported when its command is used. Supports the same parameters as add_typer(), e.g., help, no_args_is_help.
+        A `help` parameter should be given so listing commands in help doesn't need to import the module.
+        Ex:
+        ```python
+        app.add_lazy_typer("myapp.backup:app", name="backup", help="Manage backups")
+        ```
+        """
+        if not issubclass(self.info.cls, LazyTyperGroup):
+            raise TypeError("add_lazy_typer() requires the app's cls to be a LazyTyperGroup subclass")
+        self._lazy_typers[name] = {'import_path': import_path, 'kwargs': kwargs}
+
+    def _cached_help_path(self, args: list[str]) -> Optional[Path]:
+        """returns the path of the cached output for a top level help request, None if args are not one"""
+        if self._help_cache_dir is None or not (args == ['--help'] or (not args and self.info.no_args_is_help)):
+            return None
+        folder = self._help_cache_dir()
+        if folder is None:
+            return None
+        tty = 'tty' if sys.stdout.isatty() else 'notty'
+        key = f"{self._help_cache_key}-{shutil.get_terminal_size().columns}-{tty}".replace('/', '_')
+        return folder / f"help-{key}.txt"
+
     def __call__(self, *args, **kwargs):
         self._init_typer_aliases()
+        cached_help = None
+        if not args and kwargs.get('standalone_mode', True):
+            cached_help = self._cached_help_path(kwargs.get('args', sys.argv[1:]))
+        if cached_help is not None:
+            if cached_help.exists():
+                sys.stdout.write(cached_help.read_text())
+                raise SystemExit(0)
+            return self._call_and_cache_help(cached_help, *args, **kwargs)
         # call the base class __call__ method
         super().__call__(*args, **kwargs)
         return self
 
+    def _call_and_cache_help(self, cached_help: Path, *args, **kwargs):
+        import typer.rich_utils
+
+        output = io.StringIO()
+        force_terminal = typer.rich_utils.FORCE_TERMINAL
+        if sys.stdout.isatty():
+            # keep colors in the captured output, it will be shown on this same terminal
+            typer.rich_utils.FORCE_TERMINAL = True
+        code: Any = 0
+        try:
+            with contextlib.redirect_stdout(output):
+                super().__call__(*args, **kwargs)
+        except SystemExit as e:
+            code = e.code
+        finally:
+            typer.rich_utils.FORCE_TERMINAL = force_terminal
+            sys.stdout.write(output.getvalue())
+        if not code:
+            with contextlib.suppress(OSError):
+                cached_help.write_text(output.getvalue())
+        raise SystemExit(code)
+
 
 class CliRunner(typer.testing.CliRunner):
     """